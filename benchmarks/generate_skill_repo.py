@@ -0,0 +1,211 @@
+"""
+合成 skills 仓库生成器
+
+生成一个本地 git 仓库（不访问网络），每个一级目录是一个 skill，skill.md 使用与真实仓库相同的
+YAML front matter 和 <skill> 标签声明依赖。仓库形状可配置：
+- chain: 一条深依赖链（chain-0001 依赖 chain-0000，依此类推）
+- fanout: 一个依赖大量叶子skill的汇总skill（fanout-hub）
+- diamonds: 菱形依赖（top -> left/right -> bottom）
+- cycles: 循环依赖环
+- assets: 带大体积资源文件的skill（一半可压缩文本，一半随机字节）
+- 其余skill为随机DAG，只依赖编号更小的skill
+
+相同参数和seed生成的仓库内容完全相同。
+
+用法：
+    python benchmarks/generate_skill_repo.py /tmp/skills-repo --preset default
+    python benchmarks/generate_skill_repo.py /tmp/skills-repo --skills 20000 --chain-depth 3000 --cycles 0
+"""
+import argparse
+import os
+import random
+import shutil
+import subprocess
+import sys
+
+# 预设仓库形状
+PRESETS = {
+    'smoke': {
+        'skills': 500, 'chain_depth': 50, 'fanout': 50, 'diamonds': 20,
+        'cycles': 5, 'cycle_length': 3, 'asset_skills': 5, 'asset_kb': 256, 'seed': 42,
+    },
+    'default': {
+        'skills': 10000, 'chain_depth': 1000, 'fanout': 1000, 'diamonds': 200,
+        'cycles': 50, 'cycle_length': 3, 'asset_skills': 20, 'asset_kb': 2048, 'seed': 42,
+    },
+    'large': {
+        'skills': 50000, 'chain_depth': 5000, 'fanout': 5000, 'diamonds': 1000,
+        'cycles': 200, 'cycle_length': 4, 'asset_skills': 50, 'asset_kb': 4096, 'seed': 42,
+    },
+}
+
+# 描述文本词表（含中文，覆盖关键词搜索的 CJK 路径）
+WORDS = [
+    'plan', 'deploy', 'review', 'test', 'refactor', 'debug', 'release', 'monitor', 'database', 'frontend',
+    'backend', 'security', 'docs', 'pipeline', 'kubernetes', 'terraform', 'python', 'golang', 'cache', 'api',
+    '部署', '测试', '代码评审', '发布流程', '监控告警', '数据库', '性能优化', '文档', '安全', '重构',
+]
+
+# 固定提交时间，保证相同参数生成的提交哈希一致
+GIT_ENV = {
+    'GIT_AUTHOR_NAME': 'bench', 'GIT_AUTHOR_EMAIL': 'bench@localhost',
+    'GIT_COMMITTER_NAME': 'bench', 'GIT_COMMITTER_EMAIL': 'bench@localhost',
+    'GIT_AUTHOR_DATE': '2024-01-01T00:00:00Z', 'GIT_COMMITTER_DATE': '2024-01-01T00:00:00Z',
+}
+
+
+def _git(repo_dir: str, *args):
+    subprocess.run(['git', *args], cwd=repo_dir, check=True, capture_output=True, env={**os.environ, **GIT_ENV})
+
+
+def _description(rng: random.Random) -> str:
+    return ' '.join(rng.sample(WORDS, rng.randint(3, 8)))
+
+
+def skill_md(skill_id: str, description: str, dependencies: list, rng: random.Random) -> str:
+    """生成skill.md：约一半依赖写在front matter中，其余以<skill>标签写在正文中"""
+    front, tagged = [], []
+    for dep in dependencies:
+        (tagged if rng.random() < 0.3 else front).append(dep)
+    deps_field = ', '.join(f"'{dep}'" for dep in front)
+    body = '\n'.join(f"- 使用 <skill>{dep}</skill> 完成前置步骤" for dep in tagged)
+    paragraphs = '\n\n'.join(_description(rng) for _ in range(rng.randint(2, 6)))
+    return (
+        f"---\nname: {skill_id}\ndescription: {description}\ndependencies: [{deps_field}]\n---\n\n"
+        f"# {skill_id}\n\n{paragraphs}\n\n{body}\n"
+    )
+
+
+def plan_skills(spec: dict) -> dict:
+    """
+    按形状参数规划所有skill的依赖关系
+
+    Returns:
+        dict: skill_id -> 直接依赖列表（按生成顺序）
+    """
+    plan = {}
+
+    depth = spec['chain_depth']
+    for i in range(depth):
+        plan[f"chain-{i:05d}"] = [f"chain-{i - 1:05d}"] if i else []
+
+    if spec['fanout']:
+        leaves = [f"fanout-leaf-{i:05d}" for i in range(spec['fanout'])]
+        for leaf in leaves:
+            plan[leaf] = []
+        plan['fanout-hub'] = leaves
+
+    for i in range(spec['diamonds']):
+        top, left, right, bottom = (f"diamond-{i:04d}-{part}" for part in ('top', 'left', 'right', 'bottom'))
+        plan[bottom] = []
+        plan[left] = [bottom]
+        plan[right] = [bottom]
+        plan[top] = [left, right]
+
+    for i in range(spec['cycles']):
+        members = [f"cycle-{i:04d}-{j}" for j in range(spec['cycle_length'])]
+        for j, member in enumerate(members):
+            plan[member] = [members[(j + 1) % len(members)]]
+
+    for i in range(spec['asset_skills']):
+        plan[f"assets-{i:04d}"] = []
+
+    # 随机DAG补足skill总数，只依赖编号更小的skill，偶尔依赖上面的特殊形状
+    rng = random.Random(spec['seed'])
+    shaped = list(plan)
+    fillers = []
+    for i in range(max(0, spec['skills'] - len(plan))):
+        skill_id = f"skill-{i:06d}"
+        deps = set()
+        if fillers:
+            deps.update(rng.sample(fillers[-200:], min(len(fillers[-200:]), rng.randint(0, 3))))
+        if shaped and rng.random() < 0.02:
+            deps.add(rng.choice(shaped))
+        plan[skill_id] = sorted(deps)
+        fillers.append(skill_id)
+    return plan
+
+
+def write_assets(skill_dir: str, size_kb: int, rng: random.Random):
+    """写入资源文件：一半为可压缩的文本，一半为不可压缩的随机字节"""
+    assets_dir = os.path.join(skill_dir, 'assets')
+    os.makedirs(assets_dir, exist_ok=True)
+    half = size_kb * 1024 // 2
+    line = ' '.join(WORDS).encode('utf-8') + b'\n'
+    with open(os.path.join(assets_dir, 'reference.txt'), 'wb') as f:
+        f.write((line * (half // len(line) + 1))[:half])
+    with open(os.path.join(assets_dir, 'model.bin'), 'wb') as f:
+        f.write(rng.randbytes(half))
+
+
+def generate_repo(repo_dir: str, spec: dict) -> dict:
+    """
+    生成合成skills仓库并提交
+
+    Args:
+        repo_dir: 仓库目录（已存在时先删除）
+        spec: 形状参数，见 PRESETS
+
+    Returns:
+        dict: skill_id -> 直接依赖列表
+    """
+    if os.path.exists(repo_dir):
+        shutil.rmtree(repo_dir)
+    os.makedirs(repo_dir)
+
+    plan = plan_skills(spec)
+    rng = random.Random(spec['seed'] + 1)
+    for skill_id, deps in plan.items():
+        skill_dir = os.path.join(repo_dir, skill_id)
+        os.makedirs(skill_dir)
+        with open(os.path.join(skill_dir, 'skill.md'), 'w', encoding='utf-8') as f:
+            f.write(skill_md(skill_id, _description(rng), deps, rng))
+        if skill_id.startswith('assets-'):
+            write_assets(skill_dir, spec['asset_kb'], rng)
+
+    _git(repo_dir, 'init', '-q', '-b', 'main')
+    _git(repo_dir, 'add', '-A')
+    _git(repo_dir, 'commit', '-q', '-m', f"Generate {len(plan)} synthetic skills")
+    return plan
+
+
+def mutate_repo(repo_dir: str, count: int, seed: int) -> list:
+    """
+    修改count个skill的描述并提交一次，用于测量增量刷新
+
+    Returns:
+        list: 被修改的skill ID
+    """
+    rng = random.Random(seed)
+    with os.scandir(repo_dir) as entries:
+        skill_ids = sorted(entry.name for entry in entries if entry.is_dir() and not entry.name.startswith('.'))
+    changed = rng.sample(skill_ids, min(count, len(skill_ids)))
+    for skill_id in changed:
+        with open(os.path.join(repo_dir, skill_id, 'skill.md'), 'a', encoding='utf-8') as f:
+            f.write(f"\n{_description(rng)} (revision {seed})\n")
+    _git(repo_dir, 'add', '-A')
+    _git(repo_dir, 'commit', '-q', '-m', f"Update {len(changed)} skills (revision {seed})")
+    return changed
+
+
+def main():
+    parser = argparse.ArgumentParser(description='生成合成 skills git 仓库')
+    parser.add_argument('repo_dir', help='输出的仓库目录（已存在时会被删除）')
+    parser.add_argument('--preset', choices=sorted(PRESETS), default='default', help='预设形状（默认 default）')
+    for key, value in PRESETS['default'].items():
+        parser.add_argument(f"--{key.replace('_', '-')}", type=int, dest=key, default=None,
+                            help=f"覆盖预设值（default 预设为 {value}）")
+    args = parser.parse_args()
+
+    spec = dict(PRESETS[args.preset])
+    spec.update({key: getattr(args, key) for key in spec if getattr(args, key) is not None})
+
+    plan = generate_repo(args.repo_dir, spec)
+    edges = sum(len(deps) for deps in plan.values())
+    print(f"✅ 已生成 {len(plan)} 个skill、{edges} 条依赖: {args.repo_dir}")
+    print(f"   形状: {spec}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
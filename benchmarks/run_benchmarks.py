@@ -0,0 +1,394 @@
+"""
+skill-manager 基准测试
+
+在合成仓库（见 generate_skill_repo.py）上测量服务端热点路径的耗时，全程离线：
+仓库为本地git仓库，HTTP下载只访问本机回环地址上临时启动的服务。
+
+- catalog.*  目录构建：clone后全量构建、全量重扫、持久化索引热启动、git pull后增量刷新
+- deps.*     依赖解析：依赖图构建、全部skill的传递闭包、深依赖链收集、宽依赖树展开
+- search.*   关键词搜索：倒排索引构建、list_skills 查询
+- archive.*  压缩包构建：冷构建（无片段缓存）与热构建（片段已缓存），每种可用格式各一组
+- http.*     HTTP下载：缓存命中时的并发下载吞吐、缓存未命中时的流式下载
+
+每项运行 --repeat 次取中位数，与基线文件对比，中位数变慢超过 --tolerance 视为回归（退出码1）；
+基线文件不存在时退出码为2（--no-compare 只运行不对比）。
+仓库中的 baseline.json 由 default 预设生成，与机器相关，换机器后应先重新生成再对比。
+
+用法：
+    python benchmarks/run_benchmarks.py                          # 与 baseline.json 对比
+    python benchmarks/run_benchmarks.py --save-baseline          # 重新生成基线（default 预设）
+    python benchmarks/run_benchmarks.py --preset smoke --no-compare
+    python benchmarks/run_benchmarks.py --only archive http      # 只运行部分基准
+"""
+import argparse
+import concurrent.futures
+import contextlib
+import io
+import json
+import os
+import platform
+import shutil
+import socket
+import statistics
+import sys
+import tempfile
+import threading
+import time
+import urllib.request
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+sys.path.insert(0, BENCH_DIR)
+
+import uvicorn
+
+import mcp_server as server
+from generate_skill_repo import PRESETS, generate_repo, mutate_repo
+from skill_catalog import CatalogSnapshot
+from skill_graph import DependencyGraph
+from skill_search import SkillSearchIndex
+
+DEFAULT_BASELINE = os.path.join(BENCH_DIR, 'baseline.json')
+
+# list_skills 基准使用的查询（英文前缀、多词AND、中文二元组、无结果）
+SEARCH_QUERIES = ['plan', 'dep', 'deploy review', 'kubernetes terraform python', '部署', '代码评审 发布', 'zzz-none']
+
+# 低于该时长的差异视为测量噪声，不判定为回归
+NOISE_FLOOR_SECONDS = 0.002
+
+
+@contextlib.contextmanager
+def quiet():
+    """屏蔽服务端的进度输出，避免打印耗时计入结果"""
+    with contextlib.redirect_stdout(io.StringIO()):
+        yield
+
+
+def configure_server(work_dir: str, remote_dir: str):
+    """将服务端的仓库、缓存和索引路径指向基准测试工作目录"""
+    base_dir = os.path.join(work_dir, 'base')
+    server.REPO_URL = remote_dir
+    server.BASE_DIR = base_dir
+    server.LOCAL_DIR = os.path.join(base_dir, 'skills')
+    server.MIRROR_DIR = os.path.join(base_dir, 'skills.git')
+    server.CHECKOUTS_DIR = os.path.join(base_dir, 'skills-checkouts')
+    server.SOURCES_DIR = os.path.join(base_dir, 'skill-sources')
+    server.VIEWS_DIR = os.path.join(base_dir, 'skills-views')
+    server.CACHE_DIR = os.path.join(base_dir, 'skill-cache')
+    server.FRAGMENT_DIR = os.path.join(server.CACHE_DIR, 'fragments')
+    server.BATCH_DIR = os.path.join(server.CACHE_DIR, 'batches')
+    server.INDEX_DB_PATH = os.path.join(base_dir, 'skill-index.db')
+    server.POPULARITY_DB_PATH = os.path.join(base_dir, 'skill-popularity.db')
+    server.CATALOG_VERSION_PATH = os.path.join(base_dir, 'catalog-version.json')
+    server.BUILD_LOCK_DIR = os.path.join(base_dir, 'build-locks')
+    server.LEADER_LOCK_PATH = os.path.join(base_dir, 'sync-leader.lock')
+    server.SYNC_REQUEST_PATH = os.path.join(base_dir, 'sync-request')
+
+
+def reset_server(clear_checkout: bool = False):
+    """清空已发布的目录快照（及本地检出）"""
+    server._catalog = CatalogSnapshot({})
+    if clear_checkout and os.path.exists(server.BASE_DIR):
+        shutil.rmtree(server.BASE_DIR)
+    os.makedirs(server.BASE_DIR, exist_ok=True)
+
+
+def wait_for_sweeps():
+    """等待同步后在后台运行的缓存清理及预构建线程结束，避免影响下一项测量"""
+    for thread in threading.enumerate():
+        if 'sweep_stale_cache' in thread.name or thread.name == 'cache-prewarm':
+            thread.join()
+
+
+class Runner:
+    """依次运行基准，每项重复多次并记录中位数"""
+
+    def __init__(self, repeat: int, only: list):
+        self.repeat = repeat
+        self.only = only
+        self.results = {}
+
+    def run(self, name: str, fn, setup=None, teardown=None):
+        """
+        Args:
+            name: 基准名称
+            fn: 被测函数，可返回处理的字节数（用于计算吞吐）
+            setup / teardown: 每次运行前后的准备和清理（不计时）
+        """
+        if self.only and not any(name.startswith(prefix) for prefix in self.only):
+            return
+
+        durations = []
+        processed = None
+        for _ in range(self.repeat):
+            with quiet():
+                if setup:
+                    setup()
+                start = time.perf_counter()
+                processed = fn()
+                durations.append(time.perf_counter() - start)
+                if teardown:
+                    teardown()
+
+        result = {'median': statistics.median(durations), 'min': min(durations), 'runs': len(durations)}
+        if isinstance(processed, int) and not isinstance(processed, bool) and processed:
+            result['bytes'] = processed
+            result['mb_per_s'] = round(processed / result['median'] / 1024 / 1024, 2)
+        self.results[name] = result
+
+        throughput = f"  {result['mb_per_s']:>8.2f} MB/s" if 'mb_per_s' in result else ''
+        print(f"  {name:<36} {result['median'] * 1000:>10.2f} ms  (min {result['min'] * 1000:.2f} ms){throughput}")
+
+
+def bench_catalog(runner: Runner, remote_dir: str, skill_count: int):
+    """目录构建"""
+    runner.run('catalog.clone_full', lambda: server.sync_repo_internal(),
+               setup=lambda: reset_server(clear_checkout=True), teardown=wait_for_sweeps)
+
+    runner.run('catalog.full_rescan', lambda: server.refresh_index(full_rescan=True))
+
+    runner.run('catalog.warm_restart', server.load_persisted_catalog, setup=reset_server)
+
+    revision = iter(range(1, 1_000_000))
+    runner.run('catalog.incremental_1pct', lambda: server.sync_repo_internal(),
+               setup=lambda: mutate_repo(remote_dir, max(1, skill_count // 100), next(revision)),
+               teardown=wait_for_sweeps)
+
+
+def bench_deps(runner: Runner):
+    """依赖解析"""
+    skills = dict(server.current_catalog().skills)
+    chain_tail = max((sid for sid in skills if sid.startswith('chain-')), default=None)
+    state = {}
+
+    runner.run('deps.graph_build', lambda: DependencyGraph(skills))
+
+    def closure_all():
+        graph = state['graph']
+        for skill_id in graph.ids:
+            graph.dependencies_of(skill_id)
+
+    runner.run('deps.closure_all', closure_all, setup=lambda: state.update(graph=DependencyGraph(skills)))
+
+    def fresh_catalog():
+        state['catalog'] = CatalogSnapshot(skills, server.current_catalog().head)
+
+    if chain_tail:
+        runner.run('deps.collect_deep_chain', lambda: server.collect_all_dependencies(chain_tail, state['catalog']),
+                   setup=fresh_catalog)
+    if 'fanout-hub' in skills:
+        runner.run('deps.tree_wide_fanout',
+                   lambda: server.format_dependency_tree(server.build_dependency_tree('fanout-hub', state['catalog'])),
+                   setup=fresh_catalog)
+
+
+def bench_search(runner: Runner):
+    """关键词搜索"""
+    skills = dict(server.current_catalog().skills)
+    runner.run('search.index_build', lambda: SkillSearchIndex(skills))
+
+    def queries():
+        for query in SEARCH_QUERIES:
+            server.list_skills(query)
+
+    runner.run('search.list_skills', queries)
+
+
+def _all_bundle_path(archive_format: str) -> tuple:
+    catalog = server.current_catalog()
+    skill_ids = server.resolve_bundle('all', catalog)
+    cache_key = server.bundle_cache_key(skill_ids, archive_format, catalog)
+    return server.bundle_cache_path('all', cache_key, archive_format), skill_ids
+
+
+def _remove_bundles():
+    """删除压缩包缓存，保留skill片段"""
+    os.makedirs(server.CACHE_DIR, exist_ok=True)
+    for entry in os.scandir(server.CACHE_DIR):
+        if entry.is_file():
+            os.remove(entry.path)
+
+
+def bench_archive(runner: Runner):
+    """压缩包构建（all bundle）"""
+    for archive_format in server.available_archive_formats():
+        def build(archive_format=archive_format):
+            cache_file_path, skill_ids = _all_bundle_path(archive_format)
+            server.build_archive(cache_file_path, skill_ids, archive_format)
+            return os.path.getsize(cache_file_path)
+
+        def clear_all():
+            server.clear_cache()
+            os.makedirs(server.CACHE_DIR, exist_ok=True)
+
+        runner.run(f'archive.cold.{archive_format}', build, setup=clear_all)
+        runner.run(f'archive.warm.{archive_format}', build, setup=_remove_bundles)
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+@contextlib.contextmanager
+def http_server():
+    """在本机回环地址上启动下载服务（不执行启动同步和定时任务）"""
+    port = _free_port()
+    config = uvicorn.Config(server.fastapi_app, host='127.0.0.1', port=port, lifespan='off', log_level='warning')
+    uvicorn_server = uvicorn.Server(config)
+    thread = threading.Thread(target=uvicorn_server.run, daemon=True)
+    thread.start()
+    while not uvicorn_server.started:
+        if not thread.is_alive():
+            raise RuntimeError('HTTP 服务启动失败')
+        time.sleep(0.01)
+    try:
+        yield f"http://127.0.0.1:{port}"
+    finally:
+        uvicorn_server.should_exit = True
+        thread.join()
+
+
+def _download(url: str) -> int:
+    with urllib.request.urlopen(url) as response:
+        size = 0
+        while True:
+            chunk = response.read(1024 * 1024)
+            if not chunk:
+                return size
+            size += len(chunk)
+
+
+def bench_http(runner: Runner, requests: int, concurrency: int):
+    """HTTP下载吞吐"""
+    with http_server() as base_url:
+        url = f"{base_url}/download/all?format={server.DEFAULT_ARCHIVE_FORMAT}"
+
+        def parallel_downloads():
+            with concurrent.futures.ThreadPoolExecutor(max_workers=concurrency) as executor:
+                return sum(executor.map(_download, [url] * requests))
+
+        runner.run('http.download_cached', parallel_downloads, setup=lambda: _download(url))
+        runner.run('http.download_miss_stream', lambda: _download(url), setup=_remove_bundles)
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> list:
+    """
+    与基线对比并打印结果
+
+    Returns:
+        list: 回归的基准名称
+    """
+    regressions = []
+    print(f"\n{'基准':<38} {'当前(ms)':>10} {'基线(ms)':>10} {'变化':>8}")
+    for name, result in results.items():
+        base = baseline.get(name)
+        if not base:
+            print(f"  {name:<36} {result['median'] * 1000:>10.2f} {'-':>10} {'新增':>8}")
+            continue
+        ratio = result['median'] / base['median'] if base['median'] else 1.0
+        regressed = ratio > 1 + tolerance and result['median'] - base['median'] > NOISE_FLOOR_SECONDS
+        mark = ' ⚠️ 回归' if regressed else (' 🚀' if ratio < 1 - tolerance else '')
+        print(f"  {name:<36} {result['median'] * 1000:>10.2f} {base['median'] * 1000:>10.2f} "
+              f"{(ratio - 1) * 100:>+7.1f}%{mark}")
+        if regressed:
+            regressions.append(name)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='skill-manager 基准测试（离线）')
+    parser.add_argument('--preset', choices=sorted(PRESETS), default='default', help='合成仓库形状（默认 default）')
+    parser.add_argument('--repeat', type=int, default=3, help='每项基准运行次数，取中位数（默认 3）')
+    parser.add_argument('--only', nargs='*', default=[], help='只运行名称以这些前缀开头的基准，如 catalog deps.closure')
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE, help='基线文件路径')
+    parser.add_argument('--save-baseline', action='store_true', help='将本次结果保存为基线')
+    parser.add_argument('--no-compare', action='store_true', help='不与基线对比（基线文件不存在时不报错）')
+    parser.add_argument('--tolerance', type=float, default=0.25, help='中位数变慢超过该比例视为回归（默认 0.25）')
+    parser.add_argument('--http-requests', type=int, default=8, help='并发下载基准的请求数（默认 8）')
+    parser.add_argument('--http-concurrency', type=int, default=4, help='并发下载基准的并发数（默认 4）')
+    parser.add_argument('--work-dir', help='工作目录（默认使用临时目录，结束后删除）')
+    parser.add_argument('--output', help='将本次结果写入JSON文件')
+    args = parser.parse_args()
+
+    spec = PRESETS[args.preset]
+    compare_baseline = not args.save_baseline and not args.no_compare
+    if compare_baseline and not os.path.exists(args.baseline):
+        # 在运行前检查，避免跑完全部基准才发现无法对比
+        baseline_arg = '' if args.baseline == DEFAULT_BASELINE else f' --baseline {args.baseline}'
+        print(f"❌ 基线文件不存在: {args.baseline}\n"
+              f"   先运行 python benchmarks/run_benchmarks.py --preset {args.preset}{baseline_arg} --save-baseline "
+              f"生成基线，或使用 --no-compare 只运行不对比")
+        return 2
+    work_dir = args.work_dir or tempfile.mkdtemp(prefix='skill-bench-')
+    os.makedirs(work_dir, exist_ok=True)
+    remote_dir = os.path.join(work_dir, 'remote')
+
+    try:
+        print(f"🏗️  生成合成仓库（{args.preset}: {spec['skills']} 个skill）: {remote_dir}")
+        start = time.perf_counter()
+        generate_repo(remote_dir, spec)
+        print(f"   完成，耗时 {time.perf_counter() - start:.1f}s\n")
+
+        configure_server(work_dir, remote_dir)
+        reset_server(clear_checkout=True)
+        with quiet():
+            server.sync_repo_internal()
+            wait_for_sweeps()
+
+        runner = Runner(args.repeat, args.only)
+        print(f"⏱️  运行基准（每项 {args.repeat} 次，取中位数）")
+        bench_catalog(runner, remote_dir, spec['skills'])
+        bench_deps(runner)
+        bench_search(runner)
+        bench_archive(runner)
+        bench_http(runner, args.http_requests, args.http_concurrency)
+    finally:
+        wait_for_sweeps()
+        if not args.work_dir:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    report = {
+        'preset': args.preset,
+        'spec': spec,
+        'repeat': args.repeat,
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'created_at': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'results': runner.results,
+    }
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+
+    exit_code = 0
+    if compare_baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+        if baseline.get('spec') != spec:
+            print(f"\n⚠️  基线使用的仓库形状（{baseline.get('preset')}）与本次不同，跳过对比")
+        else:
+            regressions = compare(runner.results, baseline.get('results', {}), args.tolerance)
+            if regressions:
+                print(f"\n❌ {len(regressions)} 项基准回归超过 {args.tolerance:.0%}: {regressions}")
+                exit_code = 1
+            else:
+                print("\n✅ 未发现性能回归")
+
+    if args.save_baseline:
+        if os.path.exists(args.baseline):
+            # 只运行部分基准时保留基线中的其他结果
+            with open(args.baseline, 'r', encoding='utf-8') as f:
+                previous = json.load(f)
+            if previous.get('spec') == spec:
+                report['results'] = {**previous.get('results', {}), **runner.results}
+        with open(args.baseline, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"\n💾 基线已保存: {args.baseline}")
+
+    return exit_code
+
+
+if __name__ == '__main__':
+    sys.exit(main())
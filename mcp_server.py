@@ -1,18 +1,47 @@
+import asyncio
 import base64
+import collections
+import contextlib
+import gzip
+import hashlib
+import hmac
 import io
 import json
 import os
 import re
+import shutil
 import subprocess
 import sys
 import tarfile
-from threading import Thread
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor, as_completed
+from threading import Lock, Thread
 
 import uvicorn
 from apscheduler.schedulers.background import BackgroundScheduler
-from fastapi import FastAPI
-from fastapi.responses import FileResponse
+from fastapi import FastAPI, Query, Request
+from fastapi.responses import FileResponse, JSONResponse, Response, StreamingResponse
 from fastmcp import FastMCP
+from fastmcp.server.middleware import Middleware
+
+from skill_cache import CacheManager
+from skill_catalog import CatalogSnapshot
+from skill_cluster import LeaderElection, build_lock, read_version_file, write_version_file
+from skill_graph import DependencyGraph
+from skill_popularity import PopularityTracker
+from skill_metrics import (ARCHIVE_BUILD_BYTES, ARCHIVE_BUILD_DURATION, ARCHIVE_BUILDS_INFLIGHT, CACHE_BYTES,
+                           CACHE_ENTRIES, CACHE_EVICTIONS, CACHE_PREWARM, CACHE_REQUESTS, CATALOG_BYTES, CATALOG_SKILLS, CATALOG_VERSION, GRAPH_STATS, REGISTRY,
+                           SYNC_DURATION, SYNC_LAST_SUCCESS, SYNC_REQUESTS, TOOL_DURATION)
+from skill_metrics import CONTENT_TYPE as METRICS_CONTENT_TYPE
+from skill_sources import (build_view, list_skill_folders, normalize_sources, path_fingerprint, qualify,
+                           read_view_manifest, resolve_dependencies)
+from skill_store import load_catalog, save_catalog
+
+try:
+    import zstandard
+except ImportError:  # 可选依赖：未安装时不提供 zst 格式
+    zstandard = None
 
 # 获取可执行文件所在目录
 if getattr(sys, 'frozen', False):
@@ -23,19 +52,166 @@ else:
     BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 
 REPO_URL = "git@xxx/skills.git"
+# 当前检出的skills目录：指向 CHECKOUTS_DIR 下某个提交检出目录的符号链接，同步时原子切换；
+# Windows 上不能原子替换目录符号链接，改为把当前检出目录写入指针文件 {LOCAL_DIR}.current（见 checkout_root）
 LOCAL_DIR = os.path.join(BASE_DIR, "skills")
-CACHE_DIR = os.path.join(LOCAL_DIR, ".skill-cache")
+# 本地镜像仓库（bare），同步时只浅获取远程最新提交
+MIRROR_DIR = os.path.join(BASE_DIR, "skills.git")
+# 各提交的检出目录（镜像仓库的 worktree）
+CHECKOUTS_DIR = os.path.join(BASE_DIR, "skills-checkouts")
+# 多个skills来源（联邦目录）：为空时只同步 REPO_URL，skill ID 不带命名空间；
+# 配置后各来源并发同步并合并为一个目录，skill ID 为 "{来源名}.{skill文件夹名}"，依赖可跨来源引用
+# 例: [{'name': 'platform', 'url': 'git@xxx/platform-skills.git'}, {'name': 'local', 'path': '/srv/skills'}]
+SKILL_SOURCES = []
+# 单个来源每条git命令的超时（秒）：超时或失败的来源保留上一次同步的内容，不影响其他来源刷新
+SOURCE_SYNC_TIMEOUT = 120
+# 各来源的镜像仓库及检出目录（{SOURCES_DIR}/{来源名}/），以及合并各来源检出的视图目录（LOCAL_DIR 指向当前视图）
+SOURCES_DIR = os.path.join(BASE_DIR, "skill-sources")
+VIEWS_DIR = os.path.join(BASE_DIR, "skills-views")
+# 是否以符号链接切换 LOCAL_DIR（Windows 上使用指针文件），多来源视图目录同样以符号链接引用各来源的skill（Windows 上复制）
+SYMLINK_CHECKOUTS = os.name != 'nt'
+# 压缩包缓存目录（位于检出目录之外，切换检出不影响缓存）
+CACHE_DIR = os.path.join(BASE_DIR, "skill-cache")
+# 持久化的skills目录索引（SQLite），重启时HEAD未变化则直接加载，无需重新扫描仓库
+INDEX_DB_PATH = os.path.join(BASE_DIR, "skill-index.db")
+# 下载热度统计（SQLite），所有 worker 共享，重启后保留，预构建按合并后的热度排序
+POPULARITY_DB_PATH = os.path.join(BASE_DIR, "skill-popularity.db")
+# 单个skill的预压缩tar片段目录，压缩包由片段直接拼接而成
+FRAGMENT_DIR = os.path.join(CACHE_DIR, "fragments")
+# 批量下载bundle的定义目录（.batch-{digest}.json，内容为排序后的skill集合），重启后及其他 worker 中同样可以解析
+BATCH_DIR = os.path.join(CACHE_DIR, "batches")
+# 缓存容量预算（压缩包及片段合计，字节），超出时按最近最少使用顺序淘汰；0 表示不限制
+CACHE_MAX_BYTES = 2 * 1024 ** 3
+# 缓存文件至少闲置该时长（秒）才允许被淘汰，避免删除正在下载或拼接的文件
+CACHE_MIN_IDLE_SECONDS = 60
 
 # 创建MCP服务器实例
 mcp = FastMCP("skill-manager")
 
 SKILL_FILE_BASE_URL = "http://localhost:8002"
 
-# 全局skills变量
-skills = {}
+# 同步时获取的提交深度（0 表示完整历史）及部分克隆过滤（"" 表示不过滤，blob:none 表示文件内容在检出时按需获取）
+SYNC_FETCH_DEPTH = 1
+SYNC_FETCH_FILTER = "blob:none"
+# 除当前检出外保留的旧检出目录数量；仍被进行中的构建使用的检出目录不会被删除
+CHECKOUT_RETENTION = 2
+
+# 推送通知（/webhook/sync）触发同步：最后一次通知后等待的秒数，期间的通知合并为一次同步；
+# 持续收到通知时，距第一次通知最多等待 SYNC_DEBOUNCE_MAX_SECONDS 秒
+SYNC_DEBOUNCE_SECONDS = 2.0
+SYNC_DEBOUNCE_MAX_SECONDS = 10.0
+# 推送通知的共享密钥（"" 表示不校验）：校验 X-Hub-Signature-256（HMAC-SHA256）或 X-Webhook-Token 请求头
+SYNC_WEBHOOK_SECRET = ""
+# 兜底定时同步的间隔（小时），间隔内已成功同步过则跳过
+SYNC_INTERVAL_HOURS = 1
+
+# HTTP 服务的 worker 进程数（需要类Unix系统）：大于1时只有一个 worker（sync leader）同步仓库，
+# 其余 worker 从共享的持久化索引加载目录快照，共用缓存目录提供下载
+SERVER_WORKERS = 1
+# 多进程部署时各 worker 检查目录版本、同步请求及 leader 存活的间隔（秒）
+CLUSTER_POLL_SECONDS = 1.0
+# sync leader 锁文件、目录版本通知文件、转发给 leader 的同步请求文件、压缩包构建锁目录
+LEADER_LOCK_PATH = os.path.join(BASE_DIR, "sync-leader.lock")
+CATALOG_VERSION_PATH = os.path.join(BASE_DIR, "catalog-version.json")
+SYNC_REQUEST_PATH = os.path.join(BASE_DIR, "sync-request")
+BUILD_LOCK_DIR = os.path.join(BASE_DIR, "build-locks")
+
+# 加载skills时并发读取skill.md的线程数（读文件以IO为主，可多于CPU核数）
+SKILL_LOAD_WORKERS = min(32, (os.cpu_count() or 1) * 4)
+
+# 压缩包构建线程池大小（打包在线程池中执行，避免阻塞uvicorn事件循环）
+ARCHIVE_BUILD_WORKERS = min(4, os.cpu_count() or 1)
+
+# 缓存未命中时边打包边返回（同时写入缓存），首字节无需等待整个压缩包构建完成
+STREAM_ON_CACHE_MISS = True
+# 流式响应的缓冲块数上限（每块约10KB），内存占用与压缩包大小无关
+STREAM_QUEUE_CHUNKS = 64
+# 构建超过该时长没有输出数据时以错误结束响应，不会无限期占用响应线程
+STREAM_STALL_SECONDS = 60
+
+# 仓库内容变化后在后台预构建下载热度最高的 PREWARM_TOP_N 个压缩包及 all 压缩包（0 表示只预构建 all）
+PREWARM_TOP_N = 20
+# 下载热度半衰期（小时）
+PREWARM_HALF_LIFE_HOURS = 24
+# 预构建线程调低的优先级（nice 增量，Linux 上按线程生效），优先把CPU让给用户请求触发的构建
+PREWARM_NICE = 10
+
+# 压缩包格式：codec/level 为压缩方式及级别，tar_flags 为客户端解压参数
+ARCHIVE_FORMATS = {
+    'gz': {'codec': 'gzip', 'level': 9, 'ext': 'tar.gz', 'media_type': 'application/gzip', 'tar_flags': '-xkzf', 'delta_tar_flags': '-xzf'},
+    'gz-fast': {'codec': 'gzip', 'level': 1, 'ext': 'tar.gz', 'media_type': 'application/gzip', 'tar_flags': '-xkzf', 'delta_tar_flags': '-xzf'},
+    'zst': {'codec': 'zstd', 'level': 3, 'ext': 'tar.zst', 'media_type': 'application/zstd', 'tar_flags': '--zstd -xkf', 'delta_tar_flags': '--zstd -xf'},
+    'tar': {'codec': None, 'level': 0, 'ext': 'tar', 'media_type': 'application/x-tar', 'tar_flags': '-xkf', 'delta_tar_flags': '-xf'},
+}
+DEFAULT_ARCHIVE_FORMAT = 'gz'
+# 压缩包内tar条目的布局版本：条目元数据的写法变化时递增，旧布局的缓存文件及片段视为过期
+ARCHIVE_LAYOUT_VERSION = 2
+
+# 当前发布的skills目录快照（skills记录 + 依赖图 + 关键词索引），只读；
+# 刷新时在旁路构建新快照后整体替换，读取方通过 current_catalog() 获取，无需加锁
+_catalog = CatalogSnapshot({})
+
+# 串行化索引刷新（只有写方需要加锁）
+_refresh_lock = Lock()
+
+
+def current_catalog() -> CatalogSnapshot:
+    """获取当前发布的skills目录快照；同一请求内应只获取一次，保证看到一致的视图"""
+    return _catalog
+
+
+def publish_catalog(skills: dict, head: str, version: int = None, root: str = None) -> CatalogSnapshot:
+    """
+    由构建好的skills记录生成新快照（依赖图、关键词索引），并以一次引用替换发布
+
+    Args:
+        skills: skill_id -> skill记录
+        head: 构建时的git HEAD
+        version: 快照版本号（默认在当前版本上加1，从持久化索引加载时沿用保存的版本号）
+        root: 快照对应的检出目录（默认为当前检出目录）
+    """
+    global _catalog
+    if version is None:
+        version = _catalog.version + 1
+    snapshot = CatalogSnapshot(skills, head, version, root or os.path.realpath(checkout_root()))
+    if snapshot.graph.cycles:
+        print(f"⚠️  检测到 {len(snapshot.graph.cycles)} 个循环依赖: {snapshot.graph.cycles[:5]}")
+    _catalog = snapshot
+    return snapshot
+
+
+# 指针文件模式下缓存的当前检出目录（由 activate_checkout 更新）
+_active_checkout = {'root': None}
+
+
+def checkout_pointer_path() -> str:
+    return f"{LOCAL_DIR}.current"
+
+
+def checkout_root() -> str:
+    """
+    当前检出目录：使用符号链接时即为 LOCAL_DIR；
+    Windows 上为指针文件记录的检出目录，尚未切换过检出时为 LOCAL_DIR（旧版本留下的完整clone）
+    """
+    if SYMLINK_CHECKOUTS:
+        return LOCAL_DIR
+    if _active_checkout['root'] is None:
+        try:
+            with open(checkout_pointer_path(), encoding='utf-8') as f:
+                _active_checkout['root'] = f.read().strip() or None
+        except OSError:
+            pass
+    return _active_checkout['root'] or LOCAL_DIR
+
 
+def checkout_activated() -> bool:
+    """是否已切换到 CHECKOUTS_DIR（或多来源视图）下的检出目录"""
+    if SYMLINK_CHECKOUTS:
+        return os.path.islink(LOCAL_DIR)
+    return checkout_root() != LOCAL_DIR
 
-def run_command(cmd: list, cwd: str = None):
+
+def run_command(cmd: list, cwd: str = None, timeout: float = 60):
     """执行 shell 命令，返回 (returncode, stdout, stderr)"""
     try:
         result = subprocess.run(
@@ -43,7 +219,7 @@ def run_command(cmd: list, cwd: str = None):
             cwd=cwd,
             capture_output=True,
             text=True,
-            timeout=60
+            timeout=timeout
         )
         return result.returncode, result.stdout, result.stderr
     except subprocess.TimeoutExpired:
@@ -52,57 +228,130 @@ def run_command(cmd: list, cwd: str = None):
         raise Exception(f"Command error: {str(e)}")
 
 
-def update_skills():
-    """遍历LOCAL_DIR下的一级文件夹，读取skill.md文件并更新skills变量"""
-    global skills
-    skills = {}
+# skill.md 解析用的正则（模块加载时预编译）
+# YAML front matter: ---\n...\n---
+FRONT_MATTER_PATTERN = re.compile(r'^---\s*\n(.*?)\n---', re.DOTALL)
+# dependencies字段，支持 ['skillA', 'skillB'] / ["skillA", "skillB"] / [skillA, skillB]
+DEPENDENCIES_FIELD_PATTERN = re.compile(r'dependencies:\s*\[(.*?)\]', re.DOTALL)
+DEPENDENCY_NAME_PATTERN = re.compile(r'["\']?([a-zA-Z0-9_.-]+)["\']?')
+# 文档内容中的<skill>xxx</skill>标签（多来源时可带命名空间，如 <skill>platform.base</skill>）
+SKILL_TAG_PATTERN = re.compile(r'<skill>([a-zA-Z0-9_.-]+)</skill>')
+
+
+def find_skill_md(folder_path: str):
+    """查找文件夹下的skill.md文件（忽略大小写），不存在时返回None"""
+    with os.scandir(folder_path) as entries:
+        for entry in entries:
+            if entry.name.lower() == 'skill.md':
+                return entry.path
+    return None
+
+
+def parse_skill_md(content: str) -> dict:
+    """
+    一次解析skill.md的全部内容
+
+    1. 从前5行中提取name和description
+    2. 解析YAML front matter中的dependencies字段
+    3. 扫描文档内容中的<skill>xxx</skill>标签
+
+    Returns:
+        dict: {'name', 'description', 'dependencies'}，dependencies已去重并按字母顺序排序
+    """
+    name = None
+    description = None
+    for line in content.split('\n', 5)[:5]:
+        line = line.strip()
+        if line.startswith('name:'):
+            name = line.split('name:', 1)[1].strip()
+        elif line.startswith('description:'):
+            description = line.split('description:', 1)[1].strip()
+
+    dependencies = set()
+    front_matter_match = FRONT_MATTER_PATTERN.match(content)
+    if front_matter_match:
+        deps_match = DEPENDENCIES_FIELD_PATTERN.search(front_matter_match.group(1))
+        if deps_match:
+            dependencies.update(DEPENDENCY_NAME_PATTERN.findall(deps_match.group(1)))
+    dependencies.update(SKILL_TAG_PATTERN.findall(content))
+
+    return {
+        'name': name,
+        'description': description,
+        'dependencies': sorted(dependencies)
+    }
 
-    if not os.path.exists(LOCAL_DIR):
-        return
 
-    # 遍历LOCAL_DIR下的所有一级文件夹
-    for folder_name in os.listdir(LOCAL_DIR):
-        folder_path = os.path.join(LOCAL_DIR, folder_name)
+def load_skill(skill_id: str):
+    """
+    读取单个skill文件夹下的skill.md（只读取一次），解析name、description和第一层依赖
+
+    Args:
+        skill_id: skill文件夹名称
+
+    Returns:
+        dict: {'id', 'name', 'description', 'dependencies'}；文件夹或skill.md不存在、读取失败、为隐藏文件夹时返回None
+    """
+    if skill_id.startswith('.'):
+        # 隐藏文件夹（.git、.github 等）不是skill，以 . 开头的名称留给批量下载bundle ID
+        return None
 
+    try:
+        skill_md_path = find_skill_md(os.path.join(checkout_root(), skill_id))
+    except (FileNotFoundError, NotADirectoryError):
         # 只处理文件夹
-        if not os.path.isdir(folder_path):
-            continue
+        return None
 
-        # 查找skill.md文件（忽略大小写）
-        skill_md_path = None
-        for file_name in os.listdir(folder_path):
-            if file_name.lower() == 'skill.md':
-                skill_md_path = os.path.join(folder_path, file_name)
-                break
+    # 如果不存在skill.md文件，跳过
+    if not skill_md_path:
+        return None
 
-        # 如果不存在skill.md文件，跳过
-        if not skill_md_path:
-            continue
+    try:
+        with open(skill_md_path, 'r', encoding='utf-8') as f:
+            content = f.read()
+        return {'id': skill_id, **parse_skill_md(content)}
+    except Exception as e:
+        print(f"Error reading skill.md in {skill_id}: {e}")
+        return None
 
-        # 读取skill.md文件的前6行
-        try:
-            with open(skill_md_path, 'r', encoding='utf-8') as f:
-                lines = [f.readline() for _ in range(6)]
-
-            # 从前5行中提取name和description
-            name = None
-            description = None
-            for line in lines[:5]:
-                line = line.strip()
-                if line.startswith('name:'):
-                    name = line.split('name:', 1)[1].strip()
-                elif line.startswith('description:'):
-                    description = line.split('description:', 1)[1].strip()
-
-            # 存储到skills字典中
-            skills[folder_name] = {
-                'id': folder_name,
-                'name': name,
-                'description': description
-            }
-        except Exception as e:
-            print(f"Error reading skill.md in {folder_name}: {e}")
-            continue
+
+def load_skills(skill_ids: list) -> dict:
+    """
+    在线程池中并发读取多个skill
+
+    Returns:
+        dict: skill_id -> load_skill 的结果（保持skill_ids的顺序）
+    """
+    if len(skill_ids) <= 1:
+        return {skill_id: load_skill(skill_id) for skill_id in skill_ids}
+
+    with ThreadPoolExecutor(max_workers=SKILL_LOAD_WORKERS, thread_name_prefix='skill-load') as executor:
+        return dict(zip(skill_ids, executor.map(load_skill, skill_ids)))
+
+
+def rescan_all_skills() -> dict:
+    """
+    全量扫描skills（遍历当前检出目录下的一级文件夹，读取skill.md文件并分析依赖），
+    仅在首次构建或增量刷新失败时使用
+
+    Returns:
+        dict: skill_id -> skill记录
+    """
+    root = checkout_root()
+    if not os.path.exists(root):
+        return {}
+
+    # 遍历检出目录下的所有一级文件夹
+    with os.scandir(root) as entries:
+        folder_names = [entry.name for entry in entries if entry.is_dir()]
+
+    print("📊 开始加载所有skill及其依赖信息...")
+    loaded = load_skills(folder_names)
+    skills = {skill_id: info for skill_id, info in loaded.items() if info is not None}
+
+    with_deps = sum(1 for info in skills.values() if info['dependencies'])
+    print(f"✅ 依赖信息更新完成，共 {with_deps}/{len(skills)} 个skill有依赖")
+    return skills
 
 
 def analyze_skill_dependencies(skill_id: str) -> list:
@@ -116,326 +365,2076 @@ def analyze_skill_dependencies(skill_id: str) -> list:
     Args:
         skill_id: skill文件夹名称
 
-    Returns:
-        list: 依赖的skill文件夹名称列表（已去重）
+    Returns:
+        list: 依赖的skill文件夹名称列表（已去重）
+
+    Example:
+        >>> analyze_skill_dependencies("devops-flow")
+        ["writing-plans", "executing-plans"]
+    """
+    info = load_skill(skill_id)
+    return info['dependencies'] if info else []
+
+
+def resolve_source_dependencies(skills: dict):
+    """多来源时将声明的依赖解析为带命名空间的skill ID（单一仓库时不做处理）"""
+    if SKILL_SOURCES:
+        resolve_dependencies(skills, [source['name'] for source in normalize_sources(SKILL_SOURCES)])
+
+
+def update_all_dependents(skills: dict):
+    """
+    根据所有skill的dependencies字段构建反向依赖索引，
+    将直接依赖方存储到skills字典的dependents字段中（只记录已存在skill之间的依赖）
+    """
+    dependents = {skill_id: [] for skill_id in skills}
+    for skill_id, info in skills.items():
+        for dep_id in info.get('dependencies', []):
+            if dep_id in dependents and dep_id != skill_id:
+                dependents[dep_id].append(skill_id)
+
+    for skill_id, dependent_ids in dependents.items():
+        skills[skill_id]['dependents'] = sorted(dependent_ids)
+
+
+def refresh_skills(skills: dict, skill_ids) -> dict:
+    """
+    增量刷新指定的skill：重新读取元数据并分析依赖，文件夹或skill.md已不存在的skill从skills中移除
+
+    Args:
+        skills: 待修改的skills记录（新快照的副本）
+        skill_ids: 需要刷新的skill文件夹名称集合
+
+    Returns:
+        dict: {'updated': [...], 'removed': [...]}
+    """
+    updated = []
+    removed = []
+    for skill_id, info in load_skills(sorted(skill_ids)).items():
+        if info is None:
+            if skills.pop(skill_id, None) is not None:
+                removed.append(skill_id)
+            continue
+
+        skills[skill_id] = info
+        updated.append(skill_id)
+
+    print(f"🔄 增量刷新完成：更新 {len(updated)} 个，移除 {len(removed)} 个skill")
+    return {'updated': updated, 'removed': removed}
+
+
+def build_dependency_tree(skill_id: str, catalog: CatalogSnapshot = None) -> dict:
+    """
+    构建skill的依赖关系树，检测循环依赖
+
+    使用显式栈迭代构建，不受递归深度限制；菱形依赖中重复出现的skill只展开一次，
+    之后出现的位置标记为 repeated，避免依赖树随路径数指数膨胀
+
+    Args:
+        skill_id: 要分析的skill ID
+        catalog: 使用的目录快照（默认当前快照）
+
+    Returns:
+        dict: 依赖树结构
+        {
+            'skill_id': 'xxx',
+            'dependencies': [
+                {
+                    'skill_id': 'yyy',
+                    'dependencies': [...],
+                    'circular': False
+                },
+                {
+                    'skill_id': 'zzz',
+                    'circular': True,  # 检测到循环依赖
+                    'dependencies': []
+                },
+                {
+                    'skill_id': 'www',
+                    'repeated': True,  # 已在树中其他位置展开
+                    'dependencies': []
+                }
+            ],
+            'exists': True/False,  # skill是否存在
+            'circular': False
+        }
+    """
+    skills = (catalog or current_catalog()).skills
+
+    def new_node(sid: str) -> dict:
+        return {
+            'skill_id': sid,
+            'exists': sid in skills,
+            'circular': False,
+            'dependencies': []
+        }
+
+    root = new_node(skill_id)
+    if not root['exists']:
+        return root
+
+    # expanded: 已展开过的skill；current_path: 当前栈上的路径（用于检测循环依赖）
+    expanded = {skill_id}
+    current_path = {skill_id}
+    stack = [(root, iter(skills[skill_id].get('dependencies', [])))]
+
+    while stack:
+        node, deps = stack[-1]
+        dep_id = next(deps, None)
+        if dep_id is None:
+            current_path.discard(node['skill_id'])
+            stack.pop()
+            continue
+
+        dep_node = new_node(dep_id)
+        node['dependencies'].append(dep_node)
+
+        # skill不存在，不继续展开
+        if not dep_node['exists']:
+            continue
+        # 依赖已在当前路径上，说明有循环
+        if dep_id in current_path:
+            dep_node['circular'] = True
+            continue
+        # 已在其他分支展开过
+        if dep_id in expanded:
+            dep_node['repeated'] = True
+            continue
+
+        expanded.add(dep_id)
+        current_path.add(dep_id)
+        stack.append((dep_node, iter(skills[dep_id].get('dependencies', []))))
+
+    return root
+
+
+def format_dependency_tree(tree: dict) -> str:
+    """
+    将依赖树格式化为易读的文本格式
+
+    Args:
+        tree: 依赖树字典
+
+    Returns:
+        str: 格式化后的依赖树文本
+    """
+    lines = []
+    # (节点, 缩进级别, 当前行的前缀符号)
+    stack = [(tree, 0, "")]
+
+    while stack:
+        node, indent, prefix = stack.pop()
+
+        # 构建当前节点的显示文本
+        status = ""
+        if node.get('circular'):
+            status = " [循环依赖]"
+        elif not node.get('exists'):
+            status = " [不存在]"
+        elif node.get('repeated'):
+            status = " [重复，已在上方展开]"
+
+        lines.append(f"{prefix}{node['skill_id']}{status}")
+
+        # 如果有循环依赖、skill不存在或已在其他位置展开，不继续展开子节点
+        if node.get('circular') or not node.get('exists') or node.get('repeated'):
+            continue
+
+        # 子节点逆序入栈，保证按原顺序输出
+        dependencies = node.get('dependencies', [])
+        for i in range(len(dependencies) - 1, -1, -1):
+            is_last = (i == len(dependencies) - 1)
+            child_prefix = "    " * indent + ("└── " if is_last else "├── ")
+            stack.append((dependencies[i], indent + 1, child_prefix))
+
+    return "\n".join(lines)
+
+
+def collect_all_dependencies(skill_id: str, catalog: CatalogSnapshot = None) -> list:
+    """
+    收集skill的所有传递依赖（扁平化），类似Maven的依赖管理
+
+    直接读取依赖图中记忆化的传递闭包，不再遍历skills
+
+    Args:
+        skill_id: 要分析的skill ID
+        catalog: 使用的目录快照（默认当前快照）
+
+    Returns:
+        list: 所有依赖的skill ID列表（不包含自身，已去重），按安装顺序排列（被依赖的skill在前）
+
+    Example:
+        skillA依赖skillB和skillC
+        skillB依赖skillD
+        skillC依赖skillA (循环)
+
+        collect_all_dependencies('skillA') 返回 ['skillD', 'skillB', 'skillC']
+    """
+    return list((catalog or current_catalog()).graph.dependencies_of(skill_id))
+
+
+def get_head_commit():
+    """获取当前检出目录的HEAD commit hash（多来源时为当前视图的组合版本号），失败时返回None"""
+    if SKILL_SOURCES:
+        manifest = read_view_manifest(checkout_root())
+        return manifest['head'] if manifest else None
+    try:
+        code, out, err = run_command(["git", "rev-parse", "HEAD"], cwd=checkout_root())
+    except Exception:
+        return None
+    return out.strip() if code == 0 else None
+
+
+def get_changed_skill_ids(old_head: str, new_head: str):
+    """
+    通过 git diff 获取两个提交之间发生变更的skill文件夹
+
+    使用 --no-renames，重命名会表现为"删除旧路径 + 新增新路径"，新旧两个文件夹都会被刷新；
+    仓库根目录下的文件不属于任何skill，直接忽略。
+
+    Returns:
+        set: 变更的skill文件夹名称；diff失败时返回None（调用方应回退到全量扫描）
+    """
+    if SKILL_SOURCES:
+        return get_changed_source_skill_ids(old_head, new_head)
+    try:
+        code, out, err = run_command(
+            ["git", "diff", "--name-only", "--no-renames", "-z", old_head, new_head],
+            cwd=checkout_root()
+        )
+    except Exception as e:
+        print(f"Error diffing {old_head}..{new_head}: {e}")
+        return None
+    if code != 0:
+        print(f"Error diffing {old_head}..{new_head}: {err}")
+        return None
+
+    changed = set()
+    for path in out.split('\0'):
+        if '/' in path:
+            changed.add(path.split('/', 1)[0])
+    return changed
+
+
+def get_changed_source_skill_ids(old_head: str, new_head: str):
+    """
+    多来源：比较新旧视图中各来源的版本，汇总变更的skill（带命名空间）
+
+    - git 来源：在新检出目录中 git diff 两个提交
+    - 本地目录来源、新增或移除的来源：该来源的全部skill
+
+    Returns:
+        set: 变更的skill ID；旧视图已被清理或diff失败时返回None（调用方应回退到全量扫描）
+    """
+    old_manifest = read_view_manifest(os.path.join(VIEWS_DIR, old_head[:16]))
+    new_manifest = read_view_manifest(checkout_root())
+    if not old_manifest or not new_manifest or new_manifest['head'] != new_head:
+        return None
+
+    old_sources, new_sources = old_manifest['sources'], new_manifest['sources']
+    changed = set()
+    for name in set(old_sources) | set(new_sources):
+        old, new = old_sources.get(name), new_sources.get(name)
+        if old == new:
+            continue
+
+        if old and new and new['type'] == 'git' and old['type'] == 'git':
+            try:
+                code, out, err = run_command(
+                    ["git", "diff", "--name-only", "--no-renames", "-z", old['head'], new['head']],
+                    cwd=new['root'], timeout=SOURCE_SYNC_TIMEOUT
+                )
+            except Exception as e:
+                print(f"Error diffing source {name}: {e}")
+                return None
+            if code != 0:
+                print(f"Error diffing source {name}: {err}")
+                return None
+            changed.update(qualify(name, path.split('/', 1)[0]) for path in out.split('\0') if '/' in path)
+            continue
+
+        prefix = qualify(name, '')
+        changed.update(sid for sid in current_catalog().skills if sid.startswith(prefix))
+        if new:
+            changed.update(qualify(name, local_id) for local_id in list_skill_folders(new['root']))
+    return changed
+
+
+def refresh_index(full_rescan: bool = False) -> dict:
+    """
+    根据git HEAD的变化刷新skills索引
+
+    - 索引尚未构建、指定full_rescan或git diff失败时：全量扫描
+    - HEAD未变化：不做任何事
+    - 否则：只重新解析 当前快照HEAD..HEAD 之间变更的skill文件夹
+
+    新索引在当前快照的副本上构建，完成后整体发布；刷新期间读取方继续使用旧快照
+
+    Returns:
+        dict: 刷新结果，包含mode（full/incremental/unchanged）、发布的快照版本及变更的skill列表；
+              增量刷新时 invalidated_bundles 为内容可能变化的下载bundle
+    """
+    with _refresh_lock:
+        old_catalog = current_catalog()
+        new_head = get_head_commit()
+
+        changed = None
+        if not full_rescan and old_catalog.head and new_head:
+            if old_catalog.head == new_head:
+                return {'mode': 'unchanged', 'head': new_head, 'version': old_catalog.version}
+            changed = get_changed_skill_ids(old_catalog.head, new_head)
+
+        if changed is None:
+            skills = rescan_all_skills()
+            resolve_source_dependencies(skills)
+            update_all_dependents(skills)
+            update_tree_hashes(skills)
+            update_file_stats(skills, list(skills))
+            catalog = publish_catalog(skills, new_head)
+            persist_catalog(catalog)
+            return {'mode': 'full', 'head': new_head, 'version': catalog.version}
+
+        skills = old_catalog.copy_skills()
+        result = refresh_skills(skills, changed)
+        resolve_source_dependencies(skills)
+        update_all_dependents(skills)
+        update_tree_hashes(skills)
+        # 未变更的skill沿用已有记录中的文件统计
+        update_file_stats(skills, result['updated'])
+        catalog = publish_catalog(skills, new_head)
+        persist_catalog(catalog)
+        invalidated = invalidated_bundles(result['updated'] + result['removed'], old_catalog.graph, catalog.graph)
+        return {'mode': 'incremental', 'head': new_head, 'version': catalog.version, **result,
+                'invalidated_bundles': sorted(invalidated)}
+
+
+def persist_catalog(catalog: CatalogSnapshot):
+    """
+    将目录快照写入持久化索引文件，再更新目录版本文件通知其他 worker 重新加载；
+    失败时只打印错误（不影响已发布的快照）
+    """
+    try:
+        save_catalog(INDEX_DB_PATH, dict(catalog.skills), catalog.head, catalog.version, LOCAL_DIR, catalog.root)
+        write_version_file(CATALOG_VERSION_PATH, {
+            'version': catalog.version,
+            'head': catalog.head,
+            'pid': os.getpid(),
+            'published_at': catalog.created_at,
+        })
+    except Exception as e:
+        print(f"Error saving catalog index: {e}")
+
+
+def load_persisted_catalog(refresh: bool = True) -> bool:
+    """
+    加载持久化索引并发布为当前快照：
+    索引的HEAD与本地仓库一致时直接使用；不一致时以索引的HEAD为基准增量刷新
+
+    Args:
+        refresh: 加载后是否按本地仓库刷新索引（非 sync leader 的 worker 只加载，不写入索引）
+
+    Returns:
+        bool: 是否成功加载
+    """
+    if not os.path.exists(checkout_root()):
+        return False
+
+    with _refresh_lock:
+        data = load_catalog(INDEX_DB_PATH, LOCAL_DIR)
+        if data is None or not data['head']:
+            return False
+        # 索引记录的检出目录已被清理时使用当前检出（leader 随后的刷新会按实际HEAD修正）
+        root = data['root'] if data['root'] and os.path.isdir(data['root']) else None
+        publish_catalog(data['skills'], data['head'], data['version'], root)
+
+    if refresh:
+        refresh_index()
+    return True
+
+
+def reload_published_catalog() -> bool:
+    """
+    非 sync leader 的 worker：目录版本文件中的版本比当前快照新时，重新加载持久化索引
+
+    Returns:
+        bool: 是否加载了新快照
+    """
+    published = read_version_file(CATALOG_VERSION_PATH)
+    if not published or published.get('version', 0) <= current_catalog().version:
+        return False
+    if not load_persisted_catalog(refresh=False):
+        return False
+    catalog = current_catalog()
+    print(f"🔄 已加载 leader 发布的目录快照: 版本 {catalog.version}，{len(catalog.skills)} 个skill")
+    return True
+
+
+def invalidated_bundles(changed_skill_ids, old_graph: DependencyGraph, new_graph: DependencyGraph) -> set:
+    """
+    计算skill变更后内容可能变化的下载bundle：all、变更skill自身的bundle，
+    以及所有直接或传递依赖它的skill的 -with-deps bundle
+
+    同时查询刷新前后的依赖图：已删除的skill只存在于旧图中，新增的skill只存在于新图中
+
+    Args:
+        changed_skill_ids: 更新或删除的skill ID
+        old_graph: 刷新前的依赖图
+        new_graph: 刷新后的依赖图
+
+    Returns:
+        set: bundle ID集合
+    """
+    bundles = {'all'}
+    for skill_id in changed_skill_ids:
+        bundles.add(skill_id)
+        bundles.add(f"{skill_id}-with-deps")
+        for graph in (old_graph, new_graph):
+            for dependent_id, _ in graph.dependents_of(skill_id, transitive=True):
+                bundles.add(f"{dependent_id}-with-deps")
+
+    # 包含变更skill的批量下载bundle
+    changed = set(changed_skill_ids)
+    bundles.update(bundle_id for bundle_id, skill_ids in iter_batch_definitions() if changed.intersection(skill_ids))
+    return bundles
+
+
+def scan_skill_files(skill_id: str) -> dict:
+    """
+    遍历一次skill文件夹，统计文件信息并计算基于文件路径、大小和修改时间的指纹
+
+    文件数量和大小不统计隐藏文件夹（如.git）下的文件；指纹覆盖全部文件（与打包内容一致）
+
+    Returns:
+        dict: {'file_count', 'total_size_bytes', 'stat_hash'}
+    """
+    skill_path = os.path.join(checkout_root(), skill_id)
+    file_count = 0
+    total_size = 0
+    digest = hashlib.sha1()
+
+    for root, dirs, files in os.walk(skill_path):
+        dirs.sort()
+        rel_root = os.path.relpath(root, skill_path)
+        hidden = any(part.startswith('.') for part in rel_root.split(os.sep) if part != '.')
+        for f in sorted(files):
+            file_path = os.path.join(root, f)
+            try:
+                st = os.stat(file_path)
+            except OSError:
+                continue
+            rel_path = os.path.relpath(file_path, skill_path)
+            digest.update(f"{rel_path}:{st.st_size}:{st.st_mtime_ns}\n".encode('utf-8'))
+            if not hidden:
+                file_count += 1
+                total_size += st.st_size
+
+    return {'file_count': file_count, 'total_size_bytes': total_size, 'stat_hash': 'stat-' + digest.hexdigest()}
+
+
+def update_file_stats(skills: dict, skill_ids):
+    """
+    更新指定skill的文件统计和内容哈希，写入skills[skill_id]的
+    file_count / total_size_bytes / content_hash 字段
+
+    内容哈希优先使用git tree hash，不在git中（如未提交的文件夹）时使用文件指纹；
+    需在 update_tree_hashes 之后调用
+    """
+    for skill_id in skill_ids:
+        info = skills.get(skill_id)
+        if info is None:
+            continue
+        stats = scan_skill_files(skill_id)
+        info['file_count'] = stats['file_count']
+        info['total_size_bytes'] = stats['total_size_bytes']
+        info['content_hash'] = info.get('tree_hash') or stats['stat_hash']
+
+
+def read_tree_hashes(repo_dir: str):
+    """
+    通过一次 git ls-tree 读取HEAD中每个一级文件夹的tree hash
+
+    Returns:
+        dict: 文件夹名 -> tree hash；读取失败时返回None
+    """
+    try:
+        code, out, err = run_command(["git", "ls-tree", "-z", "HEAD"], cwd=repo_dir)
+    except Exception as e:
+        print(f"Error reading tree hashes: {e}")
+        return None
+    if code != 0:
+        print(f"Error reading tree hashes: {err}")
+        return None
+
+    tree_hashes = {}
+    for entry in out.split('\0'):
+        # 格式: <mode> <type> <hash>\t<name>
+        if '\t' not in entry:
+            continue
+        meta, name = entry.split('\t', 1)
+        parts = meta.split()
+        if len(parts) == 3 and parts[1] == 'tree':
+            tree_hashes[name] = parts[2]
+    return tree_hashes
+
+
+def update_tree_hashes(skills: dict):
+    """
+    通过一次 git ls-tree 读取HEAD中每个skill文件夹的tree hash，写入skills[skill_id]['tree_hash']
+
+    tree hash 只随文件夹内容变化，用作压缩包缓存的内容地址。
+    多来源时分别读取各 git 来源的检出目录；本地目录来源没有 tree hash，使用文件指纹。
+    """
+    if SKILL_SOURCES:
+        manifest = read_view_manifest(checkout_root()) or {'sources': {}}
+        tree_hashes = {}
+        for name, state in manifest['sources'].items():
+            if state['type'] == 'git':
+                hashes = read_tree_hashes(state['root']) or {}
+                tree_hashes.update({qualify(name, local_id): tree for local_id, tree in hashes.items()})
+    else:
+        tree_hashes = read_tree_hashes(checkout_root())
+        if tree_hashes is None:
+            return
+
+    for skill_id, info in skills.items():
+        if skill_id in tree_hashes:
+            info['tree_hash'] = tree_hashes[skill_id]
+        else:
+            info.pop('tree_hash', None)
+
+
+# 压缩包构建线程池及进行中的构建任务（缓存路径 -> Future）
+archive_build_executor = ThreadPoolExecutor(max_workers=ARCHIVE_BUILD_WORKERS, thread_name_prefix='archive-build')
+
+
+def _lower_thread_priority():
+    """调低当前线程的调度优先级（不支持的平台忽略）"""
+    try:
+        tid = threading.get_native_id()
+        os.setpriority(os.PRIO_PROCESS, tid, os.getpriority(os.PRIO_PROCESS, tid) + PREWARM_NICE)
+    except (AttributeError, OSError):
+        pass
+
+
+# 预构建线程池：单线程、低优先级，逐个构建，不占用用户请求的构建线程
+prewarm_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='cache-prewarm',
+                                      initializer=_lower_thread_priority)
+_inflight_builds = {}
+_inflight_lock = Lock()
+
+
+def cache_file_kind(path: str) -> str:
+    """缓存文件的bundle类型（指标标签），skill片段为 fragment"""
+    if os.path.dirname(path) == FRAGMENT_DIR:
+        return 'fragment'
+    return cache_file_bundle_type(os.path.basename(path))
+
+
+def _record_eviction(path: str, reason: str):
+    CACHE_EVICTIONS.inc(bundle_type=cache_file_kind(path), reason=reason)
+
+
+# 缓存容量管理：按缓存目录实际大小及文件修改时间（访问时间）淘汰，预算由所有 worker 共享；命中统计按进程记录
+cache_manager = CacheManager(CACHE_MAX_BYTES, CACHE_MIN_IDLE_SECONDS, on_evict=_record_eviction)
+
+
+def count_cleared_cache():
+    """整体删除缓存目录前，按bundle类型记录将被删除的缓存文件数"""
+    for dir_path, kind_of in ((CACHE_DIR, cache_file_bundle_type), (FRAGMENT_DIR, lambda name: 'fragment')):
+        if not os.path.isdir(dir_path):
+            continue
+        for entry in os.scandir(dir_path):
+            if entry.is_file() and not entry.name.endswith('.tmp'):
+                CACHE_EVICTIONS.inc(bundle_type=kind_of(entry.name), reason='clear')
+
+
+def clear_cache():
+    """清理压缩包缓存"""
+    if os.path.exists(CACHE_DIR):
+        count_cleared_cache()
+        shutil.rmtree(CACHE_DIR)
+        cache_manager.reset()
+        print("🗑️  已清理压缩包缓存")
+
+
+def skill_content_hash(skill_id: str, catalog: CatalogSnapshot = None) -> str:
+    """
+    获取skill内容的哈希：读取建索引时写入的content_hash，
+    记录中没有时（如索引刷新前）现场扫描文件计算
+    """
+    info = (catalog or current_catalog()).skills.get(skill_id, {})
+    content_hash = info.get('content_hash') or info.get('tree_hash')
+    if content_hash:
+        return content_hash
+    return scan_skill_files(skill_id)['stat_hash']
+
+
+def resolve_bundle(bundle_id: str, catalog: CatalogSnapshot = None):
+    """
+    解析下载标识对应需要打包的skill列表
+
+    Args:
+        bundle_id: all / {skill_id} / {skill_id}-with-deps / .batch-{digest}（由 resolve_batch 保存定义）
+        catalog: 使用的目录快照（默认当前快照）
+
+    Returns:
+        list: 需要打包的skill ID列表（已过滤不存在的skill，按安装顺序排列，依赖在前）；主skill不存在时返回None
+    """
+    catalog = catalog or current_catalog()
+    skills = catalog.skills
+
+    if bundle_id == "all":
+        return list(skills.keys())
+
+    if BATCH_BUNDLE_PATTERN.match(bundle_id):
+        canonical = load_batch_definition(bundle_id)
+        return (catalog.graph.install_order_of(canonical) or None) if canonical else None
+
+    if bundle_id.endswith("-with-deps"):
+        actual_skill_id = bundle_id[:-len("-with-deps")]
+        skills_to_package = collect_all_dependencies(actual_skill_id, catalog) + [actual_skill_id]
+    else:
+        actual_skill_id = bundle_id
+        skills_to_package = [actual_skill_id]
+
+    if actual_skill_id not in skills:
+        return None
+
+    return [sid for sid in skills_to_package if sid in skills]
+
+
+# 批量下载的URL路径标识：/download/batch?skills=a,b,c（仓库中有名为 batch 的skill时，不带 skills 参数即下载该skill）
+BATCH_DOWNLOAD_ID = "batch"
+
+# 批量下载bundle ID：.batch-{排序后skill集合的摘要}；skill ID 不会以 . 开头（隐藏文件夹不是skill），两者不会冲突
+BATCH_BUNDLE_PATTERN = re.compile(r'^\.batch-[0-9a-f]{16}$')
+
+
+def is_batch_request(skill_id: str, skills_param: str, catalog: CatalogSnapshot) -> bool:
+    """下载路径是否为批量下载：/download/batch 带 skills 参数，或仓库中没有名为 batch 的skill"""
+    return skill_id == BATCH_DOWNLOAD_ID and (bool(skills_param) or BATCH_DOWNLOAD_ID not in catalog)
+
+
+def batch_definition_path(bundle_id: str) -> str:
+    return os.path.join(BATCH_DIR, f"{bundle_id}.json")
+
+
+def save_batch_definition(bundle_id: str, canonical: tuple):
+    """
+    保存批量下载bundle的定义：bundle ID 由内容摘要得到，同一ID的定义不会变化，
+    已存在时只更新修改时间（清理时据此保留最近使用的定义）
+    """
+    path = batch_definition_path(bundle_id)
+    try:
+        os.utime(path)
+        return
+    except FileNotFoundError:
+        pass
+    os.makedirs(BATCH_DIR, exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(list(canonical), f, ensure_ascii=False)
+    os.replace(tmp_path, path)
+
+
+def load_batch_definition(bundle_id: str):
+    """读取批量下载bundle的skill集合，定义不存在或无法读取时返回None"""
+    try:
+        with open(batch_definition_path(bundle_id), encoding='utf-8') as f:
+            return tuple(json.load(f))
+    except (OSError, ValueError):
+        return None
+
+
+def iter_batch_definitions():
+    """遍历已保存的批量下载bundle定义：(bundle_id, skill集合)"""
+    if not os.path.isdir(BATCH_DIR):
+        return
+    for file_name in os.listdir(BATCH_DIR):
+        bundle_id, ext = os.path.splitext(file_name)
+        if ext == '.json' and BATCH_BUNDLE_PATTERN.match(bundle_id):
+            canonical = load_batch_definition(bundle_id)
+            if canonical:
+                yield bundle_id, canonical
+
+
+def prune_batch_definitions() -> int:
+    """删除已没有任何缓存压缩包、且超过 STALE_TMP_SECONDS 未被请求的批量下载bundle定义"""
+    referenced = set()
+    if os.path.isdir(CACHE_DIR):
+        for file_name in os.listdir(CACHE_DIR):
+            match = CACHE_FILE_PATTERN.match(file_name)
+            if match:
+                referenced.add(match.group('bundle_id'))
+
+    removed = 0
+    if os.path.isdir(BATCH_DIR):
+        # 旧版本以 batch-{digest} 命名的定义已不会再被引用
+        for file_name in os.listdir(BATCH_DIR):
+            bundle_id, ext = os.path.splitext(file_name)
+            if ext == '.json' and not BATCH_BUNDLE_PATTERN.match(bundle_id):
+                with contextlib.suppress(OSError):
+                    os.remove(os.path.join(BATCH_DIR, file_name))
+                    removed += 1
+    for bundle_id, _ in list(iter_batch_definitions()):
+        path = batch_definition_path(bundle_id)
+        try:
+            if bundle_id in referenced or time.time() - os.path.getmtime(path) < STALE_TMP_SECONDS:
+                continue
+            os.remove(path)
+            removed += 1
+        except OSError:
+            continue
+    return removed
+
+
+def parse_skill_list(skills_param: str) -> list:
+    """解析逗号分隔的skill ID列表（去除空白、去重，保持顺序）"""
+    return list(dict.fromkeys(sid.strip() for sid in (skills_param or '').split(',') if sid.strip()))
+
+
+def resolve_batch(skill_ids: list, catalog: CatalogSnapshot = None):
+    """
+    解析批量下载：多个skill及其传递依赖的并集
+
+    bundle ID 由排序后的skill集合计算，解析结果相同的请求（无论请求了哪些skill、顺序如何）
+    共用同一个bundle ID，从而共用同一个缓存压缩包
+
+    Args:
+        skill_ids: 请求下载的skill ID列表
+        catalog: 使用的目录快照（默认当前快照）
+
+    Returns:
+        tuple: (bundle_id, 按安装顺序排列的skill列表)
+
+    Raises:
+        ValueError: 列表为空或包含不存在的skill
+    """
+    catalog = catalog or current_catalog()
+    if not skill_ids:
+        raise ValueError("请指定至少一个 skill")
+    missing = [sid for sid in skill_ids if sid not in catalog]
+    if missing:
+        raise ValueError(f"Skill not found: {', '.join(missing)}")
+
+    resolved = set(skill_ids)
+    for sid in skill_ids:
+        resolved.update(catalog.graph.dependencies_of(sid))
+    canonical = tuple(sorted(resolved))
+
+    digest = hashlib.sha1("\n".join(canonical).encode('utf-8')).hexdigest()[:16]
+    bundle_id = f".batch-{digest}"
+    save_batch_definition(bundle_id, canonical)
+    return bundle_id, catalog.graph.install_order_of(canonical)
+
+
+def bundle_type(bundle_id: str) -> str:
+    """bundle类型（指标标签）：all / batch / with-deps / single"""
+    if bundle_id == "all":
+        return "all"
+    if BATCH_BUNDLE_PATTERN.match(bundle_id):
+        return "batch"
+    if bundle_id.endswith("-with-deps"):
+        return "with-deps"
+    return "single"
+
+
+def cache_file_bundle_type(file_name: str) -> str:
+    """由压缩包缓存文件名得到bundle类型，无法识别的文件为 unknown"""
+    match = CACHE_FILE_PATTERN.match(file_name)
+    if not match:
+        return "unknown"
+    return bundle_type(match.group('bundle_id'))
+
+
+def bundle_cache_key(skill_ids: list, archive_format: str = DEFAULT_ARCHIVE_FORMAT,
+                     catalog: CatalogSnapshot = None, bundle_id: str = None) -> str:
+    """
+    根据压缩包格式及包内各skill（按打包顺序）的内容哈希计算缓存键：
+    内容不变则键不变，键相同则压缩包字节完全相同（tar条目不记录检出目录的修改时间、属主等，
+    见 normalize_tar_member），因此同时用作下载的强ETag
+
+    计算需要遍历包内所有skill（all 有数万个时约数十毫秒）；传入 bundle_id 时结果按 (bundle_id, 格式)
+    记录在目录快照上，同一快照内同一bundle只计算一次（快照不可变，bundle_id 唯一确定skill列表）
+    """
+    catalog = catalog or current_catalog()
+    memo_key = (bundle_id, archive_format)
+    if bundle_id is not None:
+        cached = catalog.bundle_keys.get(memo_key)
+        if cached is not None:
+            return cached
+
+    digest = hashlib.sha1()
+    digest.update(f"format:{archive_format}\nlayout:{ARCHIVE_LAYOUT_VERSION}\n".encode('utf-8'))
+    for sid in skill_ids:
+        digest.update(f"{sid}:{skill_content_hash(sid, catalog)}\n".encode('utf-8'))
+    cache_key = digest.hexdigest()[:16]
+    if bundle_id is not None:
+        catalog.bundle_keys[memo_key] = cache_key
+    return cache_key
+
+
+def bundle_cache_path(bundle_id: str, cache_key: str, archive_format: str = DEFAULT_ARCHIVE_FORMAT) -> str:
+    """压缩包缓存路径：{bundle_id}.{内容键}.{格式}.{扩展名}，每种格式独立缓存"""
+    return os.path.join(CACHE_DIR, f"{bundle_id}.{cache_key}.{archive_format}.{ARCHIVE_FORMATS[archive_format]['ext']}")
+
+
+def available_archive_formats() -> list:
+    """当前可用的压缩包格式（zst 需要安装 zstandard）"""
+    return [fmt for fmt, spec in ARCHIVE_FORMATS.items() if spec['codec'] != 'zstd' or zstandard is not None]
+
+
+def negotiate_archive_format(requested: str, accept_encoding: str):
+    """
+    选择压缩包格式：显式指定的format优先；
+    否则参考Accept-Encoding：明确列出gzip时使用默认格式，只列出zstd（且可用）时使用zst，其余情况使用默认格式。
+    Accept-Encoding 描述的是传输编码而不是压缩包格式，identity（如 wget 默认发送的）不会选择不压缩的tar，
+    tar 只能通过 format 参数指定
+
+    Returns:
+        str: 格式名；指定的格式不可用时返回None
+    """
+    if requested:
+        return requested if requested in available_archive_formats() else None
+    if not accept_encoding:
+        return DEFAULT_ARCHIVE_FORMAT
+
+    accepted = {}
+    for part in accept_encoding.split(','):
+        coding, _, params = part.partition(';')
+        q = 1.0
+        params = params.strip()
+        if params.startswith('q='):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        accepted[coding.strip().lower()] = q
+
+    if accepted.get('gzip', 0) > 0:
+        return DEFAULT_ARCHIVE_FORMAT
+    if zstandard is not None and accepted.get('zstd', 0) > 0:
+        return 'zst'
+    return DEFAULT_ARCHIVE_FORMAT
+
+
+def etag_matches(if_none_match: str, etag: str) -> bool:
+    """判断If-None-Match是否命中ETag（弱比较，忽略W/前缀）"""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == '*':
+        return True
+    return any(tag.strip().removeprefix('W/') == etag for tag in if_none_match.split(','))
+
+
+def build_install_instruction(target_dir: str, archive_name: str, download_url: str, cache_key: str,
+                              archive_format: str = DEFAULT_ARCHIVE_FORMAT) -> str:
+    """
+    生成客户端安装命令：
+    - 压缩包以内容键命名保存在 {target_dir}/.skill-downloads 下，内容未变化时重复安装不再下载
+    - 下载先写入 .part 文件，中断后重新执行通过 Range 续传；
+      If-Range 携带内容键，服务端内容已变化时不会续传拼接出错误的文件
+    - 解压前删除同名技能的旧版本压缩包：只匹配 {archive_name}-{16位内容键}.tar*，
+      不会误删ID以相同前缀开头的其他技能（如安装 foo 时的 foo-bar-{内容键}.tar.gz）
+    """
+    spec = ARCHIVE_FORMATS[archive_format]
+    download_dir = f"{target_dir}/.skill-downloads"
+    archive_file = f"{archive_name}-{cache_key}.{spec['ext']}"
+    archive = f"{download_dir}/{archive_file}"
+    old_archives = f"{archive_name}-{'[0-9a-f]' * len(cache_key)}.tar*"
+    return (
+        f"mkdir -p {download_dir} && "
+        f"(test -f {archive} || (curl -fsSL -C - -H 'If-Range: \"{cache_key}\"' -o {archive}.part '{download_url}' && mv {archive}.part {archive})) && "
+        f"find {download_dir} -name '{old_archives}' ! -name '{archive_file}' -delete && "
+        f"tar {spec['tar_flags']} {archive} -C {target_dir}/"
+    )
+
+
+# 客户端安装目录下记录已安装skill及其内容哈希的清单文件，用于增量下载
+MANIFEST_FILE_NAME = ".skill-manifest.json"
+
+# 允许出现在客户端清单及删除命令中的skill ID
+SAFE_SKILL_ID_PATTERN = re.compile(r'^[A-Za-z0-9_][A-Za-z0-9_.-]*$')
+
+
+def parse_installed_manifest(installed) -> dict:
+    """
+    校验客户端提交的已安装清单：{skill_id: content_hash}
+
+    Raises:
+        ValueError: 清单格式不正确或包含非法的skill ID
+    """
+    if not isinstance(installed, dict):
+        raise ValueError("installed 必须是 {skill_id: content_hash} 格式的对象")
+    for skill_id, content_hash in installed.items():
+        if not isinstance(skill_id, str) or not SAFE_SKILL_ID_PATTERN.match(skill_id):
+            raise ValueError(f"非法的 skill ID: {skill_id!r}")
+        if not isinstance(content_hash, str):
+            raise ValueError(f"skill '{skill_id}' 的内容哈希必须是字符串")
+    return installed
+
+
+def compute_delta(skill_ids: list, installed: dict, catalog: CatalogSnapshot) -> dict:
+    """
+    对比客户端已安装清单与当前内容，计算增量
+
+    Args:
+        skill_ids: bundle中的skill（安装顺序）
+        installed: 客户端已安装的 {skill_id: content_hash}
+        catalog: 目录快照
+
+    Returns:
+        dict: {
+            'added': 未安装的skill, 'changed': 内容已变化的skill, 'unchanged': 无需下载的skill,
+            'removed': 已从仓库删除的已安装skill（客户端应删除）,
+            'manifest': 安装完成后客户端的新清单
+        }
+    """
+    added, changed, unchanged = [], [], []
+    manifest = {sid: content_hash for sid, content_hash in installed.items() if sid in catalog}
+    for sid in skill_ids:
+        content_hash = skill_content_hash(sid, catalog)
+        if sid not in installed:
+            added.append(sid)
+        elif installed[sid] != content_hash:
+            changed.append(sid)
+        else:
+            unchanged.append(sid)
+        manifest[sid] = content_hash
+
+    return {
+        'added': added,
+        'changed': changed,
+        'unchanged': unchanged,
+        'removed': sorted(sid for sid in installed if sid not in catalog),
+        'manifest': dict(sorted(manifest.items())),
+    }
+
+
+def build_delta_install_instruction(target_dir: str, delta_url: str, delta: dict, has_manifest: bool,
+                                    archive_format: str = DEFAULT_ARCHIVE_FORMAT) -> str:
+    """
+    生成增量安装命令：
+    - 先删除内容已变化和已从仓库删除的skill目录（变化的skill整体替换，不残留已删除的文件）
+    - 将客户端清单POST到增量下载端点，响应只包含新增和变化的skill以及新的清单文件，直接管道解压
+    """
+    spec = ARCHIVE_FORMATS[archive_format]
+    if not delta['added'] and not delta['changed'] and not delta['removed']:
+        return "echo 'skills 已是最新，无需下载'"
+
+    steps = [f"mkdir -p {target_dir}"]
+    stale = delta['changed'] + delta['removed']
+    if stale:
+        steps.append("rm -rf " + " ".join(f"{target_dir}/{sid}" for sid in stale))
+
+    body = f"--data-binary @- < {target_dir}/{MANIFEST_FILE_NAME}" if has_manifest else "--data '{}'"
+    steps.append(
+        f"curl -fsSL -X POST -H 'Content-Type: application/json' '{delta_url}' {body} | "
+        f"tar {spec['delta_tar_flags']} - -C {target_dir}/"
+    )
+    return " && ".join(steps)
+
+
+CACHE_FILE_PATTERN = re.compile(r'^(?P<bundle_id>.+)\.(?P<key>[0-9a-f]{16})\.(?P<format>[a-z-]+)\.tar(\.gz|\.zst)?$')
+
+
+class ArchiveStream:
+    """
+    边构建边输出的压缩包流
+
+    构建线程写入的数据同时写入文件（缓存临时文件或增量压缩包临时文件）和有界缓冲区，响应生成器从缓冲区读取；
+    写入、完成和失败都会立即唤醒响应生成器，响应结束不需要等待轮询。
+
+    构建线程从不等待客户端：缓冲区已满就停止推送，构建完成后由响应生成器从文件中未推送的位置继续读取，
+    慢速下载不会占用构建线程（及其持有的构建锁）。客户端断开后不再推送，构建继续完成。
+    """
+
+    def __init__(self):
+        self.attached = False
+        self._chunks = collections.deque()
+        self._cond = threading.Condition()
+        self._detached = False
+        self._ended = False
+        self._error = None
+        self._tail = None  # (路径, 偏移, 读取后是否删除)：缓冲区之后的内容从该文件读取
+        self._file = None
+        self._sent = 0
+        self._lag_offset = None
+        self._last_write = time.monotonic()
+
+    def tee(self, fileobj):
+        """设置同时写入的文件，返回自身作为写入目标；客户端跟不上时不等待，构建完成后调用 follow 从该文件继续推送"""
+        self._file = fileobj
+        return self
+
+    def write(self, data) -> int:
+        self._file.write(data)
+        with self._cond:
+            self._last_write = time.monotonic()
+            if self._lag_offset is None and not self._detached:
+                if len(self._chunks) < STREAM_QUEUE_CHUNKS:
+                    self._chunks.append(bytes(data))
+                    self._sent += len(data)
+                    self._cond.notify_all()
+                else:
+                    self._lag_offset = self._sent
+        return len(data)
+
+    def tell(self) -> int:
+        return self._file.tell()
+
+    def finish(self):
+        self._end()
+
+    def fail(self, exc: Exception):
+        self._end(exc)
+
+    def follow(self, path: str, remove: bool = False) -> bool:
+        """
+        构建完成后调用：客户端曾跟不上构建时，剩余内容由响应生成器从文件读取；
+        remove 为 True 时文件由响应生成器读取后删除
+
+        Returns:
+            bool: 响应生成器是否会读取该文件（False 时文件已不再需要）
+        """
+        with self._cond:
+            if self._lag_offset is None or self._detached:
+                return False
+            self._tail = (path, self._lag_offset, remove)
+            return True
+
+    def replay(self, path: str):
+        """由响应生成器读取已构建好的缓存文件（其他进程已完成同一构建时使用）"""
+        with self._cond:
+            self._tail = (path, 0, False)
+
+    def _end(self, error: Exception = None):
+        with self._cond:
+            if not self._ended:
+                self._ended = True
+                self._error = error
+            self._cond.notify_all()
+
+    def _next_chunk(self):
+        """等待下一块数据；正常结束返回None，失败时抛出构建的异常"""
+        with self._cond:
+            while not self._chunks and not self._ended:
+                remaining = self._last_write + STREAM_STALL_SECONDS - time.monotonic()
+                if remaining <= 0:
+                    raise TimeoutError(f"压缩包构建超过 {STREAM_STALL_SECONDS} 秒没有输出数据，响应已中断")
+                self._cond.wait(remaining)
+            if self._chunks:
+                chunk = self._chunks.popleft()
+                self._cond.notify_all()
+                return chunk
+            if self._error is not None:
+                raise self._error
+            return None
+
+    def __iter__(self):
+        try:
+            while True:
+                chunk = self._next_chunk()
+                if chunk is None:
+                    break
+                yield chunk
+            if self._tail:
+                path, offset, _ = self._tail
+                with open(path, 'rb') as f:
+                    f.seek(offset)
+                    yield from iter(lambda: f.read(64 * 1024), b'')
+        finally:
+            with self._cond:
+                self._detached = True
+                self._chunks.clear()
+                tail = self._tail
+            if tail and tail[2]:
+                with contextlib.suppress(OSError):
+                    os.remove(tail[0])
+
+
+FRAGMENT_FILE_PATTERN = re.compile(
+    r'^(?P<skill_id>.+)\.(?P<hash>[0-9a-z-]+)\.(?P<format>[a-z-]+)\.v(?P<layout>\d+)\.frag$')
+
+# 各格式压缩后的tar归档结束块（两个全零块），拼接在所有片段之后
+_archive_trailers = {}
+
+
+def open_compressed_writer(fileobj, archive_format: str):
+    """
+    返回向fileobj写入一个独立压缩单元（gzip member / zstd frame）的上下文管理器，
+    退出时写完该压缩单元，但不关闭fileobj；tar格式直接写入
+    """
+    spec = ARCHIVE_FORMATS[archive_format]
+    if spec['codec'] == 'gzip':
+        return gzip.GzipFile(filename='', mode='wb', fileobj=fileobj, mtime=0, compresslevel=spec['level'])
+    if spec['codec'] == 'zstd':
+        return zstandard.ZstdCompressor(level=spec['level']).stream_writer(fileobj, closefd=False)
+    return contextlib.nullcontext(fileobj)
+
+
+def archive_trailer(archive_format: str) -> bytes:
+    """获取指定格式压缩后的归档结束块"""
+    if archive_format not in _archive_trailers:
+        buf = io.BytesIO()
+        with open_compressed_writer(buf, archive_format) as writer:
+            writer.write(b'\0' * tarfile.BLOCKSIZE * 2)
+        _archive_trailers[archive_format] = buf.getvalue()
+    return _archive_trailers[archive_format]
+
+
+def normalize_tar_member(member: tarfile.TarInfo) -> tarfile.TarInfo:
+    """
+    去掉tar条目中与检出目录相关的元数据（修改时间、属主、权限掩码），
+    同一内容无论何时、由哪个检出目录打包，生成的字节都相同
+    """
+    member.mtime = 0
+    member.uid = member.gid = 0
+    member.uname = member.gname = ''
+    member.mode = 0o755 if member.isdir() or member.mode & 0o111 else 0o644
+    return member
+
+
+def write_skill_fragment(fileobj, skill_id: str, archive_format: str, root: str = None):
+    """将单个skill的tar条目（不含归档结束块）压缩为一个独立压缩单元写入fileobj，root为检出目录（默认当前检出目录）"""
+    with open_compressed_writer(fileobj, archive_format) as writer:
+        tar = tarfile.open(fileobj=writer, mode='w')
+        # 多来源时视图目录中的skill是符号链接，打包其指向的文件夹
+        tar.add(os.path.realpath(os.path.join(root or checkout_root(), skill_id)), arcname=skill_id,
+                filter=normalize_tar_member)
+        # 不调用 tar.close()：close 会写入归档结束块，结束块由 archive_trailer 统一追加
+
+
+def build_skill_fragment(skill_id: str, archive_format: str = DEFAULT_ARCHIVE_FORMAT,
+                         catalog: CatalogSnapshot = None) -> str:
+    """
+    获取skill的预压缩tar片段，不存在则创建
+
+    片段是一个独立的压缩单元（gzip member / zstd frame），内容为该skill的tar条目但不含归档结束块；
+    多个gzip member（或zstd frame）拼接后仍是合法的压缩流，因此压缩包只需按顺序拼接片段并追加结束块，
+    无需重新压缩。片段按skill内容哈希和格式命名，skill不变时可被所有压缩包复用。
+    片段内容从目录快照对应的检出目录读取，与内容哈希保持一致。
+    """
+    catalog = catalog or current_catalog()
+    fragment_name = f"{skill_id}.{skill_content_hash(skill_id, catalog)}.{archive_format}.v{ARCHIVE_LAYOUT_VERSION}.frag"
+    fragment_path = os.path.join(FRAGMENT_DIR, fragment_name)
+    if os.path.exists(fragment_path):
+        CACHE_REQUESTS.inc(bundle_type='fragment', result='hit')
+        cache_manager.hit(fragment_path, 'fragment')
+        return fragment_path
+
+    CACHE_REQUESTS.inc(bundle_type='fragment', result='miss')
+    cache_manager.miss('fragment')
+    os.makedirs(FRAGMENT_DIR, exist_ok=True)
+    tmp_path = f"{fragment_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        with open(tmp_path, 'wb') as f:
+            write_skill_fragment(f, skill_id, archive_format, catalog.root)
+        os.replace(tmp_path, fragment_path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    cache_manager.add(fragment_path)
+    return fragment_path
+
+
+def write_manifest_fragment(fileobj, manifest: dict, archive_format: str):
+    """将客户端清单文件作为单独的tar条目压缩写入fileobj（不含归档结束块）"""
+    data = json.dumps({'skills': manifest}, ensure_ascii=False, indent=2).encode('utf-8')
+    member = tarfile.TarInfo(MANIFEST_FILE_NAME)
+    member.size = len(data)
+    member.mode = 0o644
+    member.mtime = int(time.time())
+    with open_compressed_writer(fileobj, archive_format) as writer:
+        tar = tarfile.open(fileobj=writer, mode='w')
+        tar.addfile(member, io.BytesIO(data))
+        # 不调用 tar.close()：结束块由 archive_trailer 统一追加
+
+
+def write_delta_archive(stream: "ArchiveStream", skill_ids: list, manifest: dict,
+                        archive_format: str = DEFAULT_ARCHIVE_FORMAT, catalog: CatalogSnapshot = None):
+    """
+    生成增量压缩包推送给流式响应（不写入缓存）：
+    复用各skill的预压缩片段，最后追加新的清单文件和归档结束块
+
+    与完整压缩包相同，数据同时写入缓存目录下的临时文件，客户端跟不上时剩余内容由响应从该文件读取，
+    构建线程不等待客户端；临时文件由响应读取完后删除（进程中途退出的残留文件由过期清理删除）
+    """
+    catalog = catalog or current_catalog()
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    tmp_path = os.path.join(CACHE_DIR, f"delta.{os.getpid()}.{threading.get_ident()}.{time.time_ns()}.tmp")
+    handed_over = False
+    try:
+        with using_checkout(catalog.root), open(tmp_path, 'wb') as f:
+            fileobj = stream.tee(f)
+            for sid in skill_ids:
+                with open(build_skill_fragment(sid, archive_format, catalog), 'rb') as fragment:
+                    shutil.copyfileobj(fragment, fileobj)
+            write_manifest_fragment(fileobj, manifest, archive_format)
+            fileobj.write(archive_trailer(archive_format))
+        handed_over = stream.follow(tmp_path, remove=True)
+    except Exception as e:
+        stream.fail(e)
+        raise
+    finally:
+        if not handed_over and os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    stream.finish()
+
+
+def write_archive(fileobj, skill_ids: list, archive_format: str = DEFAULT_ARCHIVE_FORMAT,
+                  catalog: CatalogSnapshot = None):
+    """按顺序拼接各skill的预压缩片段并追加归档结束块，生成压缩包写入fileobj（只顺序写入，不回退）"""
+    for sid in skill_ids:
+        with open(build_skill_fragment(sid, archive_format, catalog), 'rb') as fragment:
+            shutil.copyfileobj(fragment, fileobj)
+    fileobj.write(archive_trailer(archive_format))
+
+
+class _CountingWriter:
+    """只统计写入字节数的fileobj，用于不落盘地测量压缩结果大小"""
+
+    def __init__(self):
+        self.size = 0
+
+    def write(self, data) -> int:
+        self.size += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self.size
+
+
+def measure_archive_formats(skill_ids: list, catalog: CatalogSnapshot = None) -> list:
+    """
+    对每种可用格式实际压缩一次（不读写缓存），统计构建耗时与压缩后大小
+
+    Returns:
+        list: [{'format', 'build_ms', 'size_bytes', 'ratio'}, ...]，按构建耗时升序
+    """
+    catalog = catalog or current_catalog()
+    results = []
+    with using_checkout(catalog.root):
+        for archive_format in available_archive_formats():
+            writer = _CountingWriter()
+            start = time.perf_counter()
+            for sid in skill_ids:
+                write_skill_fragment(writer, sid, archive_format, catalog.root)
+            writer.write(archive_trailer(archive_format))
+            elapsed = time.perf_counter() - start
+            results.append({'format': archive_format, 'build_ms': round(elapsed * 1000, 2), 'size_bytes': writer.size})
+
+    raw_size = next((r['size_bytes'] for r in results if r['format'] == 'tar'), 0)
+    for r in results:
+        r['ratio'] = round(r['size_bytes'] / raw_size, 4) if raw_size else None
+    return sorted(results, key=lambda r: r['build_ms'])
+
+
+def build_archive(cache_file_path: str, skill_ids: list, archive_format: str = DEFAULT_ARCHIVE_FORMAT,
+                  stream: ArchiveStream = None, catalog: CatalogSnapshot = None) -> str:
+    """
+    将skill打包为压缩包：先写入临时文件，完成后原子rename到缓存路径，
+    保证其他请求永远不会读到写了一半的压缩包；指定stream时同时把数据推送给流式响应
+
+    整个压缩包从请求时目录快照对应的检出目录读取，构建期间仓库同步切换检出不影响本次构建
+
+    构建期间持有进程间构建锁：多进程部署时其他 worker 正在构建同一个压缩包则等待其完成，直接使用其结果；
+    构建锁只在写入及rename期间持有，不等待客户端读取（客户端跟不上的部分在释放锁后从缓存文件读取）
+    """
+    catalog = catalog or current_catalog()
+    tmp_path = f"{cache_file_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    labels = {'bundle_type': cache_file_bundle_type(os.path.basename(cache_file_path)), 'format': archive_format}
+    built_elsewhere = False
+    try:
+        with build_lock(BUILD_LOCK_DIR, os.path.basename(cache_file_path)):
+            if os.path.exists(cache_file_path):
+                # 等锁期间其他进程已构建完成
+                cache_manager.touch(cache_file_path)
+                built_elsewhere = True
+            else:
+                start = time.perf_counter()
+                # 缓存目录可能在运行期间被整体删除（如 clear_skill_cache）
+                os.makedirs(os.path.dirname(cache_file_path), exist_ok=True)
+                with using_checkout(catalog.root), open(tmp_path, 'wb') as f:
+                    write_archive(stream.tee(f) if stream else f, skill_ids, archive_format, catalog)
+                    size = f.tell()
+                os.replace(tmp_path, cache_file_path)
+                cache_manager.add(cache_file_path)
+                ARCHIVE_BUILD_DURATION.observe(time.perf_counter() - start, **labels)
+                ARCHIVE_BUILD_BYTES.observe(size, **labels)
+
+        if stream:
+            if built_elsewhere:
+                stream.replay(cache_file_path)
+            else:
+                stream.follow(cache_file_path)
+    except Exception as e:
+        if stream:
+            stream.fail(e)
+        raise
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        with _inflight_lock:
+            _inflight_builds.pop(cache_file_path, None)
+
+    if stream:
+        stream.finish()
+    return cache_file_path
+
+
+def submit_archive_build(cache_file_path: str, skill_ids: list, archive_format: str = DEFAULT_ARCHIVE_FORMAT,
+                         stream: ArchiveStream = None, catalog: CatalogSnapshot = None,
+                         executor: ThreadPoolExecutor = None) -> Future:
+    """
+    提交压缩包构建任务（single-flight）：
+    同一缓存路径正在构建时直接返回进行中的Future，并发请求共享同一次构建（包括后台预构建）；
+    只有新发起的构建才会使用stream（stream.attached 为 True）；executor 默认为 archive_build_executor
+    """
+    with _inflight_lock:
+        future = _inflight_builds.get(cache_file_path)
+        if future is not None:
+            return future
+
+        if os.path.exists(cache_file_path):
+            # 等锁期间其他请求已构建完成
+            future = Future()
+            future.set_result(cache_file_path)
+            return future
+
+        future = (executor or archive_build_executor).submit(build_archive, cache_file_path, skill_ids,
+                                                             archive_format, stream, catalog or current_catalog())
+        _inflight_builds[cache_file_path] = future
+        if stream:
+            stream.attached = True
+        return future
+
+
+# 缓存临时文件超过该时长仍未被rename，视为构建中断的残留文件
+STALE_TMP_SECONDS = 3600
+
+
+# 下载热度：(bundle_id, 压缩包格式) -> 按半衰期衰减的下载次数（启动时 load 统计文件后在 worker 间共享）
+download_popularity = PopularityTracker(PREWARM_HALF_LIFE_HOURS * 3600)
+
+# 最近一次预构建的状态（/healthz 展示），state: idle / running
+_prewarm_status = {
+    'state': 'idle',
+    'catalog_version': None,
+    'started_at': None,
+    'finished_at': None,
+    'built': 0,
+    'cached': 0,
+    'failed': 0,
+}
+
+
+def prewarm_targets(catalog: CatalogSnapshot) -> list:
+    """
+    需要预构建的压缩包：下载热度最高的 PREWARM_TOP_N 个，再加上默认格式的 all（已在其中时不重复）；
+    bundle已不存在（skill被删除）的下载键从热度统计中移除
 
-    Example:
-        >>> analyze_skill_dependencies("devops-flow")
-        ["writing-plans", "executing-plans"]
+    Returns:
+        list: [(bundle_id, 压缩包格式, 按安装顺序排列的skill列表), ...]，按热度从高到低排列
     """
-    skill_path = os.path.join(LOCAL_DIR, skill_id)
+    keys = [key for key, _ in download_popularity.top(PREWARM_TOP_N)] if PREWARM_TOP_N else []
+    if ("all", DEFAULT_ARCHIVE_FORMAT) not in keys:
+        keys.append(("all", DEFAULT_ARCHIVE_FORMAT))
+
+    formats = available_archive_formats()
+    targets = []
+    for bundle_id, archive_format in keys:
+        if archive_format not in formats:
+            continue
+        skill_ids = resolve_bundle(bundle_id, catalog)
+        if not skill_ids:
+            download_popularity.forget((bundle_id, archive_format))
+            continue
+        targets.append((bundle_id, archive_format, skill_ids))
+    return targets
 
-    # 检查skill目录是否存在
-    if not os.path.exists(skill_path):
-        return []
 
-    # 查找skill.md文件（忽略大小写）
-    skill_md_path = None
-    for file_name in os.listdir(skill_path):
-        if file_name.lower() == 'skill.md':
-            skill_md_path = os.path.join(skill_path, file_name)
-            break
+def prewarm_cache(catalog: CatalogSnapshot = None) -> dict:
+    """
+    预构建热门压缩包：同步后过期的压缩包在用户请求前重新构建好，首个下载者无需等待打包
 
-    if not skill_md_path:
-        return []
+    构建在低优先级的单线程池中逐个执行，并与用户请求共享 single-flight；
+    期间发布了更新的目录快照时停止，由那次同步后的预构建接手
 
-    dependencies = set()
+    Returns:
+        dict: {'built': 新构建数, 'cached': 已有缓存数, 'failed': 失败数}
+    """
+    catalog = catalog or current_catalog()
+    counts = {'built': 0, 'cached': 0, 'failed': 0}
+    _prewarm_status.update(state='running', catalog_version=catalog.version, started_at=time.time(),
+                           finished_at=None, **counts)
+    os.makedirs(CACHE_DIR, exist_ok=True)
 
     try:
-        with open(skill_md_path, 'r', encoding='utf-8') as f:
-            content = f.read()
+        for bundle_id, archive_format, skill_ids in prewarm_targets(catalog):
+            if current_catalog().version != catalog.version:
+                print(f"⏭️  目录快照已更新，停止预构建版本 {catalog.version} 的压缩包")
+                break
 
-        # 1. 解析YAML front matter中的dependencies字段
-        # 匹配格式: ---\n...\ndependencies: ['skillA', 'skillB']\n...\n---
-        front_matter_match = re.match(r'^---\s*\n(.*?)\n---', content, re.DOTALL)
-        if front_matter_match:
-            front_matter = front_matter_match.group(1)
-
-            # 匹配dependencies字段，支持多种格式：
-            # dependencies: ['skillA', 'skillB']
-            # dependencies: ["skillA", "skillB"]
-            # dependencies: [skillA, skillB]
-            deps_match = re.search(r'dependencies:\s*\[(.*?)\]', front_matter, re.DOTALL)
-            if deps_match:
-                deps_str = deps_match.group(1)
-                # 提取所有skill名称（去除引号和空格）
-                skill_names = re.findall(r'["\']?([a-zA-Z0-9_-]+)["\']?', deps_str)
-                dependencies.update(skill_names)
-
-        # 2. 扫描文档内容中的<skill>xxx</skill>标签
-        skill_tag_matches = re.findall(r'<skill>([a-zA-Z0-9_-]+)</skill>', content)
-        dependencies.update(skill_tag_matches)
-
-        # 返回去重后的列表（按字母顺序排序，便于查看）
-        return sorted(list(dependencies))
+            cache_key = bundle_cache_key(skill_ids, archive_format, catalog, bundle_id)
+            cache_file_path = bundle_cache_path(bundle_id, cache_key, archive_format)
+            if os.path.exists(cache_file_path):
+                result = 'cached'
+            else:
+                try:
+                    submit_archive_build(cache_file_path, skill_ids, archive_format, catalog=catalog,
+                                         executor=prewarm_executor).result()
+                    result = 'built'
+                except Exception as e:
+                    print(f"Error prewarming {bundle_id} ({archive_format}): {e}")
+                    result = 'failed'
+            counts[result] += 1
+            _prewarm_status[result] += 1
+            CACHE_PREWARM.inc(result=result)
+    finally:
+        _prewarm_status.update(state='idle', finished_at=time.time())
+
+    if counts['built'] or counts['failed']:
+        print(f"🔥 预构建完成: 新构建 {counts['built']} 个，已有缓存 {counts['cached']} 个，失败 {counts['failed']} 个")
+    return counts
+
+
+def _sweep_dir(dir_path: str, is_current, kind_of) -> int:
+    """删除dir_path下is_current(file_name)为False的文件，跳过仍在写入中的临时文件；kind_of(file_name)为指标中的bundle类型"""
+    if not os.path.exists(dir_path):
+        return 0
+
+    removed = 0
+    for file_name in os.listdir(dir_path):
+        file_path = os.path.join(dir_path, file_name)
+        if not os.path.isfile(file_path):
+            continue
 
-    except Exception as e:
-        print(f"Error analyzing dependencies for {skill_id}: {e}")
-        return []
+        if file_name.endswith('.tmp'):
+            # 正在写入的临时文件不能删除，只清理中断构建残留的旧文件
+            try:
+                if time.time() - os.path.getmtime(file_path) < STALE_TMP_SECONDS:
+                    continue
+            except OSError:
+                continue
+        elif is_current(file_name):
+            continue
 
+        try:
+            os.remove(file_path)
+            removed += 1
+            cache_manager.discard(file_path)
+            CACHE_EVICTIONS.inc(bundle_type=kind_of(file_name), reason='stale')
+        except OSError as e:
+            print(f"Error removing stale cache {file_name}: {e}")
+    return removed
+
+
+def _is_current_bundle(file_name: str, catalog: CatalogSnapshot) -> bool:
+    match = CACHE_FILE_PATTERN.match(file_name)
+    if not match:
+        return False
+    archive_format = match.group('format')
+    if archive_format not in ARCHIVE_FORMATS:
+        return False
+    skill_ids = resolve_bundle(match.group('bundle_id'), catalog)
+    return skill_ids is not None and bundle_cache_key(skill_ids, archive_format, catalog, match.group('bundle_id')) == match.group('key')
 
-def update_all_dependencies():
-    """
-    遍历所有skills，分析并更新每个skill的依赖信息
-    将依赖信息存储到skills字典的dependencies字段中
-    """
-    global skills
 
-    print("📊 开始更新所有skill的依赖信息...")
-    updated_count = 0
+def _is_current_fragment(file_name: str, catalog: CatalogSnapshot) -> bool:
+    match = FRAGMENT_FILE_PATTERN.match(file_name)
+    if not match:
+        return False
+    skill_id = match.group('skill_id')
+    return (match.group('format') in ARCHIVE_FORMATS and match.group('layout') == str(ARCHIVE_LAYOUT_VERSION)
+            and skill_id in catalog and skill_content_hash(skill_id, catalog) == match.group('hash'))
 
-    for skill_id in list(skills.keys()):
-        try:
-            deps = analyze_skill_dependencies(skill_id)
-            skills[skill_id]['dependencies'] = deps
-            if deps:
-                updated_count += 1
-                print(f"   ✓ {skill_id}: {len(deps)} 个依赖")
-        except Exception as e:
-            print(f"   ✗ {skill_id}: 更新失败 - {e}")
-            skills[skill_id]['dependencies'] = []
 
-    print(f"✅ 依赖信息更新完成，共 {updated_count}/{len(skills)} 个skill有依赖")
+def _only_targets(pattern, group: str, targets: set, is_current):
+    """只检查文件名中group字段属于targets的文件，其余文件视为有效"""
+    def check(file_name: str) -> bool:
+        match = pattern.match(file_name)
+        if not match or match.group(group) not in targets:
+            return True
+        return is_current(file_name)
+    return check
 
 
-def build_dependency_tree(skill_id: str, visited: set = None, current_path: set = None) -> dict:
+def sweep_stale_cache(bundle_ids: set = None, skill_ids: set = None) -> int:
     """
-    递归构建skill的依赖关系树，检测循环依赖
+    清理不再被引用的压缩包缓存：
+    文件名中的内容键与当前skills内容计算出的键不一致（或bundle已不存在）即视为过期，
+    skill片段同理按skill内容哈希判断
 
     Args:
-        skill_id: 要分析的skill ID
-        visited: 全局已访问的skill集合（用于避免重复处理）
-        current_path: 当前递归路径上的skill集合（用于检测循环依赖）
+        bundle_ids: 只检查这些bundle的压缩包（默认检查全部）
+        skill_ids: 只检查这些skill的片段（默认检查全部）
 
     Returns:
-        dict: 依赖树结构
-        {
-            'skill_id': 'xxx',
-            'dependencies': [
-                {
-                    'skill_id': 'yyy',
-                    'dependencies': [...],
-                    'circular': False
-                },
-                {
-                    'skill_id': 'zzz',
-                    'circular': True,  # 检测到循环依赖
-                    'dependencies': []
-                }
-            ],
-            'exists': True/False,  # skill是否存在
-            'circular': False
-        }
+        int: 删除的文件数量
     """
-    if visited is None:
-        visited = set()
-    if current_path is None:
-        current_path = set()
-
-    # 构建当前节点的基本信息
-    node = {
-        'skill_id': skill_id,
-        'exists': skill_id in skills,
-        'circular': False,
-        'dependencies': []
-    }
+    catalog = current_catalog()
 
-    # 如果skill不存在，直接返回
-    if not node['exists']:
-        return node
+    def is_current_bundle(file_name: str) -> bool:
+        return _is_current_bundle(file_name, catalog)
 
-    # 检测循环依赖：如果当前skill已在递归路径中，说明有循环
-    if skill_id in current_path:
-        node['circular'] = True
-        return node
+    def is_current_fragment(file_name: str) -> bool:
+        return _is_current_fragment(file_name, catalog)
 
-    # 将当前skill加入路径
-    current_path.add(skill_id)
+    if bundle_ids is not None:
+        is_current_bundle = _only_targets(CACHE_FILE_PATTERN, 'bundle_id', bundle_ids, is_current_bundle)
+    if skill_ids is not None:
+        is_current_fragment = _only_targets(FRAGMENT_FILE_PATTERN, 'skill_id', skill_ids, is_current_fragment)
 
-    # 获取依赖列表
-    deps = skills[skill_id].get('dependencies', [])
+    removed = (_sweep_dir(CACHE_DIR, is_current_bundle, cache_file_bundle_type)
+               + _sweep_dir(FRAGMENT_DIR, is_current_fragment, lambda file_name: 'fragment'))
+    if bundle_ids is None:
+        prune_batch_definitions()
+
+    if removed:
+        print(f"🧹 已清理 {removed} 个过期压缩包缓存")
+    return removed
 
-    # 递归构建每个依赖的子树
-    for dep_id in deps:
-        dep_node = build_dependency_tree(dep_id, visited, current_path.copy())
-        node['dependencies'].append(dep_node)
 
-    # 标记为已访问
-    visited.add(skill_id)
+# 检出目录 -> 正在读取该目录的构建数，清理旧检出时跳过
+_checkout_refs = {}
+_checkout_lock = Lock()
 
-    return node
+
+@contextlib.contextmanager
+def using_checkout(root: str):
+    """标记检出目录正在被构建读取，期间 prune_checkouts 不会删除它"""
+    with _checkout_lock:
+        _checkout_refs[root] = _checkout_refs.get(root, 0) + 1
+    try:
+        yield root
+    finally:
+        with _checkout_lock:
+            _checkout_refs[root] -= 1
+            if not _checkout_refs[root]:
+                del _checkout_refs[root]
 
 
-def format_dependency_tree(tree: dict, indent: int = 0, prefix: str = "") -> str:
+def fetch_mirror(repo_url: str = None, mirror_dir: str = None, timeout: float = 60) -> str:
     """
-    将依赖树格式化为易读的文本格式
+    将远程仓库的最新提交浅获取到本地镜像仓库（bare，首次同步时创建）
 
     Args:
-        tree: 依赖树字典
-        indent: 当前缩进级别
-        prefix: 当前行的前缀符号
+        repo_url: 仓库地址（默认 REPO_URL）
+        mirror_dir: 镜像仓库目录（默认 MIRROR_DIR）
+        timeout: 每条git命令的超时（秒）
 
     Returns:
-        str: 格式化后的依赖树文本
+        str: 获取到的提交hash
     """
-    lines = []
-    skill_id = tree['skill_id']
+    repo_url = repo_url or REPO_URL
+    mirror_dir = mirror_dir or MIRROR_DIR
+    if not os.path.exists(mirror_dir):
+        code, out, err = run_command(["git", "init", "--bare", "-q", mirror_dir])
+        if code != 0:
+            raise Exception(f"Git init failed: {err}")
+        code, out, err = run_command(["git", "remote", "add", "origin", repo_url], cwd=mirror_dir)
+    else:
+        code, out, err = run_command(["git", "remote", "set-url", "origin", repo_url], cwd=mirror_dir)
+    if code != 0:
+        raise Exception(f"Git remote setup failed: {err}")
+
+    cmd = ["git", "fetch", "--quiet", "--no-tags"]
+    if SYNC_FETCH_DEPTH:
+        cmd.append(f"--depth={SYNC_FETCH_DEPTH}")
+    if SYNC_FETCH_FILTER:
+        cmd.append(f"--filter={SYNC_FETCH_FILTER}")
+    code, out, err = run_command(cmd + ["origin", "HEAD"], cwd=mirror_dir, timeout=timeout)
+    if code != 0:
+        raise Exception(f"Git fetch failed: {err}")
+
+    code, out, err = run_command(["git", "rev-parse", "FETCH_HEAD"], cwd=mirror_dir)
+    if code != 0:
+        raise Exception(f"Git rev-parse failed: {err}")
+    return out.strip()
+
+
+def prepare_checkout(commit: str, mirror_dir: str = None, checkouts_dir: str = None, timeout: float = 60) -> str:
+    """
+    将提交检出到独立的工作目录（镜像仓库的 worktree），已检出过的提交直接复用；
+    mirror_dir / checkouts_dir 默认为 MIRROR_DIR / CHECKOUTS_DIR
 
-    # 构建当前节点的显示文本
-    status = ""
-    if tree.get('circular'):
-        status = " [循环依赖]"
-    elif not tree.get('exists'):
-        status = " [不存在]"
+    Returns:
+        str: 检出目录
+    """
+    mirror_dir = mirror_dir or MIRROR_DIR
+    checkouts_dir = checkouts_dir or CHECKOUTS_DIR
+    checkout = os.path.join(checkouts_dir, commit[:16])
+    if os.path.exists(checkout):
+        code, out, err = run_command(["git", "rev-parse", "HEAD"], cwd=checkout)
+        if code == 0 and out.strip() == commit:
+            return checkout
+        # 中断的检出
+        remove_checkout(checkout, mirror_dir)
+
+    os.makedirs(checkouts_dir, exist_ok=True)
+    code, out, err = run_command(["git", "worktree", "add", "-q", "--detach", checkout, commit],
+                                 cwd=mirror_dir, timeout=timeout)
+    if code != 0:
+        remove_checkout(checkout, mirror_dir)
+        raise Exception(f"Git checkout failed: {err}")
+    return checkout
+
+
+def activate_checkout(checkout: str):
+    """
+    将 LOCAL_DIR 原子切换为指向checkout的符号链接（新建链接后 rename 覆盖旧链接）；
+    Windows 上原子写入指针文件（新建文件后 rename 覆盖旧文件）
 
-    lines.append(f"{prefix}{skill_id}{status}")
+    LOCAL_DIR 是旧版本留下的完整clone目录时，先移到 LOCAL_DIR.legacy，之后由 prune_checkouts 删除
+    """
+    if os.path.isdir(LOCAL_DIR) and not os.path.islink(LOCAL_DIR):
+        legacy_dir = f"{LOCAL_DIR}.legacy"
+        if os.path.exists(legacy_dir):
+            shutil.rmtree(legacy_dir)
+        os.rename(LOCAL_DIR, legacy_dir)
+
+    if SYMLINK_CHECKOUTS:
+        tmp_link = f"{LOCAL_DIR}.{os.getpid()}.link"
+        if os.path.lexists(tmp_link):
+            os.remove(tmp_link)
+        os.symlink(checkout, tmp_link, target_is_directory=True)
+        os.replace(tmp_link, LOCAL_DIR)
+    else:
+        pointer_path = checkout_pointer_path()
+        tmp_path = f"{pointer_path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(checkout)
+        os.replace(tmp_path, pointer_path)
+        _active_checkout['root'] = checkout
+    # 检出目录按修改时间排序保留，复用已有检出时同样视为最新
+    os.utime(checkout)
+
+
+def remove_checkout(checkout: str, mirror_dir: str = None):
+    """删除检出目录及其 worktree 记录（mirror_dir 默认为 MIRROR_DIR）"""
+    mirror_dir = mirror_dir or MIRROR_DIR
+    code, out, err = run_command(["git", "worktree", "remove", "--force", checkout], cwd=mirror_dir)
+    if code != 0 and os.path.exists(checkout):
+        shutil.rmtree(checkout, ignore_errors=True)
+    run_command(["git", "worktree", "prune"], cwd=mirror_dir)
+
+
+def prune_checkouts():
+    """
+    删除旧的检出目录：保留当前检出、当前目录快照使用的检出及最近 CHECKOUT_RETENTION 个旧检出，
+    仍被构建读取的检出目录留到下次同步再清理
+    """
+    keep = {os.path.realpath(checkout_root()), current_catalog().root}
+    with _checkout_lock:
+        keep.update(root for root, count in _checkout_refs.items() if count)
 
-    # 如果有循环依赖或skill不存在，不继续展开子节点
-    if tree.get('circular') or not tree.get('exists'):
-        return "\n".join(lines)
+    _prune_dirs(CHECKOUTS_DIR, keep, remove_checkout)
+    if os.path.isdir(VIEWS_DIR):
+        # 多来源：视图目录只包含符号链接，删除视图后再清理不再被任何视图引用的来源检出
+        _prune_dirs(VIEWS_DIR, keep, lambda view_dir: shutil.rmtree(view_dir, ignore_errors=True))
+        prune_source_checkouts()
 
-    # 递归格式化子节点
-    dependencies = tree.get('dependencies', [])
-    for i, dep in enumerate(dependencies):
-        is_last = (i == len(dependencies) - 1)
-        child_prefix = "    " * indent + ("└── " if is_last else "├── ")
-        child_tree = format_dependency_tree(dep, indent + 1, child_prefix)
-        lines.append(child_tree)
+    legacy_dir = f"{LOCAL_DIR}.legacy"
+    if os.path.exists(legacy_dir) and os.path.realpath(legacy_dir) not in keep:
+        shutil.rmtree(legacy_dir, ignore_errors=True)
 
-    return "\n".join(lines)
 
+def _prune_dirs(parent_dir: str, keep: set, remove):
+    """按修改时间保留 parent_dir 下最近 CHECKOUT_RETENTION 个不在 keep 中的目录，删除其余目录"""
+    if not os.path.isdir(parent_dir):
+        return
+    with os.scandir(parent_dir) as entries:
+        dirs = sorted((entry for entry in entries if entry.is_dir() and not entry.name.endswith('.tmp')),
+                      key=lambda entry: entry.stat().st_mtime, reverse=True)
+    old = [entry.path for entry in dirs if os.path.realpath(entry.path) not in keep]
+    for path in old[CHECKOUT_RETENTION:]:
+        remove(path)
+        print(f"🧹 已删除旧检出目录 {os.path.basename(path)}")
+
+
+def prune_source_checkouts():
+    """删除各来源中不再被任何视图引用的检出目录"""
+    if not os.path.isdir(SOURCES_DIR):
+        return
+    referenced = set()
+    with os.scandir(VIEWS_DIR) as entries:
+        for entry in entries:
+            manifest = read_view_manifest(entry.path) if entry.is_dir() else None
+            if manifest:
+                referenced.update(os.path.realpath(state['root']) for state in manifest['sources'].values())
+
+    with os.scandir(SOURCES_DIR) as sources:
+        for source in sources:
+            mirror_dir, checkouts_dir = source_dirs(source.name)
+            if not os.path.isdir(checkouts_dir):
+                continue
+            with os.scandir(checkouts_dir) as entries:
+                stale = [entry.path for entry in entries
+                         if entry.is_dir() and os.path.realpath(entry.path) not in referenced]
+            for checkout in stale:
+                remove_checkout(checkout, mirror_dir)
+                print(f"🧹 已删除来源 {source.name} 的旧检出目录 {os.path.basename(checkout)}")
+
+
+# 各来源最近一次同步的状态（/healthz 展示）：
+# 来源名 -> {'state': ok / failed, 'head', 'synced_at', 'duration_seconds', 'error'}
+_source_status = {}
+
+
+def source_dirs(name: str) -> tuple:
+    """来源的镜像仓库目录及检出目录"""
+    source_dir = os.path.join(SOURCES_DIR, name)
+    return os.path.join(source_dir, 'mirror.git'), os.path.join(source_dir, 'checkouts')
+
+
+def sync_source(source: dict) -> dict:
+    """
+    同步单个来源：git 来源浅获取最新提交并检出到该来源的检出目录（每条git命令受 SOURCE_SYNC_TIMEOUT 限制），
+    本地目录来源直接使用该目录并计算文件指纹
 
-def collect_all_dependencies(skill_id: str, collected: set = None) -> list:
+    Returns:
+        dict: {'type', 'head', 'root'}
     """
-    收集skill的所有传递依赖（扁平化），类似Maven的依赖管理
+    if source['type'] == 'path':
+        if not os.path.isdir(source['location']):
+            raise Exception(f"目录不存在: {source['location']}")
+        return {'type': 'path', 'head': path_fingerprint(source['location']),
+                'root': os.path.realpath(source['location'])}
+
+    mirror_dir, checkouts_dir = source_dirs(source['name'])
+    os.makedirs(os.path.dirname(mirror_dir), exist_ok=True)
+    commit = fetch_mirror(source['location'], mirror_dir, SOURCE_SYNC_TIMEOUT)
+    checkout = prepare_checkout(commit, mirror_dir, checkouts_dir, SOURCE_SYNC_TIMEOUT)
+    return {'type': 'git', 'head': commit, 'root': checkout}
+
+
+def _sync_source_with_status(source: dict):
+    """同步单个来源并记录状态，失败时返回None"""
+    name = source['name']
+    start = time.perf_counter()
+    try:
+        state = sync_source(source)
+    except Exception as e:
+        print(f"❌ 来源 {name} 同步失败: {e}")
+        _source_status[name] = {**_source_status.get(name, {}), 'state': 'failed', 'error': str(e),
+                                'duration_seconds': round(time.perf_counter() - start, 3)}
+        return None
+    _source_status[name] = {'state': 'ok', 'head': state['head'], 'synced_at': time.time(),
+                            'duration_seconds': round(time.perf_counter() - start, 3), 'error': None}
+    return state
+
+
+# 仓库同步状态（/healthz、/readyz 展示）
+# state: pending（尚未同步）/ syncing / ok / failed
+_sync_status = {
+    'state': 'pending',
+    'started_at': None,
+    'finished_at': None,
+    'last_success_at': None,
+    'last_error': None,
+}
+
+
+# 同一时间只运行一个同步
+_sync_lock = Lock()
+
+# 多进程部署时的 sync leader 选举（只有 leader 同步仓库、运行定时任务）
+sync_leader = LeaderElection(LEADER_LOCK_PATH)
+
+# 推送通知触发的待执行同步：pending 为合并的通知数，queued 表示已有同步在等待 _sync_lock
+_sync_trigger = {
+    'timer': None,
+    'first_requested_at': None,
+    'pending': 0,
+    'queued': False,
+}
+_sync_trigger_lock = Lock()
+
+
+def sync_repo_internal(full_rescan: bool = False):
+    """
+    内部同步仓库函数，记录同步状态；已有同步在运行时等待其完成后再执行
 
     Args:
-        skill_id: 要分析的skill ID
-        collected: 已收集的skill集合（用于去重和防止循环）
+        full_rescan: 是否强制全量重建索引（默认根据git diff增量刷新）
+    """
+    with _sync_lock:
+        return _record_sync(full_rescan)
 
-    Returns:
-        list: 所有依赖的skill ID列表（不包含自身，已去重）
 
-    Example:
-        skillA依赖skillB和skillC
-        skillB依赖skillD
-        skillC依赖skillA (循环)
+def _record_sync(full_rescan: bool = False):
+    """执行同步并记录同步状态及指标，调用方需持有 _sync_lock"""
+    _sync_status.update(state='syncing', started_at=time.time())
+    start = time.perf_counter()
+    try:
+        result = _sync_repo(full_rescan)
+    except Exception as e:
+        SYNC_DURATION.observe(time.perf_counter() - start, outcome='failed')
+        _sync_status.update(state='failed', finished_at=time.time(), last_error=str(e))
+        raise
+
+    # outcome: cloned / unchanged / full / incremental
+    outcome = 'cloned' if result['status'] == 'cloned' else result['refresh']['mode']
+    SYNC_DURATION.observe(time.perf_counter() - start, outcome=outcome)
+    now = time.time()
+    SYNC_LAST_SUCCESS.set(now)
+    _sync_status.update(state='ok', finished_at=now, last_success_at=now, last_error=None)
+    return result
+
+
+def is_sync_leader() -> bool:
+    """当前进程是否负责同步（单进程运行时始终为是）"""
+    return SERVER_WORKERS <= 1 or sync_leader.is_leader
+
+
+def consume_sync_request() -> bool:
+    """sync leader：取走其他 worker 转交的同步请求文件并触发同步"""
+    try:
+        os.remove(SYNC_REQUEST_PATH)
+    except FileNotFoundError:
+        return False
+    request_sync()
+    return True
+
+
+def request_sync() -> dict:
+    """
+    请求一次同步（防抖）：在最后一次请求 SYNC_DEBOUNCE_SECONDS 秒后执行，
+    期间的多次请求合并为一次同步；距第一次请求最多等待 SYNC_DEBOUNCE_MAX_SECONDS 秒
 
-        collect_all_dependencies('skillA') 返回 ['skillB', 'skillC', 'skillD']
+    多进程部署时非 leader 的 worker 不同步，写入同步请求文件转交 leader
+
+    Returns:
+        dict: {'pending': 已合并的请求数, 'delay_seconds': 距同步开始的秒数}；转交 leader 时带 forwarded
     """
-    if collected is None:
-        collected = set()
+    if not is_sync_leader():
+        with open(SYNC_REQUEST_PATH, 'a'):
+            pass
+        return {'pending': 1, 'delay_seconds': CLUSTER_POLL_SECONDS + SYNC_DEBOUNCE_SECONDS, 'forwarded': True}
+
+    with _sync_trigger_lock:
+        now = time.monotonic()
+        if _sync_trigger['first_requested_at'] is None:
+            _sync_trigger['first_requested_at'] = now
+        _sync_trigger['pending'] += 1
+        if _sync_trigger['timer']:
+            _sync_trigger['timer'].cancel()
+
+        deadline = _sync_trigger['first_requested_at'] + SYNC_DEBOUNCE_MAX_SECONDS
+        delay = max(0.0, min(SYNC_DEBOUNCE_SECONDS, deadline - now))
+        timer = threading.Timer(delay, _run_requested_sync)
+        timer.daemon = True
+        _sync_trigger['timer'] = timer
+        timer.start()
+        return {'pending': _sync_trigger['pending'], 'delay_seconds': round(delay, 3)}
+
+
+def _run_requested_sync():
+    """防抖结束后执行同步；已有同步在等待执行时直接合并到该同步（它会获取到最新的提交）"""
+    with _sync_trigger_lock:
+        coalesced = _sync_trigger['pending']
+        _sync_trigger.update(timer=None, first_requested_at=None, pending=0)
+        if _sync_trigger['queued']:
+            return
+        _sync_trigger['queued'] = True
+
+    with _sync_lock:
+        with _sync_trigger_lock:
+            _sync_trigger['queued'] = False
+        try:
+            print(f"\n🔔 收到 {coalesced} 个推送通知，开始同步仓库...")
+            result = _record_sync()
+            print(f"✅ 推送触发的同步完成: {result['refresh']['mode']}\n")
+        except Exception as e:
+            print(f"❌ 推送触发的同步失败: {e}\n")
 
-    # 如果已经处理过这个skill，直接返回（防止循环依赖导致无限递归）
-    if skill_id in collected:
-        return []
 
-    # 标记当前skill为已处理
-    collected.add(skill_id)
+def verify_webhook(body: bytes, headers) -> bool:
+    """
+    校验推送通知：未配置 SYNC_WEBHOOK_SECRET 时不校验；
+    否则需要 X-Hub-Signature-256: sha256=<HMAC-SHA256(body)>（GitHub / Gitea）或 X-Webhook-Token: <密钥>
+    """
+    if not SYNC_WEBHOOK_SECRET:
+        return True
 
-    # 获取直接依赖
-    direct_deps = skills.get(skill_id, {}).get('dependencies', [])
+    signature = headers.get('x-hub-signature-256')
+    if signature:
+        expected = 'sha256=' + hmac.new(SYNC_WEBHOOK_SECRET.encode('utf-8'), body, hashlib.sha256).hexdigest()
+        return hmac.compare_digest(signature, expected)
 
-    all_deps = []
+    token = headers.get('x-webhook-token') or headers.get('x-gitlab-token')
+    return bool(token) and hmac.compare_digest(token, SYNC_WEBHOOK_SECRET)
 
-    # 递归收集每个依赖的传递依赖
-    for dep_id in direct_deps:
-        # 只处理存在的skill
-        if dep_id in skills:
-            # 添加这个依赖
-            if dep_id not in collected:
-                all_deps.append(dep_id)
 
-            # 递归收集这个依赖的依赖
-            transitive_deps = collect_all_dependencies(dep_id, collected)
-            all_deps.extend(transitive_deps)
+def _sync_repo(full_rescan: bool = False):
+    """
+    浅获取远程最新提交到镜像仓库，检出到新的工作目录后原子切换 LOCAL_DIR，并刷新skills索引
 
-    # 去重并返回
-    return list(dict.fromkeys(all_deps))  # 保持顺序的去重
+    正在运行的构建继续读取各自目录快照对应的旧检出目录，不会打包出新旧混合的内容
+    """
+    if SKILL_SOURCES:
+        return _sync_sources(full_rescan)
 
+    cloned = not os.path.exists(MIRROR_DIR)
+    old_head = get_head_commit()
+    new_head = fetch_mirror()
+    if new_head != old_head or not checkout_activated():
+        activate_checkout(prepare_checkout(new_head))
 
-def clear_cache():
-    """清理压缩包缓存"""
-    if os.path.exists(CACHE_DIR):
-        import shutil
-        shutil.rmtree(CACHE_DIR)
-        print("🗑️  已清理压缩包缓存")
+    refresh = refresh_index(full_rescan)
+    prune_checkouts()
+    _start_cache_maintenance(old_head, [refresh])
 
+    if cloned:
+        return {"status": "cloned", "message": "Repository cloned successfully", "refresh": refresh}
+    return {"status": "updated", "message": "Repository updated successfully", "refresh": refresh}
 
-def sync_repo_internal():
-    """内部同步仓库函数"""
-    if os.path.exists(LOCAL_DIR):
-        # 已存在，执行 git pull
-        code, out, err = run_command(["git", "pull"], cwd=LOCAL_DIR)
-        if code != 0:
-            raise Exception(f"Git pull failed: {err}")
 
-        # 只有当不是"Already up to date"时才更新skills和清理缓存
-        if "Already up to date" not in out:
-            update_skills()
-            clear_cache()  # 清理缓存，下次下载会重新生成
+def _start_cache_maintenance(old_head: str, refreshes: list):
+    """
+    同步后的后台缓存维护：
+    缓存按内容寻址，HEAD变化后未变更的压缩包依然有效，过期的在后台清理（增量刷新时只检查受变更skill影响的bundle）；
+    内容变化（或首次同步）后在后台预构建热门压缩包
+    """
+    new_head = refreshes[-1].get('head')
+    if old_head and old_head != new_head:
+        sweep_args = ()
+        if all(refresh['mode'] != 'full' for refresh in refreshes):
+            bundle_ids, skill_ids = set(), set()
+            for refresh in refreshes:
+                if refresh['mode'] == 'incremental':
+                    bundle_ids.update(refresh['invalidated_bundles'])
+                    skill_ids.update(refresh['updated'] + refresh['removed'])
+            sweep_args = (bundle_ids, skill_ids)
+        Thread(target=sweep_stale_cache, args=sweep_args, daemon=True).start()
+
+    if old_head != new_head:
+        Thread(target=prewarm_cache, args=(current_catalog(),), name='cache-prewarm', daemon=True).start()
+
+
+def _sync_sources(full_rescan: bool = False):
+    """
+    多来源同步：各来源在线程池中并发同步，每个来源完成后立即合并为新视图并增量刷新索引，
+    慢的来源不会推迟其他来源的内容发布；失败或超时的来源沿用上一次同步的检出继续提供服务
+    """
+    sources = normalize_sources(SKILL_SOURCES)
+    names = [source['name'] for source in sources]
+    cloned = not checkout_activated()
+    old_head = get_head_commit()
+    manifest = read_view_manifest(checkout_root())
+    previous = manifest['sources'] if manifest else {}
+    states = {name: state for name, state in previous.items() if name in names}
+    refreshes = []
+
+    def publish():
+        activate_checkout(build_view(VIEWS_DIR, dict(states), symlinks=SYMLINK_CHECKOUTS))
+        refreshes.append(refresh_index(full_rescan and not refreshes))
+
+    # 已从配置中移除的来源立即下线
+    if states and set(previous) - set(names):
+        publish()
+
+    executor = ThreadPoolExecutor(max_workers=len(sources), thread_name_prefix='source-sync')
+    try:
+        futures = {executor.submit(_sync_source_with_status, source): source['name'] for source in sources}
+        for future in as_completed(futures):
+            name = futures[future]
+            state = future.result()
+            if state is None or states.get(name) == state:
+                continue
+            states[name] = state
+            publish()
+            print(f"   ✓ 来源 {name} 已发布: {state['head'][:12]}")
+    finally:
+        executor.shutdown(wait=False)
+
+    if not states:
+        raise Exception("所有来源同步失败: " + "; ".join(
+            f"{name}: {_source_status.get(name, {}).get('error')}" for name in names))
+    if not refreshes:
+        if not checkout_activated():
+            publish()
         else:
-            update_skills()
+            refreshes.append(refresh_index(full_rescan))
 
-        return {"status": "updated", "message": "Repository updated successfully"}
-    else:
-        # 不存在，执行 git clone
-        parent_dir = os.path.dirname(LOCAL_DIR)
-        repo_name = os.path.basename(LOCAL_DIR)
-        code, out, err = run_command(["git", "clone", REPO_URL, repo_name], cwd=parent_dir)
-        if code != 0:
-            raise Exception(f"Git clone failed: {err}")
+    prune_checkouts()
+    _start_cache_maintenance(old_head, refreshes)
 
-        # clone后更新skills
-        update_skills()
-
-        return {"status": "cloned", "message": "Repository cloned successfully"}
+    failed = [name for name in names if _source_status.get(name, {}).get('state') == 'failed']
+    result = {
+        "status": "cloned" if cloned else "updated",
+        "message": f"{len(names) - len(failed)}/{len(names)} 个来源同步成功",
+        "refresh": refreshes[-1],
+        "sources": {name: dict(_source_status.get(name, {})) for name in names},
+    }
+    if failed:
+        result["failed_sources"] = failed
+    return result
 
 
 # @mcp.tool()
-def sync_repo() -> dict:
+def sync_repo(full_rescan: bool = False) -> dict:
     """
     同步技能仓库，执行git clone或git pull操作。
     如果本地仓库不存在则clone，存在则pull最新代码。
 
+    Args:
+        full_rescan: 是否强制全量重建skills索引（默认只刷新git diff涉及的skill）
+
     Returns:
         dict: 包含同步状态和消息的字典
     """
     try:
-        return sync_repo_internal()
+        return sync_repo_internal(full_rescan)
     except Exception as e:
         return {"status": "error", "message": str(e)}
 
 
+# list_skills 返回的公开字段；内容哈希、文件统计、反向依赖等内部字段只保留在目录快照中（get_skill_info 可查看）
+LIST_SKILL_FIELDS = ('id', 'name', 'description', 'dependencies')
+
+
+def public_skill_record(info: dict) -> dict:
+    """skill记录中对外展示的字段"""
+    return {field: info.get(field) for field in LIST_SKILL_FIELDS}
+
+
 @mcp.tool()
 def list_skills(keyword: str = "") -> dict:
     """
     列出所有可用的技能，使用类似于table表格结构化格式输出展示，展示给用户展示id，name，description即可，不需要进行语言转换。支持关键词搜索，输出结构如下，可以用markdown格式的表格输出，一行放不下则自动换行：
     id           name           description         dependencies
     Args:
-        keyword: 搜索关键词（可选），匹配 name 或 description
+        keyword: 搜索关键词（可选），匹配 id、name 或 description，多个词以空格分隔，结果按相关度排序
 
     Returns:
         dict: 技能列表，包含 id、name、description 等信息
     """
     try:
-        results = {}
-        for skill_id, info in skills.items():
-            # 关键词过滤
-            if keyword:
-                keyword_lower = keyword.lower()
-                name = (info.get('name') or '').lower()
-                desc = (info.get('description') or '').lower()
-
-                if keyword_lower not in name and keyword_lower not in desc:
-                    continue
+        catalog = current_catalog()
+        skills = catalog.skills
 
-            results[skill_id] = info
+        if not keyword:
+            results = dict(skills)
+        else:
+            # 倒排索引检索（按相关度排序），未命中时回退到子串匹配（如单词中间的片段）
+            matched_ids = catalog.search_index.search(keyword)
+            if matched_ids:
+                results = {sid: skills[sid] for sid in matched_ids if sid in skills}
+            else:
+                keyword_lower = keyword.lower()
+                results = {}
+                for skill_id, info in skills.items():
+                    name = (info.get('name') or '').lower()
+                    desc = (info.get('description') or '').lower()
+                    if keyword_lower in name or keyword_lower in desc:
+                        results[skill_id] = info
 
         return {
             "status": "success",
             "count": len(results),
-            "data": results
+            "data": {skill_id: public_skill_record(info) for skill_id, info in results.items()}
         }
     except Exception as e:
         return {"status": "error", "message": str(e)}
@@ -453,31 +2452,22 @@ def get_skill_info(skill_id: str) -> dict:
         dict: 技能详细信息，包括文件数量、大小、依赖关系树等
     """
     try:
+        catalog = current_catalog()
+        skills = catalog.skills
+
         if skill_id not in skills:
             return {"status": "error", "message": f"Skill '{skill_id}' not found"}
 
         skill_info = skills[skill_id].copy()
         print(skill_info)
-        skill_path = os.path.join(LOCAL_DIR, skill_id)
-
-        # 统计文件信息
-        file_count = 0
-        total_size = 0
-        for root, dirs, files in os.walk(skill_path):
-            dirs[:] = [d for d in dirs if not d.startswith('.')]
-            file_count += len(files)
-            for f in files:
-                try:
-                    total_size += os.path.getsize(os.path.join(root, f))
-                except:
-                    pass
 
-        skill_info['file_count'] = file_count
-        skill_info['total_size_bytes'] = total_size
-        skill_info['total_size_kb'] = round(total_size / 1024, 2)
+        # 文件信息在建索引时已统计
+        skill_info.setdefault('file_count', 0)
+        skill_info.setdefault('total_size_bytes', 0)
+        skill_info['total_size_kb'] = round(skill_info['total_size_bytes'] / 1024, 2)
 
         # 构建依赖关系树
-        dependency_tree = build_dependency_tree(skill_id)
+        dependency_tree = build_dependency_tree(skill_id, catalog)
         skill_info['dependency_tree'] = dependency_tree
 
         # 格式化依赖树为文本（便于阅读）
@@ -488,6 +2478,12 @@ def get_skill_info(skill_id: str) -> dict:
         direct_deps = skills[skill_id].get('dependencies', [])
         skill_info['direct_dependencies_count'] = len(direct_deps)
         skill_info['direct_dependencies'] = direct_deps
+        skill_info['all_dependencies'] = collect_all_dependencies(skill_id, catalog)
+
+        # 所在的循环依赖
+        cycle = catalog.graph.cycle_of(skill_id)
+        if cycle:
+            skill_info['dependency_cycle'] = cycle
 
         return {"status": "success", "data": skill_info}
 
@@ -496,57 +2492,203 @@ def get_skill_info(skill_id: str) -> dict:
 
 
 @mcp.tool()
-def clear_skill_cache() -> dict:
+def get_skill_dependents(skill_id: str, transitive: bool = True, page: int = 1, page_size: int = 50) -> dict:
+    """
+    查询哪些技能依赖了指定技能（反向依赖），使用类似于table表格结构化格式输出展示
+
+    Args:
+        skill_id: 被依赖的技能 ID
+        transitive: 是否包含传递依赖方（默认 True；False 时只返回直接依赖方）
+        page: 页码，从 1 开始
+        page_size: 每页数量（1-500，默认 50）
+
+    Returns:
+        dict: 依赖方列表，depth 为 1 表示直接依赖，大于 1 表示传递依赖
+    """
+    try:
+        catalog = current_catalog()
+        skills = catalog.skills
+
+        if skill_id not in skills:
+            return {"status": "error", "message": f"Skill '{skill_id}' not found"}
+        if page < 1 or not 1 <= page_size <= 500:
+            return {"status": "error", "message": "page 需大于等于 1，page_size 需在 1-500 之间"}
+
+        dependents = catalog.graph.dependents_of(skill_id, transitive=transitive)
+        start = (page - 1) * page_size
+        items = [
+            {"skill_id": dependent_id, "depth": depth, "direct": depth == 1}
+            for dependent_id, depth in dependents[start:start + page_size]
+        ]
+
+        return {
+            "status": "success",
+            "skill_id": skill_id,
+            "direct_dependents_count": len(skills[skill_id].get('dependents', [])),
+            "total": len(dependents),
+            "page": page,
+            "page_size": page_size,
+            "has_more": start + page_size < len(dependents),
+            "dependents": items
+        }
+
+    except Exception as e:
+        return {"status": "error", "message": str(e)}
+
+
+@mcp.tool()
+def clear_skill_cache(mode: str = "all", idle_minutes: int = 60) -> dict:
     """
     清理技能压缩包缓存。
-    当仓库更新后，可以手动清理缓存以强制重新生成压缩包。
+    当仓库更新后，可以手动清理缓存以强制重新生成压缩包；也可以只清理过期或长时间未访问的缓存，
+    保留热点压缩包，避免清理后大量请求同时重新构建。
+
+    Args:
+        mode: 清理方式
+            - all: 删除全部缓存（默认）
+            - stale: 只删除内容已过期（对应skill已变化或已删除）的缓存
+            - cold: 删除过期缓存及超过 idle_minutes 分钟未被访问的缓存
+        idle_minutes: cold 模式下的闲置时长（分钟）
 
     Returns:
-        dict: 清理结果
+        dict: 清理结果及清理后的缓存统计
     """
     try:
-        if os.path.exists(CACHE_DIR):
-            import shutil
-            shutil.rmtree(CACHE_DIR)
-            return {"status": "success", "message": "压缩包缓存已清理"}
-        else:
-            return {"status": "success", "message": "缓存目录不存在，无需清理"}
+        if mode == "all":
+            if os.path.exists(CACHE_DIR):
+                count_cleared_cache()
+                shutil.rmtree(CACHE_DIR)
+                cache_manager.reset()
+                return {"status": "success", "message": "压缩包缓存已清理", "cache": cache_manager.stats()}
+            else:
+                return {"status": "success", "message": "缓存目录不存在，无需清理"}
+
+        if mode not in ("stale", "cold"):
+            return {"status": "error", "message": f"不支持的清理方式 '{mode}'，可选: all / stale / cold"}
+
+        removed = sweep_stale_cache()
+        message = f"已清理 {removed} 个过期缓存"
+        if mode == "cold":
+            cold = cache_manager.evict_idle(idle_minutes * 60)
+            removed += len(cold)
+            message += f"，{len(cold)} 个超过 {idle_minutes} 分钟未访问的缓存"
+        return {"status": "success", "message": message, "removed": removed, "cache": cache_manager.stats()}
     except Exception as e:
         return {"status": "error", "message": str(e)}
 
 
 @mcp.tool()
-def download_skill(skill_id: str = "", download_all: bool = False, install_dir: str = "") -> dict:
+def download_skill(skill_id: str = "", download_all: bool = False, install_dir: str = "",
+                   archive_format: str = DEFAULT_ARCHIVE_FORMAT, installed: dict = None,
+                   skill_ids: list = None) -> dict:
     """
     根据技能关键字获取技能安装｜下载信息,如果让安装｜下载到当前项目目录下，如果是claude则下载则当前目录到.claude/skills下，如果是.codex/skills下。
     获取到下载信息后执行instruction字段命令即可下载，不要在instruction里面加任何额外字符
     返回 HTTP 安装｜下载 URL，客户端使用 curl 命令安装｜下载并解压：
     - 使用 -k 参数解压时跳过已存在的文件
-    - 压缩包存在则覆盖
+    - 压缩包按内容版本保存在安装目录的 .skill-downloads 下，内容未变化时重复安装不会重新下载，下载中断后重新执行可断点续传
     - 自动下载所有传递依赖（类似Maven依赖管理）
+    - 一次安装多个技能时使用 skill_ids 传入列表，所有技能及其依赖打包为一个压缩包，共同依赖只下载一次
+    - 增量安装：安装目录下存在 .skill-manifest.json 时，将其中 skills 字段的内容作为 installed 传入，
+      只下载新增和内容变化的技能；首次安装传 installed={} 即可生成该清单文件
 
     Args:
-        skill_id: 技能 ID（如果 download_all=True 则忽略此参数）
+        skill_id: 技能 ID（如果 download_all=True 或指定了 skill_ids 则忽略此参数）
         download_all: 是否安装｜下载所有技能（默认 False）
         install_dir: 安装目录（如果用户未提供，claude默认传 ~/.claude/skills，codex默认传～/.codex/skills）
+        archive_format: 压缩包格式（默认 gz）：gz 最小体积；gz-fast 快速压缩；zst 需要客户端tar支持--zstd；tar 不压缩，适合内网
+        installed: 客户端已安装的技能 {skill_id: content_hash}（.skill-manifest.json 的 skills 字段），传入时返回增量安装命令
+        skill_ids: 批量安装的技能 ID 列表（如 ["devops-flow", "infra-stack"]）
 
     Returns:
         dict: 包含 download_url 的下载信息
     """
     try:
+        catalog = current_catalog()
+        skills = catalog.skills
 
         # 确定安装目录
         target_dir = install_dir if install_dir else "~/.claude/skills"
 
+        if archive_format not in available_archive_formats():
+            return {"status": "error", "message": f"不支持的压缩包格式 '{archive_format}'，可选: {available_archive_formats()}"}
+        format_query = "" if archive_format == DEFAULT_ARCHIVE_FORMAT else f"?format={archive_format}"
+
+        # 批量下载：/download/batch?skills=a,b,c
+        batch = None
+        if skill_ids and not download_all:
+            requested = list(dict.fromkeys(skill_ids))
+            batch_bundle_id, batch_skills = resolve_batch(requested, catalog)
+            batch = {
+                'bundle_id': batch_bundle_id,
+                'skills': batch_skills,
+                'path': BATCH_DOWNLOAD_ID,
+                'query': f"skills={','.join(sorted(requested))}"
+                         + ("" if archive_format == DEFAULT_ARCHIVE_FORMAT else f"&format={archive_format}"),
+            }
+
+        if installed is not None:
+            parse_installed_manifest(installed)
+            if batch:
+                bundle_skills = batch['skills']
+                delta_url = f"{SKILL_FILE_BASE_URL}/download/{batch['path']}/delta?{batch['query']}"
+            else:
+                if not download_all:
+                    if not skill_id:
+                        return {"status": "error", "message": "请指定 skill_id 或设置 download_all=true"}
+                    if skill_id not in skills:
+                        return {"status": "error", "message": f"Skill '{skill_id}' not found"}
+                bundle_id = "all" if download_all else f"{skill_id}-with-deps"
+                bundle_skills = resolve_bundle(bundle_id, catalog)
+                delta_url = f"{SKILL_FILE_BASE_URL}/download/{bundle_id}/delta{format_query}"
+            delta = compute_delta(bundle_skills, installed, catalog)
+            download_bytes = sum(skills[sid].get('total_size_bytes', 0) for sid in delta['added'] + delta['changed'])
+            return {
+                "status": "success",
+                "skill_id": "all" if download_all else (skill_ids if batch else skill_id),
+                "delta": True,
+                "added": delta['added'],
+                "changed": delta['changed'],
+                "unchanged": delta['unchanged'],
+                "removed": delta['removed'],
+                "download_url": delta_url,
+                "size_kb": round(download_bytes / 1024, 2),
+                "install_dir": target_dir,
+                "archive_format": archive_format,
+                "instruction": build_delta_install_instruction(target_dir, delta_url, delta, bool(installed), archive_format)
+            }
+
+        if batch:
+            # 批量下载多个技能及其依赖的并集
+            download_url = f"{SKILL_FILE_BASE_URL}/download/{batch['path']}?{batch['query']}"
+            cache_key = bundle_cache_key(batch['skills'], archive_format, catalog, batch['bundle_id'])
+            total_size = sum(skills[sid].get('total_size_bytes', 0) for sid in batch['skills'])
+            return {
+                "status": "success",
+                "skill_ids": skill_ids,
+                "total_skills": len(batch['skills']),
+                "skills_to_download": batch['skills'],
+                "download_url": download_url,
+                "etag": f'"{cache_key}"',
+                "size_kb": round(total_size / 1024, 2),
+                "install_dir": target_dir,
+                "archive_format": archive_format,
+                "instruction": build_install_instruction(target_dir, "skills-batch", download_url, cache_key, archive_format)
+            }
+
         if download_all:
             # 下载所有技能
+            download_url = f"{SKILL_FILE_BASE_URL}/download/all{format_query}"
+            cache_key = bundle_cache_key(resolve_bundle("all", catalog), archive_format, catalog, "all")
             return {
                 "status": "success",
                 "skill_id": "all",
                 "count": len(skills),
-                "download_url": f"{SKILL_FILE_BASE_URL}/download/all",
+                "download_url": download_url,
+                "etag": f'"{cache_key}"',
                 "install_dir": target_dir,
-                "instruction": f"mkdir -p {target_dir} && curl -o {target_dir}/all-skills.tar.gz {SKILL_FILE_BASE_URL}/download/all && tar -xkzf {target_dir}/all-skills.tar.gz -C {target_dir}/ && rm {target_dir}/all-skills.tar.gz"
+                "archive_format": archive_format,
+                "instruction": build_install_instruction(target_dir, "all-skills", download_url, cache_key, archive_format)
             }
         else:
             # 下载单个技能及其所有依赖
@@ -557,28 +2699,21 @@ def download_skill(skill_id: str = "", download_all: bool = False, install_dir:
                 return {"status": "error", "message": f"Skill '{skill_id}' not found"}
 
             # 收集所有传递依赖
-            all_dependencies = collect_all_dependencies(skill_id)
+            all_dependencies = collect_all_dependencies(skill_id, catalog)
 
-            # 需要下载的所有skill = 主skill + 所有依赖
-            skills_to_download = [skill_id] + all_dependencies
+            # 需要下载的所有skill = 所有依赖 + 主skill（按安装顺序）
+            skills_to_download = all_dependencies + [skill_id]
 
             # 过滤掉不存在的skill
-            existing_skills = [sid for sid in skills_to_download if sid in skills and os.path.exists(os.path.join(LOCAL_DIR, sid))]
+            existing_skills = [sid for sid in skills_to_download if sid in skills]
             print(existing_skills)
-            # 计算总大小
-            total_size = 0
-            for sid in existing_skills:
-                skill_path = os.path.join(LOCAL_DIR, sid)
-                for root, dirs, files in os.walk(skill_path):
-                    dirs[:] = [d for d in dirs if not d.startswith('.')]
-                    for f in files:
-                        try:
-                            total_size += os.path.getsize(os.path.join(root, f))
-                        except:
-                            pass
+            # 计算总大小（读取建索引时统计的文件大小）
+            total_size = sum(skills[sid].get('total_size_bytes', 0) for sid in existing_skills)
 
             # 生成唯一的下载标识（包含依赖信息）
             download_id = f"{skill_id}-with-deps"
+            download_url = f"{SKILL_FILE_BASE_URL}/download/{download_id}{format_query}"
+            cache_key = bundle_cache_key(resolve_bundle(download_id, catalog), archive_format, catalog, download_id)
 
             return {
                 "status": "success",
@@ -586,111 +2721,379 @@ def download_skill(skill_id: str = "", download_all: bool = False, install_dir:
                 "dependencies": all_dependencies,
                 "total_skills": len(existing_skills),
                 "skills_to_download": existing_skills,
-                "download_url": f"{SKILL_FILE_BASE_URL}/download/{download_id}",
+                "download_url": download_url,
+                "etag": f'"{cache_key}"',
                 "size_kb": round(total_size / 1024, 2),
                 "install_dir": target_dir,
-                "instruction": f"mkdir -p {target_dir} && curl -o {target_dir}/{skill_id}.tar.gz {SKILL_FILE_BASE_URL}/download/{download_id} && tar -xkzf {target_dir}/{skill_id}.tar.gz -C {target_dir}/ && rm {target_dir}/{skill_id}.tar.gz"
+                "archive_format": archive_format,
+                "instruction": build_install_instruction(target_dir, skill_id, download_url, cache_key, archive_format)
             }
 
     except Exception as e:
         return {"status": "error", "message": str(e)}
 
 
-# 创建FastAPI应用
-mcp_app = mcp.http_app(path='/mcp')
-fastapi_app = FastAPI(title="下载服务", lifespan=mcp_app.lifespan)
+@mcp.tool()
+def compare_archive_formats(skill_id: str = "all") -> dict:
+    """
+    对比各压缩包格式的构建耗时与压缩后大小（实际压缩一次，不使用缓存），用于选择 download_skill 的 archive_format
+
+    Args:
+        skill_id: 参与对比的下载标识：all（默认）、{skill_id} 或 {skill_id}-with-deps
+
+    Returns:
+        dict: 各格式的构建耗时（毫秒）、大小及相对不压缩tar的压缩率
+    """
+    try:
+        catalog = current_catalog()
+        skill_ids = resolve_bundle(skill_id, catalog)
+        if skill_ids is None:
+            return {"status": "error", "message": f"Skill '{skill_id}' not found"}
+
+        return {
+            "status": "success",
+            "skill_id": skill_id,
+            "total_skills": len(skill_ids),
+            "data": measure_archive_formats(skill_ids, catalog)
+        }
+    except Exception as e:
+        return {"status": "error", "message": str(e)}
+
+
+class ToolMetricsMiddleware(Middleware):
+    """记录每次 MCP tool 调用的耗时；tool 抛出异常或返回 status=error 时 status 标签为 error"""
+
+    async def on_call_tool(self, context, call_next):
+        start = time.perf_counter()
+        status = 'error'
+        try:
+            result = await call_next(context)
+            content = getattr(result, 'structured_content', None)
+            if not (isinstance(content, dict) and content.get('status') == 'error'):
+                status = 'ok'
+            return result
+        finally:
+            TOOL_DURATION.observe(time.perf_counter() - start, tool=context.message.name, status=status)
+
+
+mcp.add_middleware(ToolMetricsMiddleware())
+
+
+@REGISTRY.on_collect
+def collect_catalog_metrics():
+    """抓取指标时读取当前目录快照及进行中的构建数"""
+    catalog = current_catalog()
+    CATALOG_VERSION.set(catalog.version)
+    CATALOG_SKILLS.set(len(catalog.skills))
+    CATALOG_BYTES.set(sum(info.get('total_size_bytes', 0) for info in catalog.skills.values()))
+    for stat, value in catalog.graph.stats().items():
+        if stat != 'skills':
+            GRAPH_STATS.set(value, stat=stat)
+    ARCHIVE_BUILDS_INFLIGHT.set(len(_inflight_builds))
+    cache_stats = cache_manager.stats()
+    CACHE_BYTES.set(cache_stats['total_bytes'])
+    CACHE_ENTRIES.set(cache_stats['entries'])
+
+
+# 创建FastAPI应用（多进程部署时同一MCP会话的请求可能落到不同 worker，使用无状态模式）
+mcp_app = mcp.http_app(path='/mcp', stateless_http=True if SERVER_WORKERS > 1 else None)
+
+
+def run_cluster_worker(state: dict, stop: threading.Event):
+    """
+    多进程部署的 worker 主循环：
+    - 争抢 sync leader：成为 leader 的 worker 同步仓库、启动定时任务，并处理其他 worker 转交的同步请求
+    - 其余 worker 从持久化索引加载目录快照，轮询到新的目录版本时重新加载
+    - leader 进程退出后锁被释放，其他 worker 在下次轮询时接任
+    """
+    cache_manager.load([CACHE_DIR, FRAGMENT_DIR], os.path.join(BUILD_LOCK_DIR, 'cache-evict.lock'))
+    download_popularity.load(POPULARITY_DB_PATH)
+    leading = False
+    if not sync_leader.try_acquire():
+        print(f"👥 worker {os.getpid()} 以 follower 运行，sync leader: {sync_leader.holder()}")
+
+    while not stop.is_set():
+        if not leading and sync_leader.try_acquire():
+            leading = True
+            print(f"👑 worker {os.getpid()} 成为 sync leader")
+            if not initialize_on_startup():
+                print("⚠️  警告: 初始化失败，定时任务将继续重试同步\n")
+            state['scheduler'] = start_dependency_scheduler()
+
+        try:
+            # 本 worker 的下载热度写入共享统计，leader 预构建时按所有 worker 的下载排序
+            download_popularity.flush()
+            if leading:
+                consume_sync_request()
+            else:
+                reload_published_catalog()
+        except Exception as e:
+            print(f"Error in cluster worker loop: {e}")
+        stop.wait(CLUSTER_POLL_SECONDS)
+
+
+@contextlib.asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    应用生命周期：HTTP 和 MCP 监听立即开始，仓库同步和索引构建在后台线程中进行，
+    完成前使用持久化索引（如有）或空目录提供服务；初始化结束后启动定时任务
+    """
+    state = {}
+    stop = threading.Event()
+
+    def background_startup():
+        if SERVER_WORKERS > 1:
+            run_cluster_worker(state, stop)
+            return
+        if not initialize_on_startup():
+            print("⚠️  警告: 初始化失败，定时任务将继续重试同步\n")
+        state['scheduler'] = start_dependency_scheduler()
+
+    Thread(target=background_startup, name='startup-init', daemon=True).start()
+
+    async with mcp_app.lifespan(app):
+        yield
+
+    # 退出前释放 sync leader，其他 worker 立即接任；写入尚未保存的下载热度
+    stop.set()
+    sync_leader.release()
+    download_popularity.flush()
+
+    # 关闭定时任务调度器
+    scheduler = state.get('scheduler')
+    if scheduler:
+        scheduler.shutdown(wait=False)
+        print("\n⏰ 定时任务已停止")
+
+
+fastapi_app = FastAPI(title="下载服务", lifespan=lifespan)
 fastapi_app.mount("/ai", mcp_app)
 
 
+def service_status() -> dict:
+    """服务状态：当前目录快照版本及仓库同步状态"""
+    catalog = current_catalog()
+    return {
+        'ready': catalog.version > 0,
+        'catalog': {
+            'version': catalog.version,
+            'head': catalog.head,
+            'skills': len(catalog.skills),
+            'published_at': catalog.created_at if catalog.version else None,
+        },
+        'sync': {**_sync_status, 'pending_requests': _sync_trigger['pending']},
+        'sources': dict(_source_status) if SKILL_SOURCES else None,
+        'worker': {'pid': os.getpid(), 'workers': SERVER_WORKERS, 'sync_leader': is_sync_leader()},
+        'cache': cache_manager.stats(),
+        'prewarm': {
+            **_prewarm_status,
+            'popularity': download_popularity.stats(),
+            'top': [{'bundle': bundle_id, 'format': archive_format, 'score': score}
+                    for (bundle_id, archive_format), score in download_popularity.top(10)],
+        },
+    }
+
+
+@fastapi_app.get("/healthz")
+async def healthz():
+    """存活检查：进程可以处理请求即返回200"""
+    return {"status": "ok", **service_status()}
+
+
+@fastapi_app.get("/readyz")
+async def readyz():
+    """就绪检查：已发布目录快照（持久化索引加载或首次同步完成）时返回200，否则返回503"""
+    status = service_status()
+    return JSONResponse({"status": "ready" if status['ready'] else "not_ready", **status},
+                        status_code=200 if status['ready'] else 503)
+
+
+@fastapi_app.get("/metrics")
+async def metrics():
+    """Prometheus 格式的运行指标：tool 耗时、压缩包构建、缓存命中、仓库同步及目录规模"""
+    return Response(REGISTRY.render(), media_type=METRICS_CONTENT_TYPE)
+
+
+@fastapi_app.post("/webhook/sync")
+async def webhook_sync(request: Request):
+    """
+    仓库推送通知：由git服务的 webhook 或 post-receive 钩子调用，触发一次防抖后的同步（立即返回202）
+    """
+    body = await request.body()
+    if not verify_webhook(body, request.headers):
+        SYNC_REQUESTS.inc(source='webhook', result='unauthorized')
+        return JSONResponse({"status": "error", "message": "webhook 签名校验失败"}, status_code=401)
+
+    SYNC_REQUESTS.inc(source='webhook', result='accepted')
+    return JSONResponse({"status": "accepted", **request_sync()}, status_code=202)
+
+
 # FastAPI 下载端点
 @fastapi_app.get("/download/{skill_id}")
-async def download_skill_http(skill_id: str):
+async def download_skill_http(skill_id: str, request: Request, archive_format: str = Query("", alias="format"),
+                              skills: str = Query("")):
     """
     通过 HTTP 安装下载下载技能压缩包
     支持：
     - all: 下载所有技能
     - {skill_id}: 下载单个技能（不含依赖，已弃用）
     - {skill_id}-with-deps: 下载技能及其所有依赖（推荐）
+    - batch?skills=a,b,c: 批量下载多个技能及其依赖的并集，解析结果相同的请求共用同一个缓存压缩包
 
-    先检查缓存目录是否存在压缩包，不存在则创建
+    先检查缓存目录是否存在压缩包，不存在则创建；
+    缓存文件名包含各skill的内容哈希，skill内容不变时缓存在仓库同步后依然有效
+
+    响应携带由内容哈希生成的强ETag：If-None-Match 命中时返回304，
+    支持 Range / If-Range 断点续传
+
+    压缩包格式由 format 参数（gz / gz-fast / zst / tar）指定，未指定时默认 gz（Accept-Encoding 只列出 zstd 时为 zst），
+    每种格式独立缓存
     """
     try:
 
+        # 解析需要打包的skill（整个请求使用同一个目录快照）
+        catalog = current_catalog()
+        batch = is_batch_request(skill_id, skills, catalog)
+        if batch:
+            try:
+                bundle_id, skills_to_package = resolve_batch(parse_skill_list(skills), catalog)
+            except ValueError as e:
+                return {"status": "error", "message": str(e)}
+        else:
+            bundle_id = skill_id
+            skills_to_package = resolve_bundle(skill_id, catalog)
+        if skills_to_package is None:
+            actual_skill_id = skill_id[:-len("-with-deps")] if skill_id.endswith("-with-deps") else skill_id
+            return {"status": "error", "message": f"Skill '{actual_skill_id}' not found"}
+
         # 确保缓存目录存在
         os.makedirs(CACHE_DIR, exist_ok=True)
 
-        # 特殊处理：下载所有技能
+        # 确定压缩包格式
+        negotiated_format = negotiate_archive_format(archive_format, request.headers.get('accept-encoding'))
+        if negotiated_format is None:
+            return {"status": "error", "message": f"不支持的压缩包格式，可选: {available_archive_formats()}"}
+        spec = ARCHIVE_FORMATS[negotiated_format]
+
         if skill_id == "all":
-            cache_file_path = os.path.join(CACHE_DIR, "all-skills.tar.gz")
-
-            # 检查缓存是否存在
-            if not os.path.exists(cache_file_path):
-                # 不存在则创建压缩包
-                with tarfile.open(cache_file_path, mode='w:gz') as tar:
-                    for sid in skills.keys():
-                        skill_path = os.path.join(LOCAL_DIR, sid)
-                        if os.path.exists(skill_path):
-                            tar.add(skill_path, arcname=sid)
-
-            return FileResponse(
-                cache_file_path,
-                media_type='application/gzip',
-                filename='all-skills.tar.gz'
-            )
-
-        # 检查是否是带依赖的下载请求
-        is_with_deps = skill_id.endswith("-with-deps")
-        if is_with_deps:
-            # 提取实际的skill_id
-            actual_skill_id = skill_id.replace("-with-deps", "")
+            filename = f"all-skills.{spec['ext']}"
+        elif batch:
+            filename = f"skills-batch.{spec['ext']}"
+        elif skill_id.endswith("-with-deps"):
+            filename = f"{skill_id[:-len('-with-deps')]}.{spec['ext']}"
         else:
-            actual_skill_id = skill_id
-
-        # 验证skill是否存在
-        if actual_skill_id not in skills:
-            return {"status": "error", "message": f"Skill '{actual_skill_id}' not found"}
-
-        skill_path = os.path.join(LOCAL_DIR, actual_skill_id)
-
-        if not os.path.exists(skill_path):
-            return {"status": "error", "message": f"Skill path does not exist: {skill_path}"}
-
-        # 确定缓存文件路径
-        cache_file_path = os.path.join(CACHE_DIR, f"{skill_id}.tar.gz")
-
-        # 如果缓存不存在，创建压缩包
-        if not os.path.exists(cache_file_path):
-            with tarfile.open(cache_file_path, mode='w:gz') as tar:
-                if is_with_deps:
-                    # 下载技能及其所有依赖
-                    # 收集所有需要打包的skill
-                    all_dependencies = collect_all_dependencies(actual_skill_id)
-                    skills_to_package = [actual_skill_id] + all_dependencies
-
-                    # 打包所有skill
-                    packaged_skills = []
-                    for sid in skills_to_package:
-                        if sid in skills:
-                            sid_path = os.path.join(LOCAL_DIR, sid)
-                            if os.path.exists(sid_path):
-                                tar.add(sid_path, arcname=sid)
-                                packaged_skills.append(sid)
-
-                    print(f"📦 打包 {actual_skill_id} 及其 {len(packaged_skills)-1} 个依赖: {packaged_skills}")
-                else:
-                    # 只下载单个技能（不含依赖）
-                    tar.add(skill_path, arcname=actual_skill_id)
+            filename = f"{skill_id}.{spec['ext']}"
+
+        # 确定缓存文件路径，内容键同时作为ETag
+        cache_key = bundle_cache_key(skills_to_package, negotiated_format, catalog, bundle_id)
+        cache_file_path = bundle_cache_path(bundle_id, cache_key, negotiated_format)
+        etag = f'"{cache_key}"'
+        headers = {'ETag': etag, 'Cache-Control': 'no-cache'}
+        if not archive_format:
+            headers['Vary'] = 'Accept-Encoding'
+
+        # 记录下载热度（包括304），同步后按热度预构建
+        download_popularity.record((bundle_id, negotiated_format))
+
+        # 客户端已有相同内容，无需重新下载
+        if etag_matches(request.headers.get('if-none-match'), etag):
+            CACHE_REQUESTS.inc(bundle_type=bundle_type(bundle_id), result='not_modified')
+            cache_manager.touch(cache_file_path)
+            return Response(status_code=304, headers=headers)
+
+        # 如果缓存不存在，在线程池中创建压缩包（并发请求共享同一次构建）
+        cached = os.path.exists(cache_file_path)
+        CACHE_REQUESTS.inc(bundle_type=bundle_type(bundle_id), result='hit' if cached else 'miss')
+        if cached:
+            cache_manager.hit(cache_file_path, 'bundle')
+        else:
+            cache_manager.miss('bundle')
+            if skill_id.endswith("-with-deps"):
+                print(f"📦 打包 {skill_id[:-len('-with-deps')]} 及其 {len(skills_to_package)-1} 个依赖: {skills_to_package}")
+            elif batch:
+                print(f"📦 批量打包 {bundle_id}: {skills_to_package}")
+
+            # Range请求需要完整文件，等待构建完成后再返回
+            use_stream = STREAM_ON_CACHE_MISS and 'range' not in request.headers
+            stream = ArchiveStream() if use_stream else None
+            future = submit_archive_build(cache_file_path, skills_to_package, negotiated_format, stream, catalog)
+            if stream and stream.attached:
+                # 由本请求发起的构建：边打包边返回，同时写入缓存
+                return StreamingResponse(
+                    stream,
+                    media_type=spec['media_type'],
+                    headers={**headers, 'Content-Disposition': f'attachment; filename="{filename}"'}
+                )
+            await asyncio.wrap_future(future)
 
         return FileResponse(
             cache_file_path,
-            media_type='application/gzip',
-            filename=f'{actual_skill_id}.tar.gz'
+            media_type=spec['media_type'],
+            filename=filename,
+            headers=headers
         )
 
     except Exception as e:
         return {"status": "error", "message": str(e)}
 
 
+@fastapi_app.post("/download/{skill_id}/delta")
+async def download_skill_delta_http(skill_id: str, request: Request, archive_format: str = Query("", alias="format"),
+                                    skills: str = Query("")):
+    """
+    增量下载：请求体为客户端的 .skill-manifest.json（{"skills": {skill_id: content_hash}}），
+    响应压缩包只包含未安装和内容已变化的skill，以及安装后的新清单文件 .skill-manifest.json；
+    清单中已从仓库删除的skill不再保留，客户端应删除对应目录
+
+    压缩包由各skill的预压缩片段拼接后直接流式返回，不写入缓存；
+    批量下载使用 /download/batch/delta?skills=a,b,c
+    """
+    try:
+        catalog = current_catalog()
+        if is_batch_request(skill_id, skills, catalog):
+            _, skills_to_package = resolve_batch(parse_skill_list(skills), catalog)
+        else:
+            skills_to_package = resolve_bundle(skill_id, catalog)
+        if skills_to_package is None:
+            actual_skill_id = skill_id[:-len("-with-deps")] if skill_id.endswith("-with-deps") else skill_id
+            return {"status": "error", "message": f"Skill '{actual_skill_id}' not found"}
+
+        negotiated_format = negotiate_archive_format(archive_format, request.headers.get('accept-encoding'))
+        if negotiated_format is None:
+            return {"status": "error", "message": f"不支持的压缩包格式，可选: {available_archive_formats()}"}
+        spec = ARCHIVE_FORMATS[negotiated_format]
+
+        body = await request.body()
+        manifest = json.loads(body) if body.strip() else {}
+        if not isinstance(manifest, dict):
+            return {"status": "error", "message": "请求体必须是 .skill-manifest.json 格式的对象"}
+        installed = parse_installed_manifest(manifest.get('skills', {}))
+
+        delta = compute_delta(skills_to_package, installed, catalog)
+        outdated = set(delta['added'] + delta['changed'])
+        delta_skills = [sid for sid in skills_to_package if sid in outdated]
+        print(f"📦 增量打包 {skill_id}: 新增 {len(delta['added'])} 个，变化 {len(delta['changed'])} 个，"
+              f"跳过 {len(delta['unchanged'])} 个")
+
+        stream = ArchiveStream()
+        archive_build_executor.submit(write_delta_archive, stream, delta_skills, delta['manifest'], negotiated_format,
+                                      catalog)
+
+        headers = {
+            'Content-Disposition': f'attachment; filename="{skill_id}.delta.{spec["ext"]}"',
+            'Cache-Control': 'no-store',
+            'X-Skill-Added': str(len(delta['added'])),
+            'X-Skill-Changed': str(len(delta['changed'])),
+            'X-Skill-Removed': ','.join(delta['removed']),
+        }
+        if not archive_format:
+            headers['Vary'] = 'Accept-Encoding'
+        return StreamingResponse(stream, media_type=spec['media_type'], headers=headers)
+
+    except Exception as e:
+        return {"status": "error", "message": str(e)}
+
+
 def run_fastapi():
     """在独立线程中运行 FastAPI"""
     uvicorn.run(fastapi_app, host="0.0.0.0", port=8002, log_level="info")
@@ -698,32 +3101,44 @@ def run_fastapi():
 
 def start_dependency_scheduler():
     """
-    启动定时任务调度器，每小时更新一次依赖信息
+    启动兜底定时同步：仓库同步主要由推送通知（/webhook/sync）触发，
+    定时任务只在 SYNC_INTERVAL_HOURS 内没有成功同步过时执行，防止漏掉通知
     """
     def scheduled_update():
         """定时任务：同步仓库并更新依赖"""
+        last_success_at = _sync_status['last_success_at']
+        if last_success_at and time.time() - last_success_at < SYNC_INTERVAL_HOURS * 3600 * 0.9:
+            SYNC_REQUESTS.inc(source='scheduled', result='skipped')
+            return
+        if not _sync_lock.acquire(blocking=False):
+            # 正在同步
+            SYNC_REQUESTS.inc(source='scheduled', result='skipped')
+            return
+
+        SYNC_REQUESTS.inc(source='scheduled', result='accepted')
         try:
             print("\n⏰ 定时任务开始：同步仓库并更新依赖...")
-            sync_repo_internal()
-            update_all_dependencies()
+            _record_sync()
             print("✅ 定时任务完成\n")
         except Exception as e:
             print(f"❌ 定时任务失败: {e}\n")
+        finally:
+            _sync_lock.release()
 
     scheduler = BackgroundScheduler()
 
-    # 添加定时任务：每小时执行一次
+    # 添加兜底定时任务
     scheduler.add_job(
         scheduled_update,
         'interval',
-        hours=1,
+        hours=SYNC_INTERVAL_HOURS,
         id='update_skills_and_dependencies',
         name='同步仓库并更新依赖信息',
         replace_existing=True
     )
 
     scheduler.start()
-    print("⏰ 定时任务已启动（每小时同步仓库并更新依赖）\n")
+    print(f"⏰ 兜底定时同步已启动（每 {SYNC_INTERVAL_HOURS} 小时检查一次，推送通知: POST /webhook/sync）\n")
 
     return scheduler
 
@@ -731,7 +3146,7 @@ def start_dependency_scheduler():
 def initialize_on_startup():
     """
     启动时的初始化流程：
-    1. 同步skills仓库
+    1. 加载持久化索引（如有），同步skills仓库；HEAD未变化时无需重新扫描
     2. 加载所有skills
     3. 分析并更新所有依赖信息
     """
@@ -742,20 +3157,27 @@ def initialize_on_startup():
     try:
         # 步骤1: 同步仓库
         print("\n📥 步骤 1/3: 同步skills仓库...")
+        cache_manager.load([CACHE_DIR, FRAGMENT_DIR], os.path.join(BUILD_LOCK_DIR, 'cache-evict.lock'))
+        download_popularity.load(POPULARITY_DB_PATH)
+        if load_persisted_catalog():
+            catalog = current_catalog()
+            print(f"   ✓ 已加载持久化索引: 版本 {catalog.version}，{len(catalog.skills)} 个skill")
         result = sync_repo_internal()
         print(f"   ✓ 仓库同步完成: {result.get('status')}")
 
         # 步骤2: 加载skills
         print(f"\n📚 步骤 2/3: 加载skills信息...")
+        skills = current_catalog().skills
         print(f"   ✓ 已加载 {len(skills)} 个skill:")
         for skill_id in sorted(skills.keys())[:10]:  # 只显示前10个
             print(f"      - {skill_id}")
         if len(skills) > 10:
             print(f"      ... 共 {len(skills)} 个skill")
 
-        # 步骤3: 更新依赖信息
+        # 步骤3: 依赖信息已在同步时随索引一并分析
         print(f"\n🔗 步骤 3/3: 分析并更新依赖关系...")
-        update_all_dependencies()
+        with_deps = sum(1 for info in skills.values() if info.get('dependencies'))
+        print(f"   ✓ 共 {with_deps}/{len(skills)} 个skill有依赖")
 
         print("\n" + "=" * 60)
         print("✅ 初始化完成！所有数据已准备就绪")
@@ -772,26 +3194,22 @@ def initialize_on_startup():
 
 
 if __name__ == "__main__":
-    # 启动时初始化
-    initialization_success = initialize_on_startup()
-
-    if initialization_success:
-        # 启动定时任务
-        scheduler = start_dependency_scheduler()
-    else:
-        print("⚠️  警告: 初始化失败，但服务器仍会启动\n")
-        scheduler = None
-
+    # 立即启动HTTP服务器，初始化（同步仓库、构建索引）及定时任务由 lifespan 在后台启动
     print("🌐 正在启动HTTP服务器...\n")
 
     try:
-        uvicorn.run(fastapi_app, host="0.0.0.0", port=8002, log_level="info")
+        if SERVER_WORKERS > 1 and not getattr(sys, 'frozen', False):
+            # 多进程：各 worker 进程重新导入本模块
+            print(f"👥 以 {SERVER_WORKERS} 个 worker 进程运行\n")
+            uvicorn.run("mcp_server:fastapi_app", host="0.0.0.0", port=8002, log_level="info",
+                        workers=SERVER_WORKERS)
+        else:
+            if SERVER_WORKERS > 1:
+                print("⚠️  打包后的可执行文件不支持多进程运行，以单进程启动\n")
+            uvicorn.run(fastapi_app, host="0.0.0.0", port=8002, log_level="info")
     except (KeyboardInterrupt, SystemExit):
-        # 关闭定时任务调度器
-        if scheduler:
-            scheduler.shutdown()
-            print("\n⏰ 定时任务已停止")
-        print("\n👋 服务器已关闭")
+        pass
+    print("\n👋 服务器已关闭")
 
     # 使用StreamableHttp协议运行MCP服务（阻塞主线程）
     # mcp.run(transport="streamable-http", port=8001)
@@ -0,0 +1,233 @@
+"""
+压缩包缓存容量管理（LRU）
+
+缓存目录（压缩包及skill预压缩片段）由同一台机器上的所有 worker 进程共享，容量预算针对整个目录：
+- 最近访问时间记录为文件的修改时间（命中时 touch），所有进程看到相同的访问顺序
+- 淘汰时扫描缓存目录得到实际总大小，按修改时间从旧到新删除文件，直到总大小不超过预算；
+  扫描和删除在进程间文件锁的保护下进行，多个进程不会同时淘汰
+- 最近 min_idle_seconds 秒内访问过的文件不会被删除：正在下载或正在被拼接的文件不会被删掉，
+  刚构建的压缩包也不会立即被挤出
+
+每次写入新文件都扫描目录代价较高：各进程记录上次扫描的总大小及之后自己写入的字节数，
+估算超出预算、或自己写入的字节数超过预算的 RESCAN_FRACTION 时才重新扫描；
+多个进程同时写入时，总大小最多超出预算约 进程数 × RESCAN_FRACTION。
+
+命中统计只保存在内存中，按进程分别记录。
+"""
+import contextlib
+import os
+import time
+from threading import Lock
+
+from skill_cluster import FileLock
+
+# 自上次扫描后本进程写入的字节数超过预算的该比例时重新扫描缓存目录
+RESCAN_FRACTION = 0.02
+
+
+class CacheManager:
+    """
+    缓存文件的访问记录、命中统计及容量淘汰
+
+    Example:
+        >>> manager = CacheManager(max_bytes=2 * 1024 ** 3, lock_path='/path/to/cache-evict.lock')
+        >>> manager.load([cache_dir, fragment_dir])
+        >>> manager.hit(path, 'bundle')      # 命中缓存
+        >>> manager.miss('bundle')           # 未命中，构建后登记
+        >>> manager.add(new_path)            # 超出预算时淘汰最久未访问的文件
+    """
+
+    def __init__(self, max_bytes: int, min_idle_seconds: float = 60.0, on_evict=None, lock_path: str = None):
+        """
+        Args:
+            max_bytes: 缓存容量预算（字节，所有进程共享），0 表示不限制
+            min_idle_seconds: 文件至少闲置该时长才允许被淘汰
+            on_evict: 删除文件后的回调 on_evict(path, reason)
+            lock_path: 进程间淘汰锁文件（None 表示只在进程内加锁，适用于单进程运行）
+        """
+        self.max_bytes = max_bytes
+        self.min_idle_seconds = min_idle_seconds
+        self.on_evict = on_evict
+        self.lock_path = lock_path
+        self.dir_paths = []
+        self._scanned = {'entries': 0, 'total_bytes': 0, 'oldest_access_at': None}
+        self._pending_bytes = 0  # 上次扫描后本进程写入的字节数
+        self._pending_entries = 0
+        self._dirty = True
+        self._hits = {}
+        self._misses = {}
+        self._evictions = 0
+        self._lock = Lock()
+        self._evict_lock = Lock()
+
+    def load(self, dir_paths: list, lock_path: str = None):
+        """设置缓存目录（及进程间淘汰锁文件），扫描一次目录并按预算淘汰"""
+        with self._lock:
+            self.dir_paths = list(dir_paths)
+            if lock_path:
+                self.lock_path = lock_path
+            self._dirty = True
+        self.evict_over_budget()
+
+    def _cluster_lock(self):
+        return FileLock(self.lock_path) if self.lock_path else contextlib.nullcontext()
+
+    def _scan(self) -> list:
+        """扫描缓存目录（跳过写入中的临时文件）：[(修改时间, 路径, 大小), ...]，按修改时间从旧到新"""
+        found = []
+        for dir_path in self.dir_paths:
+            if not os.path.isdir(dir_path):
+                continue
+            with os.scandir(dir_path) as entries:
+                for entry in entries:
+                    if entry.is_file() and not entry.name.endswith('.tmp'):
+                        try:
+                            stat = entry.stat()
+                        except OSError:
+                            continue
+                        found.append((stat.st_mtime, entry.path, stat.st_size))
+        return sorted(found)
+
+    def touch(self, path: str):
+        """记录一次访问（不计入命中统计）：更新文件的修改时间"""
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+
+    def hit(self, path: str, kind: str):
+        """缓存命中"""
+        self.touch(path)
+        with self._lock:
+            self._hits[kind] = self._hits.get(kind, 0) + 1
+
+    def miss(self, kind: str):
+        """缓存未命中"""
+        with self._lock:
+            self._misses[kind] = self._misses.get(kind, 0) + 1
+
+    def add(self, path: str) -> list:
+        """
+        登记新写入的缓存文件，超出预算时淘汰
+
+        Returns:
+            list: 被淘汰的文件路径
+        """
+        try:
+            size = os.path.getsize(path)
+        except OSError:
+            return []
+        with self._lock:
+            dir_path = os.path.dirname(path)
+            if dir_path not in self.dir_paths:
+                self.dir_paths.append(dir_path)
+                self._dirty = True
+            self._pending_bytes += size
+            self._pending_entries += 1
+        return self.evict_over_budget()
+
+    def discard(self, path: str):
+        """文件已被其他途径删除（如过期清理），下次检查时重新扫描"""
+        with self._lock:
+            self._dirty = True
+
+    def reset(self):
+        """缓存目录被整体删除（保留命中统计）"""
+        with self._lock:
+            self._scanned = {'entries': 0, 'total_bytes': 0, 'oldest_access_at': None}
+            self._pending_bytes = 0
+            self._pending_entries = 0
+            self._dirty = True
+
+    def _rescan_due(self) -> bool:
+        with self._lock:
+            if self._dirty:
+                return True
+            if not self.max_bytes:
+                return False
+            return (self._scanned['total_bytes'] + self._pending_bytes > self.max_bytes
+                    or self._pending_bytes >= self.max_bytes * RESCAN_FRACTION)
+
+    def _evict_scanned(self, select, reason: str) -> list:
+        """
+        持进程间锁扫描缓存目录，删除 select(扫描结果) 选出的文件，并以扫描结果更新容量统计
+
+        Returns:
+            list: 实际删除的文件路径
+        """
+        removed = []
+        with self._evict_lock, self._cluster_lock():
+            files = self._scan()
+            selected = set(select(files))
+            remaining = []
+            for mtime, path, size in files:
+                if path not in selected:
+                    remaining.append((mtime, size))
+                    continue
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    continue
+                except OSError as e:
+                    print(f"Error evicting cache {path}: {e}")
+                    remaining.append((mtime, size))
+                    continue
+                removed.append(path)
+
+            with self._lock:
+                self._scanned = {
+                    'entries': len(remaining),
+                    'total_bytes': sum(size for _, size in remaining),
+                    'oldest_access_at': remaining[0][0] if remaining else None,
+                }
+                self._pending_bytes = 0
+                self._pending_entries = 0
+                self._dirty = False
+                self._evictions += len(removed)
+
+        if self.on_evict:
+            for path in removed:
+                self.on_evict(path, reason)
+        return removed
+
+    def evict_over_budget(self) -> list:
+        """按最近最少使用顺序淘汰文件，直到缓存目录总大小不超过预算（闲置时间不足的文件跳过）"""
+        if not self._rescan_due():
+            return []
+
+        def select(files: list) -> list:
+            if not self.max_bytes:
+                return []
+            deadline = time.time() - self.min_idle_seconds
+            excess = sum(size for _, _, size in files) - self.max_bytes
+            candidates = []
+            for mtime, path, size in files:
+                if excess <= 0 or mtime > deadline:
+                    # 其余文件都在最近访问过
+                    break
+                candidates.append(path)
+                excess -= size
+            return candidates
+
+        return self._evict_scanned(select, 'lru')
+
+    def evict_idle(self, idle_seconds: float) -> list:
+        """淘汰闲置超过 idle_seconds 秒（不少于 min_idle_seconds）的冷文件"""
+        deadline = time.time() - max(idle_seconds, self.min_idle_seconds)
+        return self._evict_scanned(lambda files: [path for mtime, path, _ in files if mtime <= deadline], 'cold')
+
+    def stats(self) -> dict:
+        """缓存容量（最近一次扫描结果加上之后本进程写入的文件）及本进程的命中统计"""
+        with self._lock:
+            hits = sum(self._hits.values())
+            misses = sum(self._misses.values())
+            return {
+                'entries': self._scanned['entries'] + self._pending_entries,
+                'total_bytes': self._scanned['total_bytes'] + self._pending_bytes,
+                'max_bytes': self.max_bytes,
+                'hits': dict(self._hits),
+                'misses': dict(self._misses),
+                'hit_ratio': round(hits / (hits + misses), 4) if hits + misses else None,
+                'evictions': self._evictions,
+                'oldest_access_at': self._scanned['oldest_access_at'],
+            }
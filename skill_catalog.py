@@ -0,0 +1,45 @@
+"""
+skills 目录快照
+
+索引刷新时在旁路构建完整的skills记录（含依赖、文件统计）以及依赖图和关键词索引，
+构建完成后通过一次引用替换整体发布。快照发布后只读：
+读取方无需加锁，同一请求内使用同一个快照即可始终看到一致的视图。
+"""
+import time
+from types import MappingProxyType
+
+from skill_graph import DependencyGraph
+from skill_search import SkillSearchIndex
+
+
+class CatalogSnapshot:
+    """
+    不可变的skills目录快照
+
+    Attributes:
+        version: 快照版本号，每次发布递增（0 表示尚未构建的空目录）
+        head: 构建快照时的git HEAD（None 表示尚未构建，下次刷新需全量扫描）
+        root: 构建快照时的检出目录，打包时从该目录读取skill文件（None 表示使用 LOCAL_DIR）
+        skills: skill_id -> skill记录（只读映射，记录本身在发布后也不再修改）
+        graph: 依赖图
+        search_index: 关键词倒排索引
+        bundle_keys: (bundle_id, 压缩包格式) -> 压缩包缓存键（由 bundle_cache_key 按需填充）
+        created_at: 发布时间戳
+    """
+
+    def __init__(self, skills: dict, head: str = None, version: int = 0, root: str = None):
+        self.version = version
+        self.head = head
+        self.root = root
+        self.skills = MappingProxyType(skills)
+        self.graph = DependencyGraph(skills)
+        self.search_index = SkillSearchIndex(skills)
+        self.bundle_keys = {}
+        self.created_at = time.time()
+
+    def __contains__(self, skill_id: str) -> bool:
+        return skill_id in self.skills
+
+    def copy_skills(self) -> dict:
+        """复制所有skill记录（逐条浅拷贝），供刷新时在副本上修改，不影响已发布的快照"""
+        return {skill_id: dict(info) for skill_id, info in self.skills.items()}
@@ -0,0 +1,142 @@
+"""
+多进程部署的进程间协调（同一台机器上的多个 worker 共享 BASE_DIR）
+
+- 同步 leader 选举：各 worker 以非阻塞方式争抢 leader 锁文件的排他锁（flock），
+  持有者负责仓库同步、定时任务及预构建；锁在进程退出时由内核释放，其余 worker 下次轮询时接任
+- 目录版本通知：leader 写入持久化索引后原子替换版本文件，其他 worker 轮询到新版本后重新加载索引
+- 缓存构建锁：同一个缓存文件同一时间只由一个进程构建
+
+依赖 fcntl（仅类Unix系统）；不可用时所有锁直接成功，只支持单进程运行。
+"""
+import hashlib
+import json
+import os
+import time
+
+try:
+    import fcntl
+except ImportError:  # Windows：不支持多进程部署
+    fcntl = None
+
+# 缓存构建锁的分片数：缓存文件名按哈希映射到固定数量的锁文件，锁文件无需清理
+BUILD_LOCK_STRIPES = 256
+
+
+class FileLock:
+    """
+    基于 flock 的进程间排他锁；同一进程内不同线程各自打开的锁之间同样互斥
+
+    Example:
+        >>> with FileLock('/path/to/file.lock'):
+        ...     build()
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._fd = None
+
+    def acquire(self, blocking: bool = True) -> bool:
+        """获取锁，blocking 为 False 时锁被占用立即返回 False"""
+        if self._fd is not None:
+            return True
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        if fcntl is not None:
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX | (0 if blocking else fcntl.LOCK_NB))
+            except BlockingIOError:
+                os.close(fd)
+                return False
+        self._fd = fd
+        return True
+
+    def release(self):
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+
+    @property
+    def locked(self) -> bool:
+        return self._fd is not None
+
+    def fileno(self) -> int:
+        return self._fd
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.release()
+
+
+def build_lock(lock_dir: str, file_name: str) -> FileLock:
+    """缓存文件 file_name 的构建锁（按文件名哈希分片）"""
+    stripe = int(hashlib.sha1(file_name.encode('utf-8')).hexdigest()[:8], 16) % BUILD_LOCK_STRIPES
+    return FileLock(os.path.join(lock_dir, f"build-{stripe:03d}.lock"))
+
+
+class LeaderElection:
+    """
+    同步 leader 选举：持有锁文件排他锁的进程为 leader，直到进程退出或调用 release
+
+    Example:
+        >>> leader = LeaderElection('/path/to/sync-leader.lock')
+        >>> if leader.try_acquire():
+        ...     start_scheduler()
+    """
+
+    def __init__(self, lock_path: str):
+        self.lock_path = lock_path
+        self._lock = FileLock(lock_path)
+        self.elected_at = None
+
+    @property
+    def is_leader(self) -> bool:
+        return self._lock.locked
+
+    def try_acquire(self) -> bool:
+        """
+        尝试成为 leader（非阻塞，已是 leader 时直接返回 True）
+
+        Returns:
+            bool: 当前进程是否为 leader
+        """
+        if self._lock.locked:
+            return True
+        if not self._lock.acquire(blocking=False):
+            return False
+        self.elected_at = time.time()
+        # 记录持有者，便于排查（锁本身不依赖文件内容）
+        os.ftruncate(self._lock.fileno(), 0)
+        os.pwrite(self._lock.fileno(), json.dumps({'pid': os.getpid(), 'elected_at': self.elected_at}).encode('utf-8'), 0)
+        return True
+
+    def release(self):
+        self._lock.release()
+        self.elected_at = None
+
+    def holder(self) -> dict:
+        """当前 leader 的记录（{'pid', 'elected_at'}），无法读取时返回None"""
+        try:
+            with open(self.lock_path, encoding='utf-8') as f:
+                return json.loads(f.read() or 'null')
+        except (OSError, ValueError):
+            return None
+
+
+def write_version_file(path: str, data: dict):
+    """原子写入目录版本文件"""
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(data, f)
+    os.replace(tmp_path, path)
+
+
+def read_version_file(path: str):
+    """读取目录版本文件，不存在或内容无效时返回None"""
+    try:
+        with open(path, encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
@@ -0,0 +1,235 @@
+"""
+skills 依赖图引擎
+
+每次skills索引刷新后根据各skill的直接依赖构建一次，之后只读：
+- 邻接数组：skill ID 映射为整数下标，边只保留指向已存在skill的依赖
+- Tarjan 强连通分量（迭代实现，不受递归深度限制），用于报告循环依赖
+- 拓扑序：依赖在前、依赖方在后，即安装顺序
+- 按强连通分量记忆化的传递依赖闭包，首次查询后 O(1) 读取
+- 反向邻接数组：查询直接及传递依赖方（哪些skill依赖了指定skill）
+"""
+
+
+class DependencyGraph:
+    """
+    skills 依赖图，构建后只读
+
+    Example:
+        >>> graph = DependencyGraph(skills)
+        >>> graph.dependencies_of("devops-flow")
+        ('brainstorming', 'writing-plans', 'executing-plans')
+        >>> graph.cycles
+        [['skillA', 'skillB', 'skillC']]
+    """
+
+    def __init__(self, skills: dict):
+        self.ids = list(skills)
+        self.index = {skill_id: i for i, skill_id in enumerate(self.ids)}
+
+        # 邻接数组及不存在的依赖
+        self.adjacency = []
+        self.missing = {}
+        for skill_id in self.ids:
+            deps = skills[skill_id].get('dependencies') or []
+            self.adjacency.append(tuple(dict.fromkeys(self.index[d] for d in deps if d in self.index)))
+            missing = [d for d in deps if d not in self.index]
+            if missing:
+                self.missing[skill_id] = missing
+
+        # 反向邻接数组：被依赖skill -> 依赖方
+        self.reverse_adjacency = [[] for _ in self.ids]
+        for node, succs in enumerate(self.adjacency):
+            for succ in succs:
+                self.reverse_adjacency[succ].append(node)
+
+        self._find_components()
+
+        # 循环依赖：包含多个skill或自依赖的强连通分量
+        self.cycles = []
+        self.cyclic_components = set()
+        for comp, members in enumerate(self.components):
+            if len(members) > 1 or members[0] in self.adjacency[members[0]]:
+                self.cyclic_components.add(comp)
+                self.cycles.append(sorted(self.ids[node] for node in members))
+
+        # 安装顺序：Tarjan 按"被依赖的分量先完成"的顺序输出分量，依次展开即为拓扑序
+        self.install_order = tuple(self.ids[node] for members in self.components for node in members)
+
+        # 分量 -> 可达的其他分量集合，按需计算
+        self._component_closures = {}
+        # skill下标 -> 按安装顺序排列的传递依赖ID元组
+        self._closures = {}
+
+    def _find_components(self):
+        """迭代实现的 Tarjan 强连通分量算法"""
+        count = len(self.ids)
+        order = [-1] * count
+        lowlink = [0] * count
+        on_stack = [False] * count
+        stack = []
+        self.components = []
+        self.component_of = [-1] * count
+        counter = 0
+
+        for start in range(count):
+            if order[start] != -1:
+                continue
+
+            work = [(start, 0)]
+            while work:
+                node, edge = work[-1]
+                if edge == 0:
+                    order[node] = lowlink[node] = counter
+                    counter += 1
+                    stack.append(node)
+                    on_stack[node] = True
+
+                neighbors = self.adjacency[node]
+                if edge < len(neighbors):
+                    work[-1] = (node, edge + 1)
+                    succ = neighbors[edge]
+                    if order[succ] == -1:
+                        work.append((succ, 0))
+                    elif on_stack[succ]:
+                        lowlink[node] = min(lowlink[node], order[succ])
+                    continue
+
+                # node 的所有出边处理完毕
+                work.pop()
+                if work:
+                    parent = work[-1][0]
+                    lowlink[parent] = min(lowlink[parent], lowlink[node])
+
+                if lowlink[node] == order[node]:
+                    members = []
+                    while True:
+                        member = stack.pop()
+                        on_stack[member] = False
+                        self.component_of[member] = len(self.components)
+                        members.append(member)
+                        if member == node:
+                            break
+                    self.components.append(sorted(members))
+
+        # 各分量指向的其他分量（缩点后的DAG）
+        self.component_edges = []
+        for members in self.components:
+            comp = self.component_of[members[0]]
+            targets = {self.component_of[succ] for node in members for succ in self.adjacency[node]}
+            targets.discard(comp)
+            self.component_edges.append(tuple(sorted(targets)))
+
+    def _component_closure(self, comp: int) -> frozenset:
+        """
+        分量可达的其他分量集合（迭代遍历缩点DAG）
+
+        只记忆化被查询过的分量，遍历时遇到已记忆化的分量直接合并其结果而不再深入，
+        内存占用与查询过的闭包大小成正比（长依赖链不会为每个中间分量都保存一份闭包）
+        """
+        closures = self._component_closures
+        cached = closures.get(comp)
+        if cached is not None:
+            return cached
+
+        reached = set()
+        work = list(self.component_edges[comp])
+        while work:
+            current = work.pop()
+            if current in reached:
+                continue
+            reached.add(current)
+            cached = closures.get(current)
+            if cached is not None:
+                reached.update(cached)
+            else:
+                work.extend(self.component_edges[current])
+
+        result = frozenset(reached)
+        closures[comp] = result
+        return result
+
+    def __contains__(self, skill_id: str) -> bool:
+        return skill_id in self.index
+
+    def dependencies_of(self, skill_id: str) -> tuple:
+        """
+        获取skill的所有传递依赖（不含自身），按安装顺序排列（被依赖的skill在前）
+
+        Returns:
+            tuple: 依赖的skill ID；skill不存在时返回空元组
+        """
+        node = self.index.get(skill_id)
+        if node is None:
+            return ()
+
+        closure = self._closures.get(node)
+        if closure is None:
+            comp = self.component_of[node]
+            nodes = {n for reached in self._component_closure(comp) for n in self.components[reached]}
+            if comp in self.cyclic_components:
+                # 同一循环中的其他skill互为依赖
+                nodes.update(self.components[comp])
+            nodes.discard(node)
+            closure = tuple(self.ids[n] for n in sorted(nodes, key=lambda n: (self.component_of[n], n)))
+            self._closures[node] = closure
+        return closure
+
+    def install_order_of(self, skill_ids) -> list:
+        """将给定的skill按安装顺序排列（被依赖的skill在前），忽略不存在的skill"""
+        nodes = {self.index[skill_id] for skill_id in skill_ids if skill_id in self.index}
+        return [self.ids[n] for n in sorted(nodes, key=lambda n: (self.component_of[n], n))]
+
+    def direct_dependencies_of(self, skill_id: str) -> tuple:
+        """获取skill已存在的直接依赖"""
+        node = self.index.get(skill_id)
+        if node is None:
+            return ()
+        return tuple(self.ids[succ] for succ in self.adjacency[node])
+
+    def dependents_of(self, skill_id: str, transitive: bool = False) -> list:
+        """
+        获取依赖了指定skill的其他skill（广度优先遍历反向邻接数组）
+
+        Args:
+            skill_id: 被依赖的skill ID
+            transitive: 是否包含传递依赖方（默认只返回直接依赖方）
+
+        Returns:
+            list: [(skill_id, depth), ...]，depth为1表示直接依赖方；按 depth、skill ID 排序，不含自身
+        """
+        start = self.index.get(skill_id)
+        if start is None:
+            return []
+
+        depths = {start: 0}
+        frontier = [start]
+        depth = 0
+        while frontier and (transitive or depth == 0):
+            depth += 1
+            next_frontier = []
+            for node in frontier:
+                for dependent in self.reverse_adjacency[node]:
+                    if dependent not in depths:
+                        depths[dependent] = depth
+                        next_frontier.append(dependent)
+            frontier = next_frontier
+
+        del depths[start]
+        return sorted(((self.ids[node], d) for node, d in depths.items()), key=lambda item: (item[1], item[0]))
+
+    def cycle_of(self, skill_id: str):
+        """获取skill所在的循环依赖（skill ID列表），不在循环中时返回None"""
+        node = self.index.get(skill_id)
+        if node is None or self.component_of[node] not in self.cyclic_components:
+            return None
+        return sorted(self.ids[n] for n in self.components[self.component_of[node]])
+
+    def stats(self) -> dict:
+        """依赖图统计信息"""
+        return {
+            'skills': len(self.ids),
+            'edges': sum(len(succ) for succ in self.adjacency),
+            'components': len(self.components),
+            'cycles': len(self.cycles),
+            'missing_dependencies': sum(len(deps) for deps in self.missing.values()),
+        }
@@ -0,0 +1,234 @@
+"""
+运行指标：计数器、仪表、直方图，以 Prometheus 文本格式（0.0.4）从 /metrics 输出
+
+- 指标在内存中按标签值累计，记录时只做一次加锁的字典更新，可以放在下载、打包等热路径上
+- 目录规模、依赖图统计等状态类指标在抓取时由采集回调读取当前快照，无需在刷新时维护
+- 不依赖 prometheus_client，打包的可执行文件无需额外依赖
+"""
+import contextlib
+import math
+import time
+from threading import Lock
+
+# 耗时直方图的默认分桶（秒）
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+# 压缩包大小直方图的分桶（字节）：4KB ~ 1GB
+SIZE_BUCKETS = tuple(4096 * 4 ** i for i in range(10))
+
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return '+Inf'
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def _escape_label(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(names: tuple, values: tuple, extra: str = '') -> str:
+    pairs = [f'{name}="{_escape_label(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+class _Metric:
+    """指标基类：按标签值元组保存样本"""
+
+    type_name = ''
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = Lock()
+
+    def _key(self, labels: dict) -> tuple:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} 需要标签 {self.labelnames}，实际为 {tuple(labels)}")
+        return tuple(labels[name] for name in self.labelnames)
+
+    def clear(self):
+        with self._lock:
+            self._values.clear()
+
+    def samples(self) -> list:
+        """[(后缀, 标签名, 标签值, 额外标签, 数值), ...]"""
+        with self._lock:
+            return [('', self.labelnames, key, '', value) for key, value in sorted(self._values.items())]
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type_name}"]
+        for suffix, names, values, extra, value in self.samples():
+            lines.append(f"{self.name}{suffix}{_format_labels(names, values, extra)} {_format_value(value)}")
+        return lines
+
+
+class Counter(_Metric):
+    """只增不减的计数器"""
+
+    type_name = 'counter'
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(_Metric):
+    """可任意设置的当前值"""
+
+    type_name = 'gauge'
+
+    def set(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+
+class Histogram(_Metric):
+    """分桶直方图，同时输出 _sum 和 _count"""
+
+    type_name = 'histogram'
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple = (), buckets: tuple = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = {'counts': [0] * len(self.buckets), 'sum': 0.0}
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state['counts'][i] += 1
+                    break
+            state['sum'] += value
+
+    @contextlib.contextmanager
+    def time(self, **labels):
+        """记录代码块耗时（秒），代码块抛出异常时同样记录"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def samples(self) -> list:
+        with self._lock:
+            snapshot = [(key, list(state['counts']), state['sum']) for key, state in sorted(self._values.items())]
+
+        samples = []
+        for key, counts, total in snapshot:
+            cumulative = 0
+            for bound, count in zip(self.buckets, counts):
+                cumulative += count
+                samples.append(('_bucket', self.labelnames, key, f'le="{_format_value(bound)}"', cumulative))
+            samples.append(('_sum', self.labelnames, key, '', total))
+            samples.append(('_count', self.labelnames, key, '', cumulative))
+        return samples
+
+
+class MetricsRegistry:
+    """
+    指标注册表
+
+    Example:
+        >>> registry = MetricsRegistry()
+        >>> hits = registry.counter('skill_cache_requests_total', '缓存请求次数', ('result',))
+        >>> hits.inc(result='hit')
+        >>> print(registry.render())
+    """
+
+    def __init__(self):
+        self._metrics = {}
+        self._collectors = []
+        self._lock = Lock()
+
+    def _register(self, metric: _Metric) -> _Metric:
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f"指标 {metric.name} 已注册")
+            self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: tuple = ()) -> Counter:
+        return self._register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name: str, documentation: str, labelnames: tuple = ()) -> Gauge:
+        return self._register(Gauge(name, documentation, labelnames))
+
+    def histogram(self, name: str, documentation: str, labelnames: tuple = (),
+                  buckets: tuple = DEFAULT_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, documentation, labelnames, buckets))
+
+    def on_collect(self, collector):
+        """注册采集回调：每次输出指标前调用，用于设置状态类仪表；回调异常不影响其他指标输出"""
+        self._collectors.append(collector)
+        return collector
+
+    def render(self) -> str:
+        """以 Prometheus 文本格式输出所有指标"""
+        for collector in self._collectors:
+            try:
+                collector()
+            except Exception as e:
+                print(f"Error collecting metrics in {getattr(collector, '__name__', collector)}: {e}")
+
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+# 文本格式的 Content-Type
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+REGISTRY = MetricsRegistry()
+
+# MCP tools
+TOOL_DURATION = REGISTRY.histogram(
+    'skill_tool_duration_seconds', 'MCP tool 调用耗时', ('tool', 'status'))
+
+# 压缩包构建
+ARCHIVE_BUILD_DURATION = REGISTRY.histogram(
+    'skill_archive_build_duration_seconds', '压缩包构建耗时（写入缓存）', ('bundle_type', 'format'))
+ARCHIVE_BUILD_BYTES = REGISTRY.histogram(
+    'skill_archive_build_bytes', '构建的压缩包大小', ('bundle_type', 'format'), SIZE_BUCKETS)
+ARCHIVE_BUILDS_INFLIGHT = REGISTRY.gauge(
+    'skill_archive_builds_inflight', '正在构建的压缩包数量')
+
+# 压缩包缓存
+CACHE_REQUESTS = REGISTRY.counter(
+    'skill_cache_requests_total', '压缩包缓存查询次数（result: hit / miss / not_modified）', ('bundle_type', 'result'))
+CACHE_EVICTIONS = REGISTRY.counter(
+    'skill_cache_evictions_total', '删除的缓存文件数（reason: stale / lru / cold / clear）', ('bundle_type', 'reason'))
+CACHE_PREWARM = REGISTRY.counter(
+    'skill_cache_prewarm_total', '同步后预构建的压缩包数（result: built / cached / failed）', ('result',))
+CACHE_BYTES = REGISTRY.gauge('skill_cache_bytes', '缓存文件总大小')
+CACHE_ENTRIES = REGISTRY.gauge('skill_cache_entries', '缓存文件数量')
+
+# 仓库同步
+SYNC_DURATION = REGISTRY.histogram(
+    'skill_sync_duration_seconds', '仓库同步（git fetch、检出及索引刷新）耗时', ('outcome',))
+SYNC_LAST_SUCCESS = REGISTRY.gauge(
+    'skill_sync_last_success_timestamp_seconds', '最近一次同步成功的时间戳')
+SYNC_REQUESTS = REGISTRY.counter(
+    'skill_sync_requests_total', '同步请求次数（source: webhook / scheduled；result: accepted / unauthorized / skipped）',
+    ('source', 'result'))
+
+# 目录快照与依赖图
+CATALOG_VERSION = REGISTRY.gauge('skill_catalog_version', '当前目录快照版本号')
+CATALOG_SKILLS = REGISTRY.gauge('skill_catalog_skills', '当前目录快照中的skill数量')
+CATALOG_BYTES = REGISTRY.gauge('skill_catalog_bytes', '所有skill文件总大小')
+GRAPH_STATS = REGISTRY.gauge(
+    'skill_dependency_graph', '依赖图统计（stat: edges / components / cycles / missing_dependencies）', ('stat',))
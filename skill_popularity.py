@@ -0,0 +1,220 @@
+"""
+下载热度统计
+
+按下载键（bundle ID 及压缩包格式）累计指数衰减的下载次数：每次下载计 1，
+经过一个半衰期后权重减半，热度反映的是近期流量而不是历史总量。
+
+实现上不逐条衰减，而是让新的下载按时间放大权重（2 ** (距基准时间的半衰期数)），
+记录和排序都是 O(1) 的字典操作；放大倍数过大时整体缩放一次并推进基准时间。
+
+调用 load 指定统计文件（SQLite）后，热度在所有 worker 进程间共享并在重启后保留：
+各进程先在内存中累计，flush 时把权重换算到统计文件中共同的基准时间后累加写入，
+同一时刻的权重可以直接相加；top 先写入本进程的累计再按统计文件排序，结果包含所有进程的下载。
+未指定统计文件时只保存在内存中，按进程分别统计。
+"""
+import heapq
+import json
+import sqlite3
+import time
+from threading import Lock
+
+# 权重指数超过该值时整体缩放，避免浮点溢出
+_RESCALE_EXPONENT = 64
+
+
+def _encode_key(key) -> str:
+    return json.dumps(list(key) if isinstance(key, tuple) else key, ensure_ascii=False)
+
+
+def _decode_key(text: str):
+    key = json.loads(text)
+    return tuple(key) if isinstance(key, list) else key
+
+
+class PopularityTracker:
+    """
+    下载热度统计
+
+    Example:
+        >>> tracker = PopularityTracker(half_life_seconds=24 * 3600)
+        >>> tracker.load('/path/to/skill-popularity.db')   # 可选：多进程共享
+        >>> tracker.record(('base-with-deps', 'gz'))
+        >>> tracker.top(10)
+        [(('base-with-deps', 'gz'), 1.0)]
+    """
+
+    def __init__(self, half_life_seconds: float, max_entries: int = 10000, db_path: str = None):
+        """
+        Args:
+            half_life_seconds: 热度半衰期（秒）
+            max_entries: 最多记录的下载键数量，超出时丢弃热度最低的一半
+            db_path: 共享的统计文件（None 表示只在内存中统计）
+        """
+        self.half_life_seconds = half_life_seconds
+        self.max_entries = max_entries
+        self.db_path = db_path
+        self._scores = {}  # 使用统计文件时为尚未写入的累计
+        self._base_time = time.time()
+        self._total = 0
+        self._lock = Lock()
+        self._flush_lock = Lock()
+
+    def load(self, db_path: str):
+        """指定共享的统计文件，之后的统计在所有使用该文件的进程间合并"""
+        with self._lock:
+            self.db_path = db_path
+
+    def _weight(self, now: float) -> float:
+        return 2.0 ** ((now - self._base_time) / self.half_life_seconds)
+
+    def _rescale(self, now: float):
+        """推进基准时间到 now，所有热度按衰减后的值重新保存"""
+        factor = 1.0 / self._weight(now)
+        self._scores = {key: score * factor for key, score in self._scores.items() if score * factor > 1e-6}
+        self._base_time = now
+
+    def record(self, key, count: int = 1):
+        """记录下载（只更新内存，使用统计文件时由 flush 写入）"""
+        now = time.time()
+        with self._lock:
+            if (now - self._base_time) / self.half_life_seconds > _RESCALE_EXPONENT:
+                self._rescale(now)
+            self._scores[key] = self._scores.get(key, 0.0) + count * self._weight(now)
+            self._total += count
+            if len(self._scores) > self.max_entries:
+                keep = heapq.nlargest(self.max_entries // 2, self._scores.items(), key=lambda item: item[1])
+                self._scores = dict(keep)
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.db_path, timeout=10, isolation_level=None)
+        conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+        conn.execute("CREATE TABLE IF NOT EXISTS popularity (key TEXT PRIMARY KEY, weight REAL NOT NULL)")
+        conn.execute("CREATE INDEX IF NOT EXISTS popularity_weight ON popularity (weight)")
+        return conn
+
+    def _shared_epoch(self, conn: sqlite3.Connection, now: float) -> float:
+        """
+        读取统计文件的基准时间（需在写事务中调用）：
+        尚未设置或半衰期配置已变化时清空统计，权重指数过大时整体缩放并推进基准时间
+        """
+        meta = dict(conn.execute("SELECT key, value FROM meta"))
+        epoch = float(meta['epoch']) if 'epoch' in meta else None
+        if epoch is None or meta.get('half_life_seconds') != repr(self.half_life_seconds):
+            conn.execute("DELETE FROM popularity")
+            conn.execute("DELETE FROM meta")
+            epoch = now
+        elif (now - epoch) / self.half_life_seconds > _RESCALE_EXPONENT:
+            factor = 2.0 ** (-(now - epoch) / self.half_life_seconds)
+            conn.execute("UPDATE popularity SET weight = weight * ?", (factor,))
+            conn.execute("DELETE FROM popularity WHERE weight <= 1e-6")
+            epoch = now
+        else:
+            return epoch
+        conn.executemany("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)",
+                         [('epoch', repr(epoch)), ('half_life_seconds', repr(self.half_life_seconds))])
+        return epoch
+
+    def flush(self):
+        """把本进程内存中的累计写入统计文件（未指定统计文件或没有新的下载时不做任何事）"""
+        with self._flush_lock:
+            with self._lock:
+                if not self.db_path or not self._scores:
+                    return
+                pending, self._scores = self._scores, {}
+                base_time = self._base_time
+
+            now = time.time()
+            try:
+                conn = self._connect()
+                try:
+                    conn.execute("BEGIN IMMEDIATE")
+                    epoch = self._shared_epoch(conn, now)
+                    factor = 2.0 ** ((base_time - epoch) / self.half_life_seconds)
+                    conn.executemany(
+                        "INSERT INTO popularity (key, weight) VALUES (?, ?) "
+                        "ON CONFLICT (key) DO UPDATE SET weight = weight + excluded.weight",
+                        ((_encode_key(key), score * factor) for key, score in pending.items())
+                    )
+                    if conn.execute("SELECT COUNT(*) FROM popularity").fetchone()[0] > self.max_entries:
+                        conn.execute("DELETE FROM popularity WHERE key NOT IN "
+                                     "(SELECT key FROM popularity ORDER BY weight DESC LIMIT ?)",
+                                     (self.max_entries // 2,))
+                    conn.execute("COMMIT")
+                except BaseException:
+                    if conn.in_transaction:
+                        conn.execute("ROLLBACK")
+                    raise
+                finally:
+                    conn.close()
+            except sqlite3.Error as e:
+                print(f"Error saving download popularity: {e}")
+                # 写入失败：放回内存，下次重试
+                with self._lock:
+                    factor = 2.0 ** ((base_time - self._base_time) / self.half_life_seconds)
+                    for key, score in pending.items():
+                        self._scores[key] = self._scores.get(key, 0.0) + score * factor
+
+    def forget(self, key):
+        """移除下载键（如对应的skill已被删除）"""
+        with self._lock:
+            self._scores.pop(key, None)
+            db_path = self.db_path
+        if db_path:
+            try:
+                conn = self._connect()
+                try:
+                    conn.execute("DELETE FROM popularity WHERE key = ?", (_encode_key(key),))
+                finally:
+                    conn.close()
+            except sqlite3.Error as e:
+                print(f"Error saving download popularity: {e}")
+
+    def top(self, n: int) -> list:
+        """
+        热度最高的 n 个下载键（使用统计文件时包含所有进程已写入的下载）
+
+        Returns:
+            list: [(key, 当前热度), ...]，按热度从高到低排列
+        """
+        if self.db_path:
+            self.flush()
+            try:
+                conn = self._connect()
+                try:
+                    epoch = conn.execute("SELECT value FROM meta WHERE key = 'epoch'").fetchone()
+                    rows = conn.execute("SELECT key, weight FROM popularity ORDER BY weight DESC LIMIT ?",
+                                        (n,)).fetchall()
+                finally:
+                    conn.close()
+            except sqlite3.Error as e:
+                print(f"Error loading download popularity: {e}")
+                return []
+            if not epoch:
+                return []
+            factor = 2.0 ** (-(time.time() - float(epoch[0])) / self.half_life_seconds)
+            return [(_decode_key(key), round(weight * factor, 4)) for key, weight in rows]
+
+        with self._lock:
+            factor = 1.0 / self._weight(time.time())
+            ranked = heapq.nlargest(n, self._scores.items(), key=lambda item: item[1])
+        return [(key, round(score * factor, 4)) for key, score in ranked]
+
+    def stats(self) -> dict:
+        """统计概况（downloads 为本进程记录的下载次数；使用统计文件时 tracked 为所有进程合计的下载键数）"""
+        with self._lock:
+            stats = {
+                'tracked': len(self._scores),
+                'downloads': self._total,
+                'half_life_seconds': self.half_life_seconds,
+                'shared': bool(self.db_path),
+            }
+        if self.db_path:
+            try:
+                conn = self._connect()
+                try:
+                    stats['tracked'] = conn.execute("SELECT COUNT(*) FROM popularity").fetchone()[0]
+                finally:
+                    conn.close()
+            except sqlite3.Error:
+                pass
+        return stats
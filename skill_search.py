@@ -0,0 +1,192 @@
+"""
+skills 关键词搜索：内存倒排索引 + BM25 相关度排序
+
+- 英文/数字按单词切分，查询词按前缀匹配（"dev" 可匹配 "devops"）
+- 中文等 CJK 文本切分为单字和相邻二元组（character n-grams），无需分词即可搜索
+- 多个查询词之间为 AND 关系，结果按 BM25 得分降序排列，id / name 命中权重高于 description
+"""
+import bisect
+import math
+import re
+from collections import defaultdict
+
+# 英文单词/数字串，或连续的 CJK 字符串
+TOKEN_PATTERN = re.compile(r'[a-z0-9]+|[\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff]+')
+
+# 各字段的词频权重
+FIELD_WEIGHTS = {'id': 3.0, 'name': 3.0, 'description': 1.0}
+
+# BM25 参数
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+# 单个查询词参与打分的前缀匹配词数上限，避免过短的前缀拖慢查询；
+# 超出的匹配词（文档频率最低的部分）仍参与匹配，命中的文档不会被丢弃，只是不计该查询词的得分
+MAX_PREFIX_EXPANSIONS = 64
+
+# 前缀匹配（非完整单词命中）的得分折扣
+PREFIX_MATCH_FACTOR = 0.9
+
+
+def _is_cjk(run: str) -> bool:
+    return not run[0].isascii()
+
+
+def _cjk_grams(run: str) -> list:
+    """CJK字符串切分为单字和相邻二元组"""
+    return list(run) + [run[i:i + 2] for i in range(len(run) - 1)]
+
+
+def tokenize(text: str) -> list:
+    """将文本切分为索引词：英文单词按原样，CJK 文本切分为单字和二元组"""
+    tokens = []
+    for match in TOKEN_PATTERN.finditer((text or '').lower()):
+        run = match.group()
+        if _is_cjk(run):
+            tokens.extend(_cjk_grams(run))
+        else:
+            tokens.append(run)
+    return tokens
+
+
+def _query_terms(query: str) -> list:
+    """
+    将查询切分为查询词列表：[(term, is_prefix), ...]
+    英文单词按前缀匹配；CJK 文本使用二元组精确匹配（单个汉字时使用单字）
+    """
+    terms = []
+    for match in TOKEN_PATTERN.finditer((query or '').lower()):
+        run = match.group()
+        if not _is_cjk(run):
+            terms.append((run, True))
+        elif len(run) == 1:
+            terms.append((run, False))
+        else:
+            terms.extend((run[i:i + 2], False) for i in range(len(run) - 1))
+    return list(dict.fromkeys(terms))
+
+
+class SkillSearchIndex:
+    """
+    skills 的倒排索引，构建后只读
+
+    Example:
+        >>> index = SkillSearchIndex(skills)
+        >>> index.search("依赖 管理")
+        ['dependency-manager', 'maven-style']
+    """
+
+    def __init__(self, skills: dict):
+        self.doc_ids = []
+        self.doc_lengths = []
+        self.postings = defaultdict(dict)  # term -> {doc_index: 加权词频}
+
+        for skill_id, info in skills.items():
+            doc_index = len(self.doc_ids)
+            self.doc_ids.append(skill_id)
+
+            term_freqs = defaultdict(float)
+            length = 0.0
+            for field, weight in FIELD_WEIGHTS.items():
+                for token in tokenize(info.get(field) or ''):
+                    term_freqs[token] += weight
+                    length += weight
+
+            for token, freq in term_freqs.items():
+                self.postings[token][doc_index] = freq
+            self.doc_lengths.append(length)
+
+        self.postings = dict(self.postings)
+        self.sorted_terms = sorted(self.postings)
+
+        # 预先计算每个词的IDF及每个文档的长度归一化因子，查询时只需对候选文档求分
+        total = len(self.doc_ids)
+        self.idf = {
+            term: math.log(1 + (total - len(posting) + 0.5) / (len(posting) + 0.5))
+            for term, posting in self.postings.items()
+        }
+        avg_doc_length = (sum(self.doc_lengths) / total) if total else 0.0
+        self.doc_norms = [
+            BM25_K1 * (1 - BM25_B + BM25_B * length / (avg_doc_length or 1.0))
+            for length in self.doc_lengths
+        ]
+
+    def __len__(self):
+        return len(self.doc_ids)
+
+    def _expand(self, term: str, is_prefix: bool) -> list:
+        """
+        查询词展开为索引中实际存在的词：[(index_term, factor), ...]，
+        完整单词命中排在最前，其余按文档频率从高到低排列（打分时只取前 MAX_PREFIX_EXPANSIONS 个）
+        """
+        if not is_prefix:
+            return [(term, 1.0)] if term in self.postings else []
+
+        start = bisect.bisect_left(self.sorted_terms, term)
+        end = bisect.bisect_left(self.sorted_terms, term + '\uffff', start)
+        matched = sorted(self.sorted_terms[start:end],
+                         key=lambda index_term: (index_term != term, -len(self.postings[index_term]), index_term))
+        return [(index_term, 1.0 if index_term == term else PREFIX_MATCH_FACTOR) for index_term in matched]
+
+    def _add_scores(self, expansions: list, candidates: set, scores: dict):
+        """将单个查询词对候选文档的BM25得分累加到scores，文档命中多个展开词时取最高分"""
+        best = {}
+        for index_term, factor in expansions:
+            posting = self.postings[index_term]
+            weight = factor * self.idf[index_term] * (BM25_K1 + 1)
+            # 遍历倒排表与候选集中较小的一方
+            if len(posting) <= len(candidates):
+                items = ((doc_index, freq) for doc_index, freq in posting.items() if doc_index in candidates)
+            else:
+                items = ((doc_index, posting[doc_index]) for doc_index in candidates if doc_index in posting)
+            for doc_index, freq in items:
+                score = weight * freq / (freq + self.doc_norms[doc_index])
+                if score > best.get(doc_index, 0.0):
+                    best[doc_index] = score
+        for doc_index, score in best.items():
+            scores[doc_index] = scores.get(doc_index, 0.0) + score
+
+    def search(self, query: str, limit: int = None) -> list:
+        """
+        搜索skills，所有查询词都需命中
+
+        Args:
+            query: 查询文本
+            limit: 最多返回的结果数（默认全部）
+
+        Returns:
+            list: 按相关度降序排列的skill ID列表；查询中没有可索引的词时返回空列表
+        """
+        terms = _query_terms(query)
+        if not terms:
+            return []
+
+        expanded = []
+        for term, is_prefix in terms:
+            expansions = self._expand(term, is_prefix)
+            if not expansions:
+                return []
+            expanded.append(expansions)
+
+        # AND：从候选最少的查询词开始求交集，只对最终候选文档计算得分
+        doc_sets = []
+        for expansions in expanded:
+            if len(expansions) == 1:
+                doc_sets.append(self.postings[expansions[0][0]].keys())
+            else:
+                doc_sets.append(set().union(*(self.postings[index_term] for index_term, _ in expansions)))
+        doc_sets.sort(key=len)
+
+        candidates = set(doc_sets[0])
+        for docs in doc_sets[1:]:
+            candidates.intersection_update(docs)
+            if not candidates:
+                return []
+
+        scores = dict.fromkeys(candidates, 0.0)
+        for expansions in expanded:
+            self._add_scores(expansions[:MAX_PREFIX_EXPANSIONS], candidates, scores)
+        ranked = sorted(candidates, key=lambda doc_index: (-scores[doc_index], self.doc_ids[doc_index]))
+        if limit is not None:
+            ranked = ranked[:limit]
+        return [self.doc_ids[doc_index] for doc_index in ranked]
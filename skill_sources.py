@@ -0,0 +1,175 @@
+"""
+多来源（联邦）skills 目录
+
+多个 skills 仓库（git 地址或本地目录）合并为一个目录，skill ID 带来源命名空间：
+"{来源名}.{skill文件夹名}"，例如 platform.code-review。
+
+- 各来源同步到各自的检出目录后，生成一个"视图"目录：每个skill一个指向来源检出目录中skill文件夹的符号链接，
+  视图目录按各来源的提交（本地目录为文件指纹）组合命名，内容不变则视图不变；
+  LOCAL_DIR 指向当前视图，索引、打包等仍按单个目录处理。
+  不能创建符号链接的平台（Windows 默认没有权限）改为把skill文件夹复制到视图目录
+- 依赖解析：带命名空间的依赖（platform.base）直接使用；不带命名空间的依赖优先解析为同一来源的skill，
+  其次按来源配置顺序解析为其他来源中同名的skill
+"""
+import hashlib
+import json
+import os
+import re
+import shutil
+
+# 命名空间与skill文件夹名之间的分隔符（来源名中不能包含）
+NAMESPACE_SEPARATOR = '.'
+
+# 视图目录中的来源清单文件
+VIEW_MANIFEST_NAME = '.federation.json'
+
+SOURCE_NAME_PATTERN = re.compile(r'^[A-Za-z0-9_][A-Za-z0-9_-]*$')
+
+
+def normalize_sources(sources: list) -> list:
+    """
+    校验来源配置
+
+    Args:
+        sources: [{'name': 命名空间, 'url': git仓库地址} 或 {'name': 命名空间, 'path': 本地目录}, ...]
+
+    Returns:
+        list: [{'name', 'type': 'git' / 'path', 'location'}, ...]，保持配置顺序（即依赖解析的优先顺序）
+
+    Raises:
+        ValueError: 来源名不合法或重复，或未指定（同时指定）url / path
+    """
+    normalized = []
+    names = set()
+    for source in sources:
+        name = source.get('name', '')
+        if not SOURCE_NAME_PATTERN.match(name):
+            raise ValueError(f"来源名 '{name}' 不合法：只能包含字母、数字、下划线和连字符")
+        if name in names:
+            raise ValueError(f"来源名 '{name}' 重复")
+        if bool(source.get('url')) == bool(source.get('path')):
+            raise ValueError(f"来源 '{name}' 需要指定 url 或 path 其中之一")
+        names.add(name)
+        if source.get('url'):
+            normalized.append({'name': name, 'type': 'git', 'location': source['url']})
+        else:
+            normalized.append({'name': name, 'type': 'path', 'location': os.path.abspath(source['path'])})
+    return normalized
+
+
+def qualify(source_name: str, local_id: str) -> str:
+    """带命名空间的skill ID"""
+    return f"{source_name}{NAMESPACE_SEPARATOR}{local_id}"
+
+
+def split_skill_id(skill_id: str) -> tuple:
+    """拆分带命名空间的skill ID，返回 (来源名, skill文件夹名)；不带命名空间时来源名为None"""
+    if NAMESPACE_SEPARATOR not in skill_id:
+        return None, skill_id
+    source_name, local_id = skill_id.split(NAMESPACE_SEPARATOR, 1)
+    return source_name, local_id
+
+
+def resolve_dependencies(skills: dict, source_names: list):
+    """
+    将各skill声明的依赖解析为带命名空间的skill ID，写入 dependencies 字段；
+    声明的原始依赖保存在 declared_dependencies 中，每次刷新都从原始依赖重新解析
+    （其他来源新增或删除同名skill可能改变未变更skill的解析结果）。无法解析的依赖原样保留（显示为缺失依赖）。
+    """
+    by_local_id = {}
+    for skill_id in skills:
+        source_name, local_id = split_skill_id(skill_id)
+        by_local_id.setdefault(local_id, {})[source_name] = skill_id
+
+    for skill_id, info in skills.items():
+        own_source, _ = split_skill_id(skill_id)
+        info['source'] = own_source
+        declared = info.setdefault('declared_dependencies', info.get('dependencies', []))
+        resolved = []
+        for dep in declared:
+            if dep in skills:
+                target = dep
+            else:
+                candidates = by_local_id.get(dep, {})
+                order = [own_source] + [name for name in source_names if name != own_source]
+                target = next((candidates[name] for name in order if name in candidates), dep)
+            if target not in resolved:
+                resolved.append(target)
+        info['dependencies'] = resolved
+
+
+def composite_head(states: dict) -> str:
+    """由各来源的提交（指纹）计算组合版本号，作为联邦目录的HEAD"""
+    digest = hashlib.sha1()
+    for name in sorted(states):
+        digest.update(f"{name}:{states[name]['head']}\n".encode('utf-8'))
+    return digest.hexdigest()
+
+
+def path_fingerprint(root: str) -> str:
+    """本地目录来源的文件指纹（路径、大小、修改时间），用作该来源的"提交" """
+    digest = hashlib.sha1()
+    for dir_path, dirs, files in os.walk(root):
+        dirs[:] = sorted(d for d in dirs if d != '.git')
+        for f in sorted(files):
+            file_path = os.path.join(dir_path, f)
+            try:
+                st = os.stat(file_path)
+            except OSError:
+                continue
+            digest.update(f"{os.path.relpath(file_path, root)}:{st.st_size}:{st.st_mtime_ns}\n".encode('utf-8'))
+    return 'path-' + digest.hexdigest()
+
+
+def list_skill_folders(root: str) -> list:
+    """来源检出目录下的一级文件夹（不含隐藏文件夹）"""
+    if not root or not os.path.isdir(root):
+        return []
+    with os.scandir(root) as entries:
+        return sorted(entry.name for entry in entries if entry.is_dir() and not entry.name.startswith('.'))
+
+
+def read_view_manifest(view_dir: str):
+    """读取视图目录的来源清单（{'head', 'sources': {来源名: {'type', 'head', 'root'}}}），不存在时返回None"""
+    try:
+        with open(os.path.join(view_dir, VIEW_MANIFEST_NAME), encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def build_view(views_dir: str, states: dict, symlinks: bool = True) -> str:
+    """
+    生成各来源当前检出合并后的视图目录（已存在时直接复用）：
+    先在临时目录中创建符号链接和来源清单，完成后 rename 到正式路径，不会出现不完整的视图
+
+    Args:
+        views_dir: 视图目录的父目录
+        states: 来源名 -> {'type', 'head', 'root'}
+        symlinks: 为 False 时复制skill文件夹而不是创建符号链接（Windows 上创建符号链接需要额外权限）
+
+    Returns:
+        str: 视图目录
+    """
+    head = composite_head(states)
+    view_dir = os.path.join(views_dir, head[:16])
+    if os.path.isdir(view_dir):
+        return view_dir
+
+    tmp_dir = f"{view_dir}.{os.getpid()}.tmp"
+    if os.path.exists(tmp_dir):
+        shutil.rmtree(tmp_dir)
+    os.makedirs(tmp_dir)
+    for name in sorted(states):
+        root = states[name]['root']
+        for local_id in list_skill_folders(root):
+            source_dir = os.path.join(root, local_id)
+            target_dir = os.path.join(tmp_dir, qualify(name, local_id))
+            if symlinks:
+                os.symlink(source_dir, target_dir, target_is_directory=True)
+            else:
+                shutil.copytree(source_dir, target_dir)
+    with open(os.path.join(tmp_dir, VIEW_MANIFEST_NAME), 'w', encoding='utf-8') as f:
+        json.dump({'head': head, 'sources': states}, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_dir, view_dir)
+    return view_dir
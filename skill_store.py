@@ -0,0 +1,99 @@
+"""
+skills 目录索引的持久化（SQLite）
+
+每次发布新的目录快照后，将所有skill记录（元数据、依赖、反向依赖、文件统计、内容哈希）
+连同构建时的git HEAD和快照版本号写入索引文件；重启时直接加载，HEAD未变化则无需重新扫描仓库。
+依赖图和关键词索引由记录在内存中重建（纯计算，不读取skill文件）。
+
+写入先生成临时文件再原子替换，进程在写入途中退出也不会留下损坏的索引。
+"""
+import json
+import os
+import sqlite3
+
+# 索引文件结构版本，记录字段或表结构变化时递增，旧版本的索引文件会被忽略
+SCHEMA_VERSION = 1
+
+
+def save_catalog(db_path: str, skills: dict, head: str, version: int, source: str, root: str = None):
+    """
+    将目录快照写入索引文件
+
+    Args:
+        db_path: 索引文件路径
+        skills: skill_id -> skill记录
+        head: 构建快照时的git HEAD
+        version: 快照版本号
+        source: 仓库本地路径（加载时校验，防止不同仓库共用索引文件）
+        root: 快照对应的检出目录（多进程部署时其他worker据此读取与索引一致的文件）
+    """
+    tmp_path = f"{db_path}.{os.getpid()}.tmp"
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+
+    conn = sqlite3.connect(tmp_path)
+    try:
+        with conn:
+            conn.execute("CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+            conn.execute("CREATE TABLE skills (skill_id TEXT PRIMARY KEY, record TEXT NOT NULL)")
+            conn.executemany(
+                "INSERT INTO meta (key, value) VALUES (?, ?)",
+                [
+                    ('schema_version', str(SCHEMA_VERSION)),
+                    ('head', head or ''),
+                    ('version', str(version)),
+                    ('source', source),
+                    ('root', root or ''),
+                ]
+            )
+            conn.executemany(
+                "INSERT INTO skills (skill_id, record) VALUES (?, ?)",
+                ((skill_id, json.dumps(info, ensure_ascii=False, separators=(',', ':')))
+                 for skill_id, info in skills.items())
+            )
+    finally:
+        conn.close()
+
+    try:
+        os.replace(tmp_path, db_path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+def load_catalog(db_path: str, source: str):
+    """
+    读取索引文件
+
+    Args:
+        db_path: 索引文件路径
+        source: 当前仓库本地路径
+
+    Returns:
+        dict: {'head', 'version', 'root', 'skills'}；文件不存在、结构版本或仓库路径不一致、读取失败时返回None
+    """
+    if not os.path.exists(db_path):
+        return None
+
+    try:
+        conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+        try:
+            meta = dict(conn.execute("SELECT key, value FROM meta"))
+            if meta.get('schema_version') != str(SCHEMA_VERSION) or meta.get('source') != source:
+                return None
+            skills = {
+                skill_id: json.loads(record)
+                for skill_id, record in conn.execute("SELECT skill_id, record FROM skills ORDER BY rowid")
+            }
+        finally:
+            conn.close()
+    except (sqlite3.Error, ValueError) as e:
+        print(f"Error loading catalog index {db_path}: {e}")
+        return None
+
+    return {
+        'head': meta.get('head') or None,
+        'version': int(meta.get('version') or 0),
+        'root': meta.get('root') or None,
+        'skills': skills,
+    }
@@ -0,0 +1,103 @@
+"""
+服务端测试的公共环境
+
+ServerTestCase 在临时目录中创建一个本地 git 仓库作为远程 skills 仓库，把 mcp_server 的仓库、检出、缓存、
+索引等路径指向临时目录，并提供 Starlette TestClient。
+同步后的后台缓存维护（过期清理、预构建）默认不启动，避免与测试同时修改缓存目录；需要时直接调用对应函数。
+"""
+import contextlib
+import io
+import os
+import subprocess
+import tempfile
+import unittest
+from unittest import mock
+
+from starlette.testclient import TestClient
+
+import mcp_server
+from skill_cache import CacheManager
+from skill_catalog import CatalogSnapshot
+from skill_popularity import PopularityTracker
+
+# skill_id -> (description, 依赖列表, 正文)
+DEFAULT_SKILLS = {
+    'base': ("基础技能 base skill", [], ""),
+    'writing-plans': ("Write plans for work", ['base'], ""),
+    'executing-plans': ("Execute plans", ['base'], "uses <skill>writing-plans</skill>"),
+    'devops-flow': ("DevOps 流程规范", ['writing-plans', 'executing-plans'], ""),
+}
+
+
+class ServerTestCase(unittest.TestCase):
+    """以临时 git 仓库为远程仓库的服务端测试基类"""
+
+    SKILLS = DEFAULT_SKILLS
+
+    def setUp(self):
+        tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp_dir.cleanup)
+        self.remote_dir = os.path.join(tmp_dir.name, 'remote')
+        self.base_dir = os.path.join(tmp_dir.name, 'base')
+        os.makedirs(self.remote_dir)
+        os.makedirs(self.base_dir)
+        self.git('init', '-q', '-b', 'main')
+        for skill_id, (description, dependencies, body) in self.SKILLS.items():
+            self.write_skill(skill_id, description, dependencies, body)
+        self.commit('init')
+
+        base_dir = self.base_dir
+        cache_dir = os.path.join(base_dir, 'skill-cache')
+        paths = {
+            'REPO_URL': self.remote_dir,
+            'BASE_DIR': base_dir,
+            'LOCAL_DIR': os.path.join(base_dir, 'skills'),
+            'MIRROR_DIR': os.path.join(base_dir, 'skills.git'),
+            'CHECKOUTS_DIR': os.path.join(base_dir, 'skills-checkouts'),
+            'SOURCES_DIR': os.path.join(base_dir, 'skill-sources'),
+            'VIEWS_DIR': os.path.join(base_dir, 'skills-views'),
+            'CACHE_DIR': cache_dir,
+            'FRAGMENT_DIR': os.path.join(cache_dir, 'fragments'),
+            'BATCH_DIR': os.path.join(cache_dir, 'batches'),
+            'INDEX_DB_PATH': os.path.join(base_dir, 'skill-index.db'),
+            'POPULARITY_DB_PATH': os.path.join(base_dir, 'skill-popularity.db'),
+            'LEADER_LOCK_PATH': os.path.join(base_dir, 'sync-leader.lock'),
+            'CATALOG_VERSION_PATH': os.path.join(base_dir, 'catalog-version.json'),
+            'SYNC_REQUEST_PATH': os.path.join(base_dir, 'sync-request'),
+            'BUILD_LOCK_DIR': os.path.join(base_dir, 'build-locks'),
+        }
+        patcher = mock.patch.multiple(
+            mcp_server,
+            **paths,
+            _catalog=CatalogSnapshot({}),
+            cache_manager=CacheManager(mcp_server.CACHE_MAX_BYTES, mcp_server.CACHE_MIN_IDLE_SECONDS),
+            download_popularity=PopularityTracker(mcp_server.PREWARM_HALF_LIFE_HOURS * 3600),
+            _start_cache_maintenance=lambda *args, **kwargs: None,
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        mcp_server.cache_manager.load([paths['CACHE_DIR'], paths['FRAGMENT_DIR']])
+        self.client = TestClient(mcp_server.fastapi_app)
+
+    def git(self, *args) -> str:
+        result = subprocess.run(['git', '-c', 'user.name=test', '-c', 'user.email=test@example.com', *args],
+                                cwd=self.remote_dir, check=True, capture_output=True, text=True)
+        return result.stdout.strip()
+
+    def write_skill(self, skill_id: str, description: str, dependencies=(), body: str = ""):
+        """在远程仓库中写入（或覆盖）一个skill，需要调用 commit 提交"""
+        skill_dir = os.path.join(self.remote_dir, skill_id)
+        os.makedirs(skill_dir, exist_ok=True)
+        deps = ", ".join(f"'{dep}'" for dep in dependencies)
+        with open(os.path.join(skill_dir, 'skill.md'), 'w', encoding='utf-8') as f:
+            f.write(f"---\nname: {skill_id}\ndescription: {description}\ndependencies: [{deps}]\n---\n\n"
+                    f"# {skill_id}\n{body}\n")
+
+    def commit(self, message: str = 'update'):
+        self.git('add', '-A')
+        self.git('commit', '-q', '-m', message)
+
+    def sync(self, full_rescan: bool = False) -> dict:
+        """同步远程仓库（屏蔽进度输出）"""
+        with contextlib.redirect_stdout(io.StringIO()):
+            return mcp_server.sync_repo_internal(full_rescan)
@@ -0,0 +1,76 @@
+"""压缩包构建 single-flight 与缓存未命中时流式返回的测试（python -m unittest discover tests）"""
+import os
+import threading
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+
+import mcp_server
+from server_fixture import ServerTestCase
+
+
+class ArchiveBuildTest(ServerTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.sync()
+        self.catalog = mcp_server.current_catalog()
+        self.skills = mcp_server.resolve_bundle('devops-flow-with-deps', self.catalog)
+        cache_key = mcp_server.bundle_cache_key(self.skills, 'gz', self.catalog, 'devops-flow-with-deps')
+        self.cache_file_path = mcp_server.bundle_cache_path('devops-flow-with-deps', cache_key, 'gz')
+
+    def test_concurrent_submits_share_one_build(self):
+        # 用被占住的单线程池让构建停在队列中，模拟构建进行中的并发请求
+        executor = ThreadPoolExecutor(max_workers=1)
+        self.addCleanup(executor.shutdown)
+        release = threading.Event()
+        executor.submit(release.wait)
+
+        first_stream = mcp_server.ArchiveStream()
+        second_stream = mcp_server.ArchiveStream()
+        first = mcp_server.submit_archive_build(self.cache_file_path, self.skills, 'gz', first_stream,
+                                                self.catalog, executor=executor)
+        second = mcp_server.submit_archive_build(self.cache_file_path, self.skills, 'gz', second_stream,
+                                                 self.catalog, executor=executor)
+        self.assertIs(first, second)
+        self.assertTrue(first_stream.attached)
+        self.assertFalse(second_stream.attached)
+
+        release.set()
+        streamed = b''.join(first_stream)
+        self.assertEqual(first.result(timeout=10), self.cache_file_path)
+        self.assertNotIn(self.cache_file_path, mcp_server._inflight_builds)
+        with open(self.cache_file_path, 'rb') as f:
+            self.assertEqual(streamed, f.read())
+
+        # 构建完成后的请求直接使用缓存文件
+        third = mcp_server.submit_archive_build(self.cache_file_path, self.skills, 'gz', mcp_server.ArchiveStream(),
+                                                self.catalog, executor=executor)
+        self.assertIsNot(third, first)
+        self.assertTrue(third.done())
+
+    def test_cache_miss_streams_the_cached_bytes(self):
+        response = self.client.get('/download/devops-flow-with-deps')
+        self.assertEqual(response.status_code, 200)
+        # 流式响应没有预先确定的长度
+        self.assertNotIn('content-length', response.headers)
+        with open(self.cache_file_path, 'rb') as f:
+            self.assertEqual(response.content, f.read())
+
+        cached = self.client.get('/download/devops-flow-with-deps')
+        self.assertEqual(cached.headers['content-length'], str(len(response.content)))
+        self.assertEqual(cached.content, response.content)
+
+    def test_build_finished_by_another_worker_is_replayed(self):
+        mcp_server.build_archive(self.cache_file_path, self.skills, 'gz', catalog=self.catalog)
+        inode = os.stat(self.cache_file_path).st_ino
+
+        # 等到构建锁时缓存文件已存在：不重新构建，流式响应从缓存文件读取
+        stream = mcp_server.ArchiveStream()
+        mcp_server.build_archive(self.cache_file_path, self.skills, 'gz', stream, self.catalog)
+        self.assertEqual(os.stat(self.cache_file_path).st_ino, inode)
+        with open(self.cache_file_path, 'rb') as f:
+            self.assertEqual(b''.join(stream), f.read())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,71 @@
+"""由预压缩片段拼接压缩包的测试（python -m unittest discover tests）"""
+import io
+import os
+import tarfile
+import unittest
+
+import mcp_server
+from server_fixture import ServerTestCase
+
+
+class ArchiveFragmentTest(ServerTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.sync()
+        self.catalog = mcp_server.current_catalog()
+
+    def build(self, bundle_id: str, archive_format: str = 'gz') -> bytes:
+        skills = mcp_server.resolve_bundle(bundle_id, self.catalog)
+        cache_key = mcp_server.bundle_cache_key(skills, archive_format, self.catalog, bundle_id)
+        path = mcp_server.build_archive(mcp_server.bundle_cache_path(bundle_id, cache_key, archive_format),
+                                        skills, archive_format, catalog=self.catalog)
+        with open(path, 'rb') as f:
+            return f.read()
+
+    def fragments(self) -> dict:
+        return {name: os.stat(os.path.join(mcp_server.FRAGMENT_DIR, name)).st_ino
+                for name in os.listdir(mcp_server.FRAGMENT_DIR)}
+
+    def assert_archive_matches_repo(self, tar: tarfile.TarFile, skill_ids: list):
+        self.assertEqual(sorted({member.name.split('/')[0] for member in tar.getmembers()}), sorted(skill_ids))
+        for sid in skill_ids:
+            with open(os.path.join(self.remote_dir, sid, 'skill.md'), 'rb') as f:
+                self.assertEqual(tar.extractfile(f'{sid}/skill.md').read(), f.read())
+
+    def test_concatenated_fragments_are_a_valid_archive(self):
+        for archive_format in mcp_server.available_archive_formats():
+            data = self.build('devops-flow-with-deps', archive_format)
+            if archive_format == 'zst':
+                data = mcp_server.zstandard.ZstdDecompressor().stream_reader(io.BytesIO(data),
+                                                                               read_across_frames=True).read()
+            with tarfile.open(fileobj=io.BytesIO(data), mode='r:*') as tar:
+                self.assert_archive_matches_repo(tar, ['base', 'writing-plans', 'executing-plans', 'devops-flow'])
+
+    def test_bundles_reuse_skill_fragments(self):
+        self.build('devops-flow-with-deps')
+        fragments = self.fragments()
+        self.assertEqual(len(fragments), 4)
+
+        # 其他bundle直接复用已有片段，不重新压缩
+        self.build('writing-plans-with-deps')
+        self.build('all')
+        self.assertEqual(self.fragments(), fragments)
+
+    def test_only_changed_skills_get_new_fragments(self):
+        self.build('devops-flow-with-deps')
+        before = self.fragments()
+        self.write_skill('base', "基础技能 v2", [], "changed body")
+        self.commit('v2')
+        self.sync()
+        self.catalog = mcp_server.current_catalog()
+
+        with tarfile.open(fileobj=io.BytesIO(self.build('devops-flow-with-deps')), mode='r:gz') as tar:
+            self.assert_archive_matches_repo(tar, ['base', 'writing-plans', 'executing-plans', 'devops-flow'])
+        added = set(self.fragments()) - set(before)
+        self.assertEqual(len(added), 1)
+        self.assertTrue(added.pop().startswith('base.'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,85 @@
+"""ArchiveStream 流式响应的测试（python -m unittest discover tests）"""
+import os
+import tempfile
+import threading
+import time
+import unittest
+from unittest import mock
+
+import mcp_server
+from mcp_server import ArchiveStream
+
+
+class ArchiveStreamTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp_dir.name, 'bundle.tar.gz')
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_small_stream_ends_without_polling(self):
+        stream = ArchiveStream()
+
+        def produce():
+            with open(self.path, 'wb') as f:
+                stream.tee(f).write(b'x' * 100)
+            stream.follow(self.path)
+            stream.finish()
+
+        start = time.monotonic()
+        threading.Timer(0.05, produce).start()
+        self.assertEqual(b''.join(stream), b'x' * 100)
+        self.assertLess(time.monotonic() - start, 0.3)
+
+    def test_failure_ends_response_promptly(self):
+        stream = ArchiveStream()
+        threading.Timer(0.05, stream.fail, args=(ValueError('boom'),)).start()
+        start = time.monotonic()
+        with self.assertRaises(ValueError):
+            list(stream)
+        self.assertLess(time.monotonic() - start, 0.3)
+
+    def test_lagging_client_reads_rest_from_file(self):
+        chunks = [bytes([i]) * 1000 for i in range(10)]
+        with mock.patch.object(mcp_server, 'STREAM_QUEUE_CHUNKS', 2):
+            stream = ArchiveStream()
+            # 没有读取者时写入也不等待：超出缓冲区的部分之后从文件读取
+            with open(self.path, 'wb') as f:
+                writer = stream.tee(f)
+                for chunk in chunks:
+                    writer.write(chunk)
+            stream.follow(self.path)
+            stream.finish()
+            self.assertEqual(b''.join(stream), b''.join(chunks))
+
+    def test_followed_temp_file_removed_after_read(self):
+        with mock.patch.object(mcp_server, 'STREAM_QUEUE_CHUNKS', 1):
+            stream = ArchiveStream()
+            with open(self.path, 'wb') as f:
+                writer = stream.tee(f)
+                for _ in range(3):
+                    writer.write(b'delta')
+            self.assertTrue(stream.follow(self.path, remove=True))
+            stream.finish()
+            self.assertEqual(b''.join(stream), b'delta' * 3)
+        self.assertFalse(os.path.exists(self.path))
+
+    def test_follow_not_needed_when_client_kept_up(self):
+        stream = ArchiveStream()
+        with open(self.path, 'wb') as f:
+            stream.tee(f).write(b'small')
+        self.assertFalse(stream.follow(self.path, remove=True))
+
+    def test_replay_reads_whole_file(self):
+        with open(self.path, 'wb') as f:
+            f.write(b'built elsewhere')
+        stream = ArchiveStream()
+        stream.replay(self.path)
+        stream.finish()
+        self.assertEqual(b''.join(stream), b'built elsewhere')
+
+
+if __name__ == '__main__':
+    unittest.main()
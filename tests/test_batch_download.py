@@ -0,0 +1,66 @@
+"""批量下载及批量bundle ID命名空间的测试（python -m unittest discover tests）"""
+import io
+import os
+import tarfile
+import unittest
+
+import mcp_server
+from server_fixture import DEFAULT_SKILLS, ServerTestCase
+
+
+def archive_skills(data: bytes) -> list:
+    with tarfile.open(fileobj=io.BytesIO(data), mode='r:*') as tar:
+        return sorted({member.name.split('/')[0] for member in tar.getmembers()})
+
+
+class BatchDownloadTest(ServerTestCase):
+
+    SKILLS = {
+        **DEFAULT_SKILLS,
+        # 与批量下载路径标识及旧版本bundle ID同名的skill
+        'batch': ("A skill named batch", ['base'], ""),
+        'batch-0123456789abcdef': ("Looks like an old batch id", [], ""),
+    }
+
+    def setUp(self):
+        super().setUp()
+        self.sync()
+
+    def test_skills_named_like_batches_are_loaded(self):
+        catalog = mcp_server.current_catalog()
+        self.assertIn('batch', catalog)
+        self.assertIn('batch-0123456789abcdef', catalog)
+
+        response = self.client.get('/download/batch-0123456789abcdef')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(archive_skills(response.content), ['batch-0123456789abcdef'])
+
+    def test_download_batch_without_skills_is_the_skill(self):
+        response = self.client.get('/download/batch')
+        self.assertEqual(archive_skills(response.content), ['batch'])
+
+    def test_batch_download_uses_namespaced_bundle(self):
+        response = self.client.get('/download/batch', params={'skills': 'devops-flow,batch'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(archive_skills(response.content),
+                         ['base', 'batch', 'devops-flow', 'executing-plans', 'writing-plans'])
+
+        definitions = os.listdir(mcp_server.BATCH_DIR)
+        self.assertEqual(len(definitions), 1)
+        bundle_id = definitions[0][:-len('.json')]
+        self.assertRegex(bundle_id, mcp_server.BATCH_BUNDLE_PATTERN)
+        self.assertEqual(mcp_server.bundle_type(bundle_id), 'batch')
+        # 定义保存在磁盘上，其他 worker 或重启后同样可以解析
+        self.assertEqual(sorted(mcp_server.resolve_bundle(bundle_id)),
+                         ['base', 'batch', 'devops-flow', 'executing-plans', 'writing-plans'])
+
+    def test_batch_delta(self):
+        response = self.client.post('/download/batch/delta', params={'skills': 'writing-plans'},
+                                    json={'skills': {}})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(archive_skills(response.content),
+                         [mcp_server.MANIFEST_FILE_NAME, 'base', 'writing-plans'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,37 @@
+"""bundle_cache_key 压缩包缓存键的测试（python -m unittest discover tests）"""
+import unittest
+from unittest import mock
+
+import mcp_server
+from mcp_server import bundle_cache_key
+from skill_catalog import CatalogSnapshot
+
+
+def make_catalog(version: int, hashes: dict) -> CatalogSnapshot:
+    skills = {
+        sid: {'id': sid, 'name': sid, 'description': '', 'dependencies': [], 'content_hash': content_hash}
+        for sid, content_hash in hashes.items()
+    }
+    return CatalogSnapshot(skills, version=version)
+
+
+class BundleCacheKeyTest(unittest.TestCase):
+
+    def test_memoized_per_snapshot(self):
+        catalog = make_catalog(1, {'a': 'h1', 'b': 'h2'})
+        key = bundle_cache_key(['a', 'b'], 'gz', catalog, 'all')
+        with mock.patch.object(mcp_server, 'skill_content_hash', side_effect=AssertionError('recomputed')):
+            self.assertEqual(bundle_cache_key(['a', 'b'], 'gz', catalog, 'all'), key)
+        self.assertEqual(bundle_cache_key(['a', 'b'], 'gz', catalog), key)
+        self.assertNotEqual(bundle_cache_key(['a', 'b'], 'zst', catalog, 'all'), key)
+
+    def test_new_snapshot_sees_changed_content(self):
+        old = bundle_cache_key(['a', 'b'], 'gz', make_catalog(1, {'a': 'h1', 'b': 'h2'}), 'all')
+        unchanged = bundle_cache_key(['a', 'b'], 'gz', make_catalog(2, {'a': 'h1', 'b': 'h2'}), 'all')
+        changed = bundle_cache_key(['a', 'b'], 'gz', make_catalog(3, {'a': 'h1', 'b': 'h3'}), 'all')
+        self.assertEqual(old, unchanged)
+        self.assertNotEqual(old, changed)
+
+
+if __name__ == '__main__':
+    unittest.main()
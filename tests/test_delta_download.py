@@ -0,0 +1,97 @@
+"""基于客户端清单的增量下载测试（python -m unittest discover tests）"""
+import io
+import json
+import tarfile
+import unittest
+
+import mcp_server
+from server_fixture import ServerTestCase
+
+
+def read_delta(data: bytes):
+    """解析增量压缩包：(包含的skill, 清单文件内容)"""
+    with tarfile.open(fileobj=io.BytesIO(data), mode='r:*') as tar:
+        names = {member.name.split('/')[0] for member in tar.getmembers()}
+        manifest = json.load(tar.extractfile(mcp_server.MANIFEST_FILE_NAME))
+    names.discard(mcp_server.MANIFEST_FILE_NAME)
+    return sorted(names), manifest
+
+
+class DeltaDownloadTest(ServerTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.sync()
+
+    def delta(self, bundle_id: str, installed: dict, **params):
+        return self.client.post(f'/download/{bundle_id}/delta', params=params, json={'skills': installed})
+
+    def content_hashes(self) -> dict:
+        catalog = mcp_server.current_catalog()
+        return {sid: mcp_server.skill_content_hash(sid, catalog) for sid in catalog.skills}
+
+    def test_fresh_install_gets_everything(self):
+        response = self.delta('devops-flow-with-deps', {})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.headers['x-skill-added'], '4')
+        self.assertEqual(response.headers['x-skill-changed'], '0')
+        skills, manifest = read_delta(response.content)
+        self.assertEqual(skills, ['base', 'devops-flow', 'executing-plans', 'writing-plans'])
+        self.assertEqual(manifest['skills'], self.content_hashes())
+
+    def test_up_to_date_client_gets_only_the_manifest(self):
+        installed = self.content_hashes()
+        response = self.delta('devops-flow-with-deps', installed)
+        self.assertEqual(response.headers['x-skill-added'], '0')
+        skills, manifest = read_delta(response.content)
+        self.assertEqual(skills, [])
+        self.assertEqual(manifest['skills'], installed)
+
+    def test_changed_and_removed_skills(self):
+        installed = self.content_hashes()
+        installed['local-only'] = 'feedface'
+        self.write_skill('base', "基础技能 v2", [], "changed body")
+        self.write_skill('reviewing', "Review code", ['base'])
+        self.commit('v2')
+        self.sync()
+
+        response = self.delta('all', installed)
+        self.assertEqual(response.headers['x-skill-added'], '1')
+        self.assertEqual(response.headers['x-skill-changed'], '1')
+        self.assertEqual(response.headers['x-skill-removed'], 'local-only')
+        skills, manifest = read_delta(response.content)
+        self.assertEqual(skills, ['base', 'reviewing'])
+        self.assertEqual(manifest['skills'], self.content_hashes())
+
+    def test_compute_delta(self):
+        catalog = mcp_server.current_catalog()
+        installed = self.content_hashes()
+        installed['base'] = 'outdated'
+        del installed['writing-plans']
+        installed['gone'] = 'cafe'
+        delta = mcp_server.compute_delta(['base', 'writing-plans', 'devops-flow'], installed, catalog)
+        self.assertEqual(delta['added'], ['writing-plans'])
+        self.assertEqual(delta['changed'], ['base'])
+        self.assertEqual(delta['unchanged'], ['devops-flow'])
+        self.assertEqual(delta['removed'], ['gone'])
+        # 不在本次bundle中的已安装skill保留在新清单中
+        self.assertEqual(delta['manifest'], self.content_hashes())
+
+    def test_delta_formats_are_valid_archives(self):
+        for archive_format in mcp_server.available_archive_formats():
+            if archive_format == 'zst':
+                continue  # tarfile 不能直接读取 zstd
+            response = self.delta('devops-flow-with-deps', {'base': 'outdated'}, format=archive_format)
+            self.assertEqual(response.status_code, 200, archive_format)
+            skills, _ = read_delta(response.content)
+            self.assertEqual(skills, ['base', 'devops-flow', 'executing-plans', 'writing-plans'], archive_format)
+
+    def test_invalid_manifest_is_rejected(self):
+        response = self.delta('base-with-deps', {'../etc': 'x'})
+        self.assertEqual(response.json()['status'], 'error')
+        response = self.client.post('/download/base-with-deps/delta', content=b'[]')
+        self.assertEqual(response.json()['status'], 'error')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,83 @@
+"""下载接口 ETag / 304 / Range / If-Range 的测试（python -m unittest discover tests）"""
+import os
+import unittest
+
+import mcp_server
+from server_fixture import ServerTestCase
+
+
+class ConditionalDownloadTest(ServerTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.sync()
+        first = self.client.get('/download/devops-flow-with-deps')
+        self.assertEqual(first.status_code, 200)
+        self.etag = first.headers['etag']
+        # 首次下载可能是边打包边返回，之后的请求由缓存文件响应
+        self.content = self.client.get('/download/devops-flow-with-deps').content
+
+    def test_etag_is_the_content_key(self):
+        catalog = mcp_server.current_catalog()
+        skills = mcp_server.resolve_bundle('devops-flow-with-deps', catalog)
+        cache_key = mcp_server.bundle_cache_key(skills, 'gz', catalog, 'devops-flow-with-deps')
+        self.assertEqual(self.etag, f'"{cache_key}"')
+
+    def test_if_none_match_returns_304(self):
+        for if_none_match in (self.etag, f'W/{self.etag}', f'"other", {self.etag}', '*'):
+            response = self.client.get('/download/devops-flow-with-deps', headers={'If-None-Match': if_none_match})
+            self.assertEqual(response.status_code, 304, if_none_match)
+            self.assertEqual(response.content, b'')
+            self.assertEqual(response.headers['etag'], self.etag)
+
+        response = self.client.get('/download/devops-flow-with-deps', headers={'If-None-Match': '"other"'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.content, self.content)
+
+    def test_range_resumes_download(self):
+        response = self.client.get('/download/devops-flow-with-deps', headers={'Range': 'bytes=10-'})
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response.content, self.content[10:])
+        self.assertEqual(response.headers['content-range'], f'bytes 10-{len(self.content) - 1}/{len(self.content)}')
+
+    def test_range_on_cache_miss_waits_for_the_build(self):
+        response = self.client.get('/download/base-with-deps', headers={'Range': 'bytes=0-9'})
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response.content, self.client.get('/download/base-with-deps').content[:10])
+
+    def test_if_range(self):
+        response = self.client.get('/download/devops-flow-with-deps',
+                                   headers={'Range': 'bytes=10-', 'If-Range': self.etag})
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response.content, self.content[10:])
+
+        # 服务端内容已变化：返回完整文件，不能拼接到旧的 .part 文件后
+        response = self.client.get('/download/devops-flow-with-deps',
+                                   headers={'Range': 'bytes=10-', 'If-Range': '"stale"'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.content, self.content)
+
+    def test_etag_changes_with_content(self):
+        unaffected = self.client.get('/download/writing-plans').headers['etag']
+        self.write_skill('base', "基础技能 v2", [], "changed body")
+        self.commit('v2')
+        self.sync()
+        response = self.client.get('/download/devops-flow-with-deps', headers={'If-None-Match': self.etag})
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response.headers['etag'], self.etag)
+
+        # 不包含 base 的bundle内容键不变
+        self.assertEqual(self.client.get('/download/writing-plans').headers['etag'], unaffected)
+
+    def test_rebuilt_archive_has_identical_bytes(self):
+        for name in os.listdir(mcp_server.CACHE_DIR):
+            path = os.path.join(mcp_server.CACHE_DIR, name)
+            if os.path.isfile(path):
+                os.remove(path)
+        response = self.client.get('/download/devops-flow-with-deps')
+        self.assertEqual(response.headers['etag'], self.etag)
+        self.assertEqual(response.content, self.content)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,58 @@
+"""同步后增量刷新与全量扫描索引的测试（python -m unittest discover tests）"""
+import unittest
+
+import mcp_server
+from server_fixture import ServerTestCase
+
+
+def catalog_records(catalog) -> dict:
+    return {sid: (info['dependencies'], info['content_hash']) for sid, info in catalog.skills.items()}
+
+
+class IndexRefreshTest(ServerTestCase):
+
+    def test_first_sync_scans_everything(self):
+        result = self.sync()
+        self.assertEqual(result['refresh']['mode'], 'full')
+        self.assertEqual(sorted(mcp_server.current_catalog().skills), sorted(self.SKILLS))
+
+    def test_unchanged_head_does_nothing(self):
+        self.sync()
+        version = mcp_server.current_catalog().version
+        self.assertEqual(self.sync()['refresh']['mode'], 'unchanged')
+        self.assertEqual(mcp_server.current_catalog().version, version)
+
+    def test_incremental_refresh_only_touches_changed_skills(self):
+        self.sync()
+        before = mcp_server.current_catalog()
+        self.write_skill('base', "基础技能 v2", [], "changed body")
+        self.write_skill('reviewing', "Review code", ['writing-plans'])
+        self.git('rm', '-q', '-r', 'executing-plans')
+        self.commit('v2')
+
+        refresh = self.sync()['refresh']
+        self.assertEqual(refresh['mode'], 'incremental')
+        self.assertEqual(sorted(refresh['updated']), ['base', 'reviewing'])
+        self.assertEqual(refresh['removed'], ['executing-plans'])
+        # 依赖 base 的bundle内容随之变化
+        self.assertIn('devops-flow-with-deps', refresh['invalidated_bundles'])
+
+        after = mcp_server.current_catalog()
+        self.assertNotEqual(after.skills['base']['content_hash'], before.skills['base']['content_hash'])
+        self.assertEqual(after.skills['writing-plans']['content_hash'], before.skills['writing-plans']['content_hash'])
+        self.assertCountEqual(after.skills['devops-flow']['dependencies'], ['writing-plans', 'executing-plans'])
+        self.assertNotIn('executing-plans', after)
+
+    def test_incremental_matches_full_rescan(self):
+        self.sync()
+        self.write_skill('writing-plans', "Write plans v2", ['base', 'devops-flow'])
+        self.commit('v2')
+        self.assertEqual(self.sync()['refresh']['mode'], 'incremental')
+        incremental = catalog_records(mcp_server.current_catalog())
+
+        self.assertEqual(self.sync(full_rescan=True)['refresh']['mode'], 'full')
+        self.assertEqual(catalog_records(mcp_server.current_catalog()), incremental)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,88 @@
+"""缓存容量预算（LRU 淘汰）的测试（python -m unittest discover tests）"""
+import os
+import tempfile
+import time
+import unittest
+
+from skill_cache import CacheManager
+
+
+class CacheBudgetTest(unittest.TestCase):
+
+    def setUp(self):
+        tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp_dir.cleanup)
+        self.cache_dir = os.path.join(tmp_dir.name, 'skill-cache')
+        self.lock_path = os.path.join(tmp_dir.name, 'cache-evict.lock')
+        os.makedirs(self.cache_dir)
+        self.clock = time.time() - 3600
+
+    def write(self, name: str, size: int, age: float = None) -> str:
+        """写入缓存文件；age 为距上次访问的秒数，默认按写入顺序依次变新（都已闲置）"""
+        path = os.path.join(self.cache_dir, name)
+        with open(path, 'wb') as f:
+            f.write(b'x' * size)
+        if age is None:
+            self.clock += 1
+            accessed_at = self.clock
+        else:
+            accessed_at = time.time() - age
+        os.utime(path, (accessed_at, accessed_at))
+        return path
+
+    def manager(self, max_bytes: int, min_idle_seconds: float = 60) -> CacheManager:
+        manager = CacheManager(max_bytes, min_idle_seconds, lock_path=self.lock_path)
+        manager.load([self.cache_dir])
+        return manager
+
+    def test_evicts_least_recently_used_over_budget(self):
+        manager = self.manager(max_bytes=3000, min_idle_seconds=0)
+        oldest = self.write('a.tar.gz', 1000)
+        touched = self.write('b.tar.gz', 1000)
+        self.write('c.tar.gz', 1000)
+        manager.add(oldest)
+        manager.add(touched)
+        # 命中后 b 成为最近访问的文件
+        manager.hit(touched, 'bundle')
+
+        removed = manager.add(self.write('d.tar.gz', 1500))
+        self.assertEqual(removed, [oldest, os.path.join(self.cache_dir, 'c.tar.gz')])
+        self.assertEqual(sorted(os.listdir(self.cache_dir)), ['b.tar.gz', 'd.tar.gz'])
+        self.assertEqual(manager.stats()['total_bytes'], 2500)
+        self.assertEqual(manager.stats()['evictions'], 2)
+
+    def test_recently_accessed_files_are_kept(self):
+        manager = self.manager(max_bytes=1000, min_idle_seconds=60)
+        manager.add(self.write('a.tar.gz', 800, age=10))
+        removed = manager.add(self.write('b.tar.gz', 800, age=5))
+        # 两个文件都在闲置时间内：暂时超出预算，而不是删除正在下载的文件
+        self.assertEqual(removed, [])
+        self.assertEqual(len(os.listdir(self.cache_dir)), 2)
+
+    def test_temporary_files_are_not_counted(self):
+        manager = self.manager(max_bytes=1000)
+        self.write('a.tar.gz.123.tmp', 5000)
+        self.assertEqual(manager.add(self.write('b.tar.gz', 500)), [])
+        self.assertEqual(manager.stats()['total_bytes'], 500)
+
+    def test_budget_covers_files_written_by_other_workers(self):
+        worker_a = self.manager(max_bytes=2000)
+        worker_b = self.manager(max_bytes=2000)
+        first = self.write('a.tar.gz', 1000)
+        worker_a.add(first)
+        worker_b.add(self.write('b.tar.gz', 800))
+        # 各进程只登记自己写入的文件，淘汰时扫描整个目录
+        removed = worker_a.add(self.write('c.tar.gz', 800))
+        self.assertEqual(removed, [first])
+        self.assertEqual(worker_a.stats()['total_bytes'], 1600)
+
+    def test_evict_idle(self):
+        manager = self.manager(max_bytes=0)
+        cold = self.write('a.tar.gz', 100, age=7200)
+        self.write('b.tar.gz', 100, age=10)
+        self.assertEqual(manager.evict_idle(3600), [cold])
+        self.assertEqual(os.listdir(self.cache_dir), ['b.tar.gz'])
+
+
+if __name__ == '__main__':
+    unittest.main()
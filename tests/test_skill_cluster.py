@@ -0,0 +1,115 @@
+"""多进程部署的 leader 选举与缓存构建锁的测试（python -m unittest discover tests）"""
+import os
+import subprocess
+import sys
+import tempfile
+import textwrap
+import threading
+import time
+import unittest
+
+import skill_cluster
+from skill_cluster import BUILD_LOCK_STRIPES, FileLock, LeaderElection, build_lock
+
+TESTS_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(TESTS_DIR)
+
+
+@unittest.skipIf(skill_cluster.fcntl is None, "需要 fcntl（仅类Unix系统）")
+class LeaderElectionTest(unittest.TestCase):
+
+    def setUp(self):
+        tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp_dir.cleanup)
+        self.lock_path = os.path.join(tmp_dir.name, 'sync-leader.lock')
+
+    def test_single_leader(self):
+        first = LeaderElection(self.lock_path)
+        second = LeaderElection(self.lock_path)
+        self.addCleanup(first.release)
+        self.addCleanup(second.release)
+        self.assertTrue(first.try_acquire())
+        self.assertFalse(second.try_acquire())
+        self.assertTrue(first.try_acquire())
+        self.assertTrue(first.is_leader)
+        self.assertFalse(second.is_leader)
+        self.assertEqual(second.holder()['pid'], os.getpid())
+
+        first.release()
+        self.assertTrue(second.try_acquire())
+        self.assertFalse(first.try_acquire())
+
+    def test_leader_exit_hands_over(self):
+        # 持有锁的子进程退出后锁由内核释放，其他 worker 下次轮询时接任
+        script = textwrap.dedent(f"""
+            import sys
+            sys.path.insert(0, {REPO_DIR!r})
+            from skill_cluster import LeaderElection
+            leader = LeaderElection({self.lock_path!r})
+            print(leader.try_acquire(), flush=True)
+            sys.stdin.read()
+        """)
+        child = subprocess.Popen([sys.executable, '-c', script], stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                                 text=True)
+        self.addCleanup(child.wait)
+        self.assertEqual(child.stdout.readline().strip(), 'True')
+
+        follower = LeaderElection(self.lock_path)
+        self.addCleanup(follower.release)
+        self.assertFalse(follower.try_acquire())
+        self.assertEqual(follower.holder()['pid'], child.pid)
+
+        child.stdin.close()
+        child.wait(timeout=10)
+        child.stdout.close()
+        self.assertTrue(follower.try_acquire())
+
+
+@unittest.skipIf(skill_cluster.fcntl is None, "需要 fcntl（仅类Unix系统）")
+class BuildLockTest(unittest.TestCase):
+
+    def setUp(self):
+        tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp_dir.cleanup)
+        self.lock_dir = os.path.join(tmp_dir.name, 'build-locks')
+
+    def test_lock_files_are_striped(self):
+        names = [f"skill-{i}-with-deps.{i:016x}.tar.gz" for i in range(5000)]
+        paths = {build_lock(self.lock_dir, name).path for name in names}
+        self.assertLessEqual(len(paths), BUILD_LOCK_STRIPES)
+        self.assertGreater(len(paths), BUILD_LOCK_STRIPES // 2)
+        # 同一缓存文件总是映射到同一个锁文件
+        self.assertEqual(build_lock(self.lock_dir, names[0]).path, build_lock(self.lock_dir, names[0]).path)
+
+    def test_same_file_builds_are_exclusive(self):
+        name = 'devops-flow-with-deps.0123456789abcdef.tar.gz'
+        holder = build_lock(self.lock_dir, name)
+        holder.acquire()
+        self.assertFalse(build_lock(self.lock_dir, name).acquire(blocking=False))
+
+        acquired = threading.Event()
+
+        def wait_for_lock():
+            with build_lock(self.lock_dir, name):
+                acquired.set()
+
+        waiter = threading.Thread(target=wait_for_lock)
+        waiter.start()
+        time.sleep(0.1)
+        self.assertFalse(acquired.is_set())
+        holder.release()
+        waiter.join(timeout=5)
+        self.assertTrue(acquired.is_set())
+
+    def test_lock_is_released_on_exit(self):
+        path = os.path.join(self.lock_dir, 'build-000.lock')
+        with FileLock(path) as lock:
+            self.assertTrue(lock.locked)
+        self.assertFalse(lock.locked)
+        other = FileLock(path)
+        self.assertTrue(other.acquire(blocking=False))
+        other.release()
+
+
+if __name__ == '__main__':
+    unittest.main()
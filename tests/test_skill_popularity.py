@@ -0,0 +1,81 @@
+"""下载热度统计的测试（python -m unittest discover tests）"""
+import os
+import tempfile
+import unittest
+
+import mcp_server
+from server_fixture import ServerTestCase
+from skill_popularity import PopularityTracker
+
+HALF_LIFE = 24 * 3600
+
+
+class PopularityTrackerTest(unittest.TestCase):
+
+    def setUp(self):
+        tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp_dir.cleanup)
+        self.db_path = os.path.join(tmp_dir.name, 'skill-popularity.db')
+
+    def test_in_memory_ranking(self):
+        tracker = PopularityTracker(HALF_LIFE)
+        tracker.record(('a', 'gz'), 2)
+        tracker.record(('b', 'gz'), 3)
+        self.assertEqual([key for key, _ in tracker.top(2)], [('b', 'gz'), ('a', 'gz')])
+
+    def test_workers_share_counts(self):
+        # 两个 tracker 相当于两个 worker 进程：统计只通过统计文件共享
+        worker_a = PopularityTracker(HALF_LIFE, db_path=self.db_path)
+        worker_b = PopularityTracker(HALF_LIFE, db_path=self.db_path)
+        worker_a.record(('all', 'gz'), 3)
+        worker_b.record(('all', 'gz'), 3)
+        worker_b.record(('base-with-deps', 'gz'), 5)
+        worker_b.flush()
+
+        ranked = worker_a.top(2)
+        self.assertEqual([key for key, _ in ranked], [('all', 'gz'), ('base-with-deps', 'gz')])
+        self.assertAlmostEqual(ranked[0][1], 6, places=2)
+        self.assertAlmostEqual(ranked[1][1], 5, places=2)
+
+    def test_counts_survive_restart(self):
+        tracker = PopularityTracker(HALF_LIFE, db_path=self.db_path)
+        tracker.record(('all', 'zst'), 4)
+        tracker.flush()
+        restarted = PopularityTracker(HALF_LIFE)
+        restarted.load(self.db_path)
+        self.assertEqual(restarted.top(1)[0][0], ('all', 'zst'))
+
+    def test_forget_removes_shared_entry(self):
+        tracker = PopularityTracker(HALF_LIFE, db_path=self.db_path)
+        tracker.record(('gone', 'gz'))
+        tracker.flush()
+        tracker.forget(('gone', 'gz'))
+        self.assertEqual(PopularityTracker(HALF_LIFE, db_path=self.db_path).top(5), [])
+
+    def test_half_life_change_resets_counts(self):
+        tracker = PopularityTracker(HALF_LIFE, db_path=self.db_path)
+        tracker.record(('old', 'gz'))
+        tracker.flush()
+        changed = PopularityTracker(HALF_LIFE * 2, db_path=self.db_path)
+        changed.record(('new', 'gz'))
+        self.assertEqual([key for key, _ in changed.top(5)], [('new', 'gz')])
+
+
+class PrewarmTargetsTest(ServerTestCase):
+
+    def test_prewarm_ranks_downloads_from_all_workers(self):
+        self.sync()
+        mcp_server.download_popularity.load(mcp_server.POPULARITY_DB_PATH)
+        self.client.get('/download/base-with-deps')
+        other_worker = PopularityTracker(mcp_server.PREWARM_HALF_LIFE_HOURS * 3600,
+                                         db_path=mcp_server.POPULARITY_DB_PATH)
+        other_worker.record(('devops-flow-with-deps', 'gz'), 5)
+        other_worker.flush()
+
+        targets = mcp_server.prewarm_targets(mcp_server.current_catalog())
+        self.assertEqual([(bundle_id, fmt) for bundle_id, fmt, _ in targets],
+                         [('devops-flow-with-deps', 'gz'), ('base-with-deps', 'gz'), ('all', 'gz')])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,29 @@
+"""skill_search 关键词搜索的测试（python -m unittest discover tests）"""
+import unittest
+
+from skill_search import MAX_PREFIX_EXPANSIONS, SkillSearchIndex
+
+
+class PrefixExpansionTest(unittest.TestCase):
+
+    def setUp(self):
+        # 大量以 te 开头的词，超过单个查询词的打分展开上限
+        skills = {
+            f"tool-{i:03d}": {'id': f"tool-{i:03d}", 'name': f"te{i:03d}x", 'description': "common te-words"}
+            for i in range(MAX_PREFIX_EXPANSIONS + 36)
+        }
+        skills['test-runner'] = {'id': 'test-runner', 'name': 'test runner', 'description': 'run the suite'}
+        self.index = SkillSearchIndex(skills)
+
+    def test_truncated_prefix_keeps_all_matches(self):
+        results = self.index.search('te')
+        self.assertIn('test-runner', results)
+        self.assertEqual(len(results), MAX_PREFIX_EXPANSIONS + 37)
+
+    def test_exact_word_ranked_first(self):
+        self.assertEqual(self.index.search('test')[0], 'test-runner')
+        self.assertEqual(self.index.search('te runner'), ['test-runner'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,39 @@
+"""skill_sources 多来源视图目录的测试（python -m unittest discover tests）"""
+import os
+import tempfile
+import unittest
+
+from skill_sources import build_view, read_view_manifest
+
+
+class BuildViewTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.source_root = os.path.join(self.tmp_dir.name, 'platform')
+        os.makedirs(os.path.join(self.source_root, 'base'))
+        with open(os.path.join(self.source_root, 'base', 'skill.md'), 'w', encoding='utf-8') as f:
+            f.write('---\nname: base\n---\n')
+        self.states = {'platform': {'type': 'path', 'head': 'path-1', 'root': self.source_root}}
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def check_view(self, symlinks: bool):
+        view_dir = build_view(os.path.join(self.tmp_dir.name, 'views'), self.states, symlinks=symlinks)
+        skill_dir = os.path.join(view_dir, 'platform.base')
+        self.assertEqual(os.path.islink(skill_dir), symlinks)
+        with open(os.path.join(skill_dir, 'skill.md'), encoding='utf-8') as f:
+            self.assertIn('name: base', f.read())
+        self.assertEqual(read_view_manifest(view_dir)['sources'], self.states)
+
+    @unittest.skipIf(os.name == 'nt', "创建符号链接需要额外权限")
+    def test_symlink_view(self):
+        self.check_view(symlinks=True)
+
+    def test_copied_view_without_symlinks(self):
+        self.check_view(symlinks=False)
+
+
+if __name__ == '__main__':
+    unittest.main()